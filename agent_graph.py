@@ -1,3 +1,6 @@
+import time
+
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from agent_state import SocraticState
 from agents import SocraticAgents
@@ -5,30 +8,42 @@ from agents import SocraticAgents
 
 def _route_after_dialectic(state: SocraticState) -> str:
     """
-    Route back into the teaching loop until mastery is reached.
+    Route back into the teaching loop until mastery is reached or a loop budget
+    (iterations, tokens, wall-clock deadline, score plateau) runs out. In the "user" score
+    cadence the dialectic sets stop_reason "awaiting_user" once it has scored the learner's message.
     """
     mastery_reached = bool(state.get("mastery_reached", False))
 
     if mastery_reached:
         return END
+    if state.get("stop_reason"):
+        return END
+    deadline = state.get("deadline") or 0
+    if deadline and time.time() >= deadline:
+        return END
     return "arbiter"
 
-def create_agent_graph(agents: SocraticAgents):
+def create_agent_graph(agents: SocraticAgents, tracer=None, checkpointer=None):
     """
     Construct the agent graph, adding nodes and conditional edges for Socratic dialogue.
     Args:
         agents (SocraticAgents): The collection of agent node callables.
+        tracer (Tracer, optional): Records a latency/token span for every node run.
+        checkpointer (optional): LangGraph checkpointer (see checkpoint.py); runs then need a
+            thread id in their config and state carries over between turns.
     Returns:
         Compiled graph ready for execution.
     """
     # Create the state for the graph
     state = StateGraph(SocraticState)
 
-    state.add_node("arbiter", agents.arbiter_node)
-    state.add_node("elenchus", agents.elenchus_node)
-    state.add_node("aporia", agents.aporia_node)
-    state.add_node("maieutics", agents.maieutics_node)
-    state.add_node("dialectic", agents.dialectic_node)
+    # Each node has a sync and an async implementation; stream/invoke use the former,
+    # astream/ainvoke the latter (which streams teacher tokens on the "custom" stream mode).
+    for name in ("arbiter", "elenchus", "aporia", "maieutics", "dialectic"):
+        func, afunc = getattr(agents, f"{name}_node"), getattr(agents, f"a{name}_node")
+        if tracer is not None:
+            func, afunc = tracer.wrap(name, func, afunc)
+        state.add_node(name, RunnableLambda(func, afunc=afunc, name=name))
 
     # Since arbiter is supposed to feed into which learning model is going to be used, it is the starting point
     state.set_entry_point("arbiter")
@@ -44,4 +59,4 @@ def create_agent_graph(agents: SocraticAgents):
     # Dialectic conditionally loops back into the graph until mastery is reached.
     state.add_conditional_edges("dialectic", _route_after_dialectic)
 
-    return state.compile()
\ No newline at end of file
+    return state.compile(checkpointer=checkpointer)
\ No newline at end of file
@@ -1,15 +1,81 @@
-from typing import TypedDict, Annotated, List
+from typing import TypedDict, Annotated, List, Optional
 from langchain_core.messages import BaseMessage
-import operator
+from langgraph.graph.message import add_messages
+import time
+
+# Per-invocation loop budgets, used when the graph input does not set them
+DEFAULT_MAX_ITERATIONS = 5
+DEFAULT_PLATEAU_WINDOW = 3
+DEFAULT_PLATEAU_DELTA = 0.02
+
+def add_tokens(current: Optional[int], update: Optional[int]) -> int:
+    """
+    Reducer for tokens_used: sums the counts nodes report. An update of None restarts the count,
+    which is how each turn's input resets it when state is carried over by a checkpointer.
+    """
+    if update is None:
+        return 0
+    return (current or 0) + update
 
 class SocraticState(TypedDict):
     """
     State dictionary for tracking the Socratic agent loop, including messages, routing, and mastery score.
     """
-    messages: Annotated[List[BaseMessage], operator.add]
+    # add_messages gives each message an id, so the arbiter can drop old ones with RemoveMessage
+    messages: Annotated[List[BaseMessage], add_messages]
     next_agent: str
     mastery_score: float
     mastery_threshold: float
     mastery_reached: bool
     arbiter_raw: str
-    dialectic_raw: str
\ No newline at end of file
+    dialectic_raw: str
+    # Speculative mode: teacher response generated alongside the arbiter, consumed by the chosen teacher node
+    speculative_agent: str
+    speculative_message: Optional[BaseMessage]
+    speculation: dict
+    # Loop budgets for one graph invocation (one user turn). 0 / missing max_tokens and deadline mean no limit.
+    max_iterations: int
+    max_tokens: int
+    deadline: float
+    plateau_window: int
+    plateau_delta: float
+    # Budget accounting, updated by the nodes
+    iteration: int
+    tokens_used: Annotated[int, add_tokens]
+    score_history: List[float]
+    stop_reason: str
+    # Id of the learner message the dialectic last scored (score_cadence="user")
+    scored_human_id: str
+    # Routing within one user turn: every decision ({"iteration", "agent", "source"}) and the number of
+    # arbiter calls the routing policy skipped; routed_score / route_reuses track the decision in force
+    routing_decisions: List[dict]
+    arbiter_skips: int
+    routed_score: float
+    route_reuses: int
+
+
+def budget_stop_reason(state, iteration: int, tokens_used: int, score_history) -> str:
+    """
+    Name of the first loop budget that is exhausted after an iteration, or "" to keep looping.
+    deadline is a time.time() timestamp.
+    """
+    max_iterations = state.get("max_iterations") or DEFAULT_MAX_ITERATIONS
+    if iteration >= max_iterations:
+        return "max_iterations"
+
+    max_tokens = state.get("max_tokens") or 0
+    if max_tokens and tokens_used >= max_tokens:
+        return "max_tokens"
+
+    deadline = state.get("deadline") or 0
+    if deadline and time.time() >= deadline:
+        return "deadline"
+
+    # Plateau: the score has not improved by plateau_delta over the last plateau_window iterations
+    window = state.get("plateau_window") or DEFAULT_PLATEAU_WINDOW
+    delta = state.get("plateau_delta")
+    delta = DEFAULT_PLATEAU_DELTA if delta is None else delta
+    if len(score_history) >= window and score_history[-1] - score_history[-window] < delta:
+        return "plateau"
+
+    return ""
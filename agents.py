@@ -1,16 +1,211 @@
-from langchain_ollama import ChatOllama
-from langchain_core.messages import SystemMessage, HumanMessage
-from agent_state import SocraticState 
+import asyncio
+import collections
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, SystemMessage, HumanMessage, RemoveMessage
+from agent_state import SocraticState, budget_stop_reason
+from history import ContextWindows, TokenIndex, WindowPolicy, estimate_tokens
+from cache import ResponseCache
+from residency import ModelResidency
+from routing import RoutingOptions, routing_text
+from tracing import record_llm_call
+
+logger = logging.getLogger("socratic.agents")
+
+TEACHER_AGENTS = ("elenchus", "aporia", "maieutics")
+
+# Structured-output mode: JSON schemas passed as Ollama's `format`, plus tight decode limits;
+# replies that still fail to parse are counted in SocraticAgents.parse_failures
+ARBITER_SCHEMA = {
+    "type": "object",
+    "properties": {"next_agent": {"type": "string", "enum": list(TEACHER_AGENTS)}},
+    "required": ["next_agent"],
+}
+DIALECTIC_SCHEMA = {
+    "type": "object",
+    "properties": {"score": {"type": "number", "minimum": 0.0, "maximum": 1.0}},
+    "required": ["score"],
+}
+STRUCTURED_NUM_PREDICT = {"arbiter": 24, "dialectic": 16}
+STRUCTURED_CONSTRAINTS = {
+    "arbiter": 'CONSTRAINT: Respond ONLY with JSON of the form {"next_agent": "<elenchus|aporia|maieutics>"}.',
+    "dialectic": 'CONSTRAINT: Respond ONLY with JSON of the form {"score": <number between 0.0 and 1.0>}.',
+}
+SHARED_MODEL = "llama3.1:8b-instruct-q2_K"
+TEMPERATURES = {
+    # The Orchestrator: Low temperature (0.1) for high precision, logical routing, and intent classification.
+    "arbiter": 0.1,
+    # The Adversary: Tuned for logical rigor and cross-examination. Low temperature (0.1) for solid, factual responses
+    "elenchus": 0.1,
+    # The Puzzler: Slightly higher temperature (0.7) to allow for creative analogies and the generation of 'productive doubt' paradoxes.
+    "aporia": 0.7,
+    # The Midwife: Balanced temperature (0.5) for clear, constructive scaffolding and analogy-based knowledge synthesis.
+    "maieutics": 0.5,
+    # The Auditor: Evaluates state transitions and verifies concept mastery. Lowest temperature (0.0) for objectiveness and determinism.
+    "dialectic": 0.0,
+    # The Scribe: folds messages evicted from the context window into a running summary. Deterministic (0.0).
+    "summarizer": 0.0,
+}
+# Message layouts: "system_first" puts each role's prompt before the conversation; "history_first"
+# sends one shared system prompt, then the conversation, then the role's instructions, so every node
+# calling the same model shares the longest possible prompt prefix (and Ollama's KV cache for it).
+PROMPT_LAYOUTS = ("system_first", "history_first")
+SHARED_SYSTEM_PROMPT = (
+    "You are one member of a team of Socratic tutors helping a learner reach mastery of a concept. "
+    "The conversation so far follows. Your specific role and output format are given after it."
+)
+# Upper bound on the length of the rolling conversation summary
+SUMMARY_NUM_PREDICT = 256
+# score_cadence value that makes the dialectic score once per learner message
+SCORE_ON_USER_TURN = "user"
+# The control nodes classify and score from the latest exchanges (see control_windows)
+CONTROL_AGENTS = ("arbiter", "dialectic")
+# Nodes whose replies are shown to the user, so their tokens are streamed as they are generated
+STREAMED_AGENTS = TEACHER_AGENTS
+
+
+# LLM requests a node's steps yield (see SocraticAgents._run): one call, a concurrent call started
+# in the background, waiting for a started call, and discarding started calls (the driver answers
+# with (started, response) per call; response is None unless it had already finished)
+_Call = collections.namedtuple("_Call", "role messages stream", defaults=(False,))
+_Start = collections.namedtuple("_Start", "role messages")
+_Wait = collections.namedtuple("_Wait", "handle")
+_Discard = collections.namedtuple("_Discard", "handles")
+
+
+def _ollama_factory(role: str, **llm_kwargs):
+    """
+    Default LLM factory: one ChatOllama client per agent role.
+    """
+    # Imported here: langchain_ollama dominates import time and is not needed until the first call
+    from langchain_ollama import ChatOllama
+
+    return ChatOllama(**llm_kwargs)
+
+
+def _ollama_preload(model: str, keep_alive, **client_kwargs):
+    """
+    Ask Ollama to load model into memory (a chat request with no messages) without generating.
+    client_kwargs go to ollama.Client (e.g. a pooled transport).
+    """
+    from ollama import Client
+
+    Client(**client_kwargs).chat(model=model, messages=[], keep_alive=keep_alive)
+
+
+def control_windows(turns: int = 0, max_tokens: int = None) -> ContextWindows:
+    """
+    Windows that show the arbiter and dialectic only the last turns learner turns (all of them
+    when turns is 0) while the teachers keep every message within max_tokens. Note that in the
+    history_first layout the shorter control windows no longer share the teachers' prompt prefix.
+    """
+    policies = {role: WindowPolicy(last_turns=turns) for role in CONTROL_AGENTS} if turns else {}
+    return ContextWindows(max_tokens, policies)
+
+
+def response_tokens(response) -> int:
+    """
+    Completion token count of an LLM response, from usage metadata when the backend reports it.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("output_tokens"):
+        return int(usage["output_tokens"])
+    return estimate_tokens(getattr(response, "content", ""))
+
+
+def prompt_tokens(messages, response) -> int:
+    """
+    Prompt token count of one LLM call, from usage metadata when the backend reports it.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        return int(usage["input_tokens"])
+    return sum(estimate_tokens(getattr(message, "content", "")) for message in messages)
+
+
+def call_tokens(messages, response) -> int:
+    """
+    Prompt + completion tokens of one LLM call, from usage metadata when the backend reports it.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("total_tokens") is not None:
+        return int(usage["total_tokens"])
+    return prompt_tokens(messages, response) + response_tokens(response)
+
+
+def last_human_index(messages) -> int:
+    """
+    Position of the newest HumanMessage in messages, or -1. Scans from the end, so it costs
+    only the agent replies since the learner last spoke.
+    """
+    for offset, message in enumerate(reversed(messages), 1):
+        if isinstance(message, HumanMessage):
+            return len(messages) - offset
+    return -1
+
+
+def last_human_id(messages):
+    """
+    Id of the newest HumanMessage in messages, or None. Unlike its position, the id survives
+    older messages being dropped from the graph state.
+    """
+    index = last_human_index(messages)
+    return messages[index].id if index >= 0 else None
+
+
+def _get_token_writer():
+    """
+    LangGraph custom-stream writer for the running node, or None outside a graph run.
+    """
+    try:
+        from langgraph.config import get_stream_writer
+
+        return get_stream_writer()
+    except Exception:
+        return None
+
 
 class SocraticAgents():
     """
     A collection of agent nodes for Socratic dialogue, each representing a different role in the learning process.
     """
-    def __init__(self, context_switch: bool = True):
+    def __init__(self, context_switch: bool = True, llm_factory=None, residency=None, structured_output: bool = False,
+                 prompt_layout: str = "system_first", score_cadence=1, preload=None, routing=None, cache=None,
+                 windows=None, transport=None):
         """
         Initialize all agent LLMs and their prompts. Optionally switch context for model selection.
+        llm_factory(role, **llm_kwargs) builds each agent's chat model (ChatOllama by default).
         """
         ollama_backend = "cuda"
+        default_backend = llm_factory is None
+        llm_factory = llm_factory or _ollama_factory
+        if prompt_layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"prompt_layout must be one of {PROMPT_LAYOUTS}, got {prompt_layout!r}")
+        self.prompt_layout = prompt_layout
+        # Per-role conversation windows (history.ContextWindows)
+        self.windows = windows or ContextWindows()
+        self.prompt_stats = {}
+        if score_cadence != SCORE_ON_USER_TURN and not (isinstance(score_cadence, int) and score_cadence >= 1):
+            raise ValueError(f"score_cadence must be {SCORE_ON_USER_TURN!r} or a positive int, got {score_cadence!r}")
+        self.score_cadence = score_cadence
+        self.routing = routing or RoutingOptions()
+        self._speculation_pool = None
+        self._stats_lock = threading.Lock()
+        self.speculation_stats = {"iterations": 0, "wasted_tokens": 0, "discarded_calls": 0}
+        self.scoring_stats = {"scored": 0, "skipped": 0}
+        self.routing_stats = {"llm": 0, "router": 0, "reuse": 0, "rotate": 0}
+        self.structured_output = structured_output
+        self.parse_failures = {"arbiter": 0, "dialectic": 0}
+        # cache=False turns response caching off; by default an in-memory cache serves CACHE_ROLES
+        if cache is None:
+            cache = ResponseCache()
+        self.cache = cache if cache and cache.roles else None
 
         if context_switch:
             arbiter_model = "phi4-mini:3.8b-q4_K_M"
@@ -19,22 +214,45 @@ class SocraticAgents():
             maieutics_model = "llama3.1:8b-instruct-q2_K"
             dialectic_model = "phi4-mini:3.8b-q4_K_M"
         else:
-            arbiter_model = elenchus_model = aporia_model = maieutics_model = dialectic_model = "llama3.1:8b-instruct-q2_K"
+            arbiter_model = elenchus_model = aporia_model = maieutics_model = dialectic_model = SHARED_MODEL
 
-        # The Orchestrator: Low temperature (0.1) for high precision, logical routing, and intent classification.
-        self.arbiter_llm = ChatOllama(model=arbiter_model, temperature=0.1, backend=ollama_backend)
+        self.residency = residency or ModelResidency()
+        self.models = self.residency.plan(
+            {
+                "arbiter": arbiter_model,
+                "elenchus": elenchus_model,
+                "aporia": aporia_model,
+                "maieutics": maieutics_model,
+                "dialectic": dialectic_model,
+                # Summaries are rare and short; reuse the small control model so nothing extra is loaded
+                "summarizer": arbiter_model,
+            },
+            shared_model=SHARED_MODEL,
+        )
+        keep_alive = self.residency.keep_alive
+        structured = {
+            "arbiter": {"format": ARBITER_SCHEMA, "num_predict": STRUCTURED_NUM_PREDICT["arbiter"]},
+            "dialectic": {"format": DIALECTIC_SCHEMA, "num_predict": STRUCTURED_NUM_PREDICT["dialectic"]},
+        } if structured_output else {"arbiter": {}, "dialectic": {}}
+        structured["summarizer"] = {"num_predict": SUMMARY_NUM_PREDICT}
+        self.temperatures = dict(TEMPERATURES)
+        # Per-role decoding options; they change a role's output, so they are also part of its cache key
+        self._decode_options = {role: structured.get(role, {}) for role in TEMPERATURES}
+        llm_kwargs = {"backend": ollama_backend, "keep_alive": keep_alive}
+        # An ollama_pool.OllamaPool or backends.BackendRegistry that every client's HTTP requests go through
+        self.transport = transport
 
-        # The Adversary: Tuned for logical rigor and cross-examination. Low temperature (0.1) for solid, factual responses
-        self.elenchus_llm = ChatOllama(model=elenchus_model, temperature=0.1, backend=ollama_backend)
-
-        # The Puzzler: Slightly higher temperature (0.7) to allow for creative analogies and the generation of 'productive doubt' paradoxes.
-        self.aporia_llm = ChatOllama(model=aporia_model, temperature=0.7, backend=ollama_backend)
-
-        #The Midwife: Balanced temperature (0.5) for clear, constructive scaffolding and analogy-based knowledge synthesis.
-        self.maieutics_llm = ChatOllama(model=maieutics_model, temperature=0.5, backend=ollama_backend)
-
-        #The Auditor: Evaluates state transitions and verifies concept mastery. Lowest temperature (0.0) for objectiveness and determinism.
-        self.dialectic_llm = ChatOllama(model=dialectic_model, temperature=0.0, backend=ollama_backend)
+        # Clients are created on first use (see _get_llm), so constructing the agents is cheap and
+        # roles that never run (e.g. the summarizer in short sessions) never build one.
+        self._llm_factory = llm_factory
+        self._llm_kwargs = llm_kwargs
+        self._llms = {}
+        self._llm_lock = threading.Lock()
+        if preload is None and default_backend:
+            preload = _ollama_preload
+            if transport is not None:
+                preload = functools.partial(_ollama_preload, **transport.client_kwargs()["sync_client_kwargs"])
+        self.preload = preload
 
         # The system "objective" prompts
         self.prompts = {
@@ -76,8 +294,20 @@ class SocraticAgents():
             0.5: Understands the 'what' but not the 'why'.
             0.9+: Can explain the concept clearly in their own words.
             CONSTRAINT: You must output ONLY the user mastery score. No preamble, no punctuation.
+            """,
+
+            "summarizer": """
+            You maintain the running summary of a Socratic tutoring session. Merge the new excerpt into the current summary.
+            Keep: the concept being studied, the learner's misconceptions and whether they were resolved, analogies already used, open questions.
+            Drop: greetings, repetition and the exact wording of questions.
+            CONSTRAINT: Output ONLY the updated summary, at most 150 words.
             """
         }
+        if structured_output:
+            for role, constraint in STRUCTURED_CONSTRAINTS.items():
+                lines = self.prompts[role].split("\n")
+                lines = [constraint if line.strip().startswith("CONSTRAINT:") else line.strip() for line in lines]
+                self.prompts[role] = "\n".join(lines)
 
     def _parse_score(self, ai_output: str) -> float:
         """
@@ -85,15 +315,40 @@ class SocraticAgents():
         Returns:
             float: The parsed score, or 0.0 if not found.
         """
+        score = self._find_score(ai_output)
+        return 0.0 if score is None else score # Default if no score found
+
+    def _find_score(self, ai_output: str):
+        """
+        Like _parse_score, but returns None when the output contains no score.
+        """
         import re
         try:
             # Look for any decimal number in the response (e.g., '0.8', '0.95', or '1.0')
             match = re.search(r"(\d+\.\d+)", ai_output)
             if match:
                 return float(match.group(1))
-            return 0.0 # Default if no score found
+            return None
         except Exception:
-            return 0.0
+            return None
+
+    def _parse_json_field(self, ai_output: str, field: str):
+        """
+        Read one field from a structured (JSON) reply. Returns None if the reply is not valid JSON
+        or the field is missing.
+        """
+        try:
+            data = json.loads(ai_output)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+        return data.get(field)
+
+    def _record_parse_failure(self, role: str, ai_output):
+        with self._stats_lock:
+            self.parse_failures[role] += 1
+        logger.warning("[PARSE_FAILURE] %s reply could not be parsed: %r", role, ai_output)
 
     def _parse_next_agent(self, ai_output: str) -> str:
         """
@@ -101,8 +356,15 @@ class SocraticAgents():
         Searches for known agent names in the model output and returns the first match.
         Falls back to 'maieutics' when no known agent is found.
         """
+        next_agent = self._find_next_agent(ai_output)
+        return "maieutics" if next_agent is None else next_agent
+
+    def _find_next_agent(self, ai_output: str):
+        """
+        Like _parse_next_agent, but returns None when no known agent is found.
+        """
         if not ai_output:
-            return "maieutics"
+            return None
         text = ai_output.strip().lower()
         candidates = ["elenchus", "aporia", "maieutics"]
         # Prefer exact single-token replies
@@ -117,7 +379,493 @@ class SocraticAgents():
         for c in candidates:
             if c in text:
                 return c
-        return "maieutics"
+        return None
+
+    def __getattr__(self, name: str):
+        # <role>_llm attributes resolve to the lazily built client for that role
+        if name.endswith("_llm") and name[:-4] in self.__dict__.get("models", ()):
+            return self._get_llm(name[:-4])
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def _get_llm(self, role: str):
+        """
+        Chat client for role, built with llm_factory on first use.
+        """
+        llm = self._llms.get(role)
+        if llm is None:
+            with self._llm_lock:
+                llm = self._llms.get(role)
+                if llm is None:
+                    llm_kwargs = self._llm_kwargs
+                    if self.transport is not None:
+                        llm_kwargs = dict(llm_kwargs, **self.transport.client_kwargs(role))
+                    llm = self._llm_factory(
+                        role,
+                        model=self.models[role],
+                        temperature=self.temperatures[role],
+                        **self._decode_options[role],
+                        **llm_kwargs,
+                    )
+                    self._llms[role] = llm
+        return llm
+
+    def warm_up(self, roles=("arbiter",)):
+        """
+        Build the clients for roles and load their models before the first turn (run in the
+        background while the user types) with preload(model, keep_alive), an Ollama load request
+        for the default backend. Failures are logged and ignored; the first real call loads the
+        model anyway.
+        """
+        for role in roles:
+            self._get_llm(role)
+        if self.preload is None:
+            return
+        for model in dict.fromkeys(self.models[role] for role in roles):
+            try:
+                self.preload(model, self.residency.keep_alive)
+                self.residency.record_call(model)
+            except Exception as exc:
+                logger.warning("[WARM_UP] could not preload %s: %s", model, exc)
+
+    def summarize(self, previous_summary: str, messages) -> str:
+        """
+        Fold messages evicted from the context window into the running summary
+        (the summarizer callable for history.RollingSummary).
+        """
+        excerpt = "\n".join(
+            f"{'learner' if isinstance(message, HumanMessage) else 'tutor'}: {message.content}" for message in messages
+        )
+        prompt = [
+            SystemMessage(content=self.prompts["summarizer"]),
+            HumanMessage(content=f"Current summary:\n{previous_summary or '(none)'}\n\nNew excerpt:\n{excerpt}"),
+        ]
+        return self._invoke("summarizer", prompt).content
+
+    def _build_messages(self, role: str, state: SocraticState):
+        """
+        Prompt for a node: the role's system prompt followed by the conversation window, or in the
+        history_first layout the shared system prompt, the conversation, then the role's prompt.
+        """
+        window = self._window(role, state)
+        if self.prompt_layout == "history_first":
+            return (
+                [SystemMessage(content=SHARED_SYSTEM_PROMPT)]
+                + window
+                + [SystemMessage(content=self.prompts[role])]
+            )
+        return [SystemMessage(content=self.prompts[role])] + window
+
+    def _window(self, role: str, state: SocraticState):
+        """
+        Conversation messages a node sends: the tail of the role's window in self.windows.
+        Records the window's size in prompt_stats. Token counts are memoized by content, so
+        indexing the state's messages again for each node does not re-tokenize them.
+        """
+        messages = state["messages"]
+        if not messages:
+            return messages
+        max_tokens, last_turns = self.windows.limits(role)
+        index = TokenIndex(messages)
+        start = index.window_start(max_tokens, last_turns)
+        tokens = index.tokens_between(start, len(messages))
+        with self._stats_lock:
+            stats = self.prompt_stats.setdefault(role, {"calls": 0, "messages": 0, "tokens": 0})
+            stats["calls"] += 1
+            stats["messages"] += len(messages) - start
+            stats["tokens"] += tokens + estimate_tokens(self.prompts[role])
+        return messages[start:]
+
+    def _expired_messages(self, state: SocraticState):
+        """
+        RemoveMessage updates for the messages older than every role's window. Only trims when
+        windows.max_tokens is set, i.e. when a checkpointer carries the conversation in state;
+        without it the checkpoint would store (and nodes re-window) the whole conversation.
+        """
+        retained_tokens = self.windows.retained_tokens()
+        messages = state.get("messages") or []
+        if retained_tokens is None or not messages:
+            return []
+        start = TokenIndex(messages).window_start(retained_tokens)
+        return [RemoveMessage(id=message.id) for message in messages[:start]]
+
+    def _invoke(self, role: str, messages):
+        """
+        Single call site for every agent LLM request.
+        """
+        cached, cache_key = self._cached_response(role, messages)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        response = self._get_llm(role).invoke(messages)
+        return self._record_response(role, messages, response, cache_key, start, None)
+
+    async def _ainvoke(self, role: str, messages, stream: bool = False):
+        """
+        Async counterpart of _invoke. With stream=True the reply is generated with astream and
+        each token is emitted on the graph's custom stream as {"node": role, "token": text}.
+        """
+        writer = _get_token_writer() if stream else None
+        cached, cache_key = self._cached_response(role, messages)
+        if cached is not None:
+            if writer is not None:
+                writer({"node": role, "token": cached.content})
+            return cached
+
+        llm = self._get_llm(role)
+        start = time.perf_counter()
+        first_token_at = None
+        if writer is None:
+            response = await llm.ainvoke(messages)
+        else:
+            full = None
+            async for chunk in llm.astream(messages):
+                if chunk.content:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    writer({"node": role, "token": chunk.content})
+                full = chunk if full is None else full + chunk
+            response = AIMessage(
+                content=full.content if full is not None else "",
+                response_metadata=full.response_metadata if full is not None else {},
+                usage_metadata=full.usage_metadata if full is not None else None,
+            )
+        return self._record_response(role, messages, response, cache_key, start, first_token_at)
+
+    def _cached_response(self, role: str, messages):
+        """
+        (cached response or None, cache key or None) for a call; hits are traced here.
+        """
+        start = time.perf_counter()
+        cache_key = self._cache_key(role, messages)
+        if cache_key is None:
+            return None, None
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self._trace_call(role, messages, cached, start, None)
+        return cached, cache_key
+
+    def _record_response(self, role: str, messages, response, cache_key, start: float, first_token_at):
+        self.residency.record_call(self.models[role], response)
+        if cache_key is not None:
+            self.cache.put(cache_key, response, (time.perf_counter() - start) * 1000)
+        self._trace_call(role, messages, response, start, first_token_at)
+        return response
+
+    def _trace_call(self, role: str, messages, response, start: float, first_token_at):
+        """
+        Report one LLM call to the tracer span of the running node. Without streaming the
+        time to first token is the full call time.
+        """
+        now = time.perf_counter()
+        metadata = getattr(response, "response_metadata", None) or {}
+        # Ollama reports prompt evaluation time in nanoseconds; prompt-cache hits shrink it
+        prompt_eval_ns = metadata.get("prompt_eval_duration")
+        record_llm_call(
+            role=role,
+            model=self.models[role],
+            llm_ms=(now - start) * 1000,
+            ttft_ms=((first_token_at or now) - start) * 1000,
+            prompt_tokens=prompt_tokens(messages, response),
+            completion_tokens=response_tokens(response) if not metadata.get("cache_hit") else 0,
+            cache_hit=bool(metadata.get("cache_hit")),
+            prompt_eval_ms=prompt_eval_ns / 1e6 if prompt_eval_ns is not None else None,
+        )
+
+    def _cache_key(self, role: str, messages):
+        if self.cache is None or role not in self.cache.roles:
+            return None
+        return self.cache.make_key(self.models[role], self.temperatures[role], messages, self._decode_options[role])
+
+    # Each node is written once, as a generator of steps that yields the LLM requests below and
+    # receives their results; _run serves them with blocking calls and a thread pool, _arun with
+    # coroutines and tasks. Exceptions from a request are thrown back into the steps.
+
+    def _run(self, steps):
+        result, error = None, None
+        while True:
+            try:
+                request = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            try:
+                result, error = self._serve(request), None
+            except BaseException as exc:
+                result, error = None, exc
+
+    async def _arun(self, steps):
+        result, error = None, None
+        while True:
+            try:
+                request = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            try:
+                result, error = await self._aserve(request), None
+            except BaseException as exc:
+                result, error = None, exc
+
+    def _serve(self, request):
+        if isinstance(request, _Call):
+            return self._invoke(request.role, request.messages)
+        if isinstance(request, _Start):
+            # Run in a copy of this context so the tracer attributes the call to the running node's span
+            return self._get_speculation_pool().submit(
+                contextvars.copy_context().run, self._invoke, request.role, request.messages
+            )
+        if isinstance(request, _Wait):
+            return request.handle.result()
+        outcomes = []
+        for future in request.handles:
+            if future.cancel():
+                outcomes.append((False, None))
+            elif future.done():
+                outcomes.append((True, future.result() if future.exception() is None else None))
+            else:
+                # Already running: let it finish in the background and count its tokens then
+                future.add_done_callback(self._discard_speculation)
+                outcomes.append((True, None))
+        return outcomes
+
+    async def _aserve(self, request):
+        if isinstance(request, _Call):
+            return await self._ainvoke(request.role, request.messages, stream=request.stream)
+        if isinstance(request, _Start):
+            return asyncio.ensure_future(self._ainvoke(request.role, request.messages))
+        if isinstance(request, _Wait):
+            return await request.handle
+        outcomes = []
+        for task in request.handles:
+            done = task.done() and not task.cancelled() and task.exception() is None
+            # A task has sent its request by the time the arbiter has answered
+            outcomes.append((True, task.result() if done else None))
+            task.cancel()
+        return outcomes
+
+    def _log_decision(self, state: SocraticState, next_agent: str, source: str, latency_ms: float):
+        """
+        Write an [ARBITER_DECISION] record; `python -m routing` trains and replays from these.
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            record = {
+                "text": routing_text(state["messages"]),
+                "agent": next_agent,
+                "source": source,
+                "latency_ms": round(latency_ms, 1),
+            }
+            logger.debug("[ARBITER_DECISION] %s", json.dumps(record, ensure_ascii=False))
+
+    def _arbiter_update(self, state: SocraticState, messages, response, latency_ms: float):
+        # We extract the name of the next agent (e.g., 'elenchus') 
+        # so the graph knows which edge to take.
+        next_agent = self._extract_next_agent(response.content)
+        self._log_decision(state, next_agent, "llm", latency_ms)
+        # include raw arbiter output for debugging; routing uses next_agent
+        update = {
+            "next_agent": next_agent,
+            "arbiter_raw": response.content,
+            "tokens_used": call_tokens(messages, response),
+        }
+        update.update(self._routing_record(state, next_agent, "llm"))
+        return update
+
+    def _routing_record(self, state: SocraticState, next_agent: str, source: str):
+        """
+        State fields recording one routing decision. routing_decisions and arbiter_skips cover the
+        current turn (they restart at iteration 0); routed_score and route_reuses are what the
+        routing policy compares against on the next back-edge.
+        """
+        with self._stats_lock:
+            self.routing_stats[source] += 1
+        iteration = int(state.get("iteration", 0) or 0)
+        decisions = list(state.get("routing_decisions") or []) if iteration else []
+        skips = int(state.get("arbiter_skips", 0) or 0) if iteration else 0
+        record = {"routing_decisions": decisions + [{"iteration": iteration, "agent": next_agent, "source": source}]}
+        if source == "reuse":
+            record.update(route_reuses=int(state.get("route_reuses", 0) or 0) + 1, arbiter_skips=skips + 1)
+        else:
+            record.update(
+                routed_score=float(state.get("mastery_score", 0.0) or 0.0),
+                route_reuses=0,
+                arbiter_skips=skips + (source == "rotate"),
+            )
+        return record
+
+    def _route_by_policy(self, state: SocraticState):
+        """
+        Ask the routing policy whether the previous decision still stands. Returns the arbiter
+        update, or None to route normally.
+        """
+        if self.routing.reuse is None:
+            return None
+        start = time.perf_counter()
+        next_agent, reason = self.routing.reuse.decide(state)
+        if next_agent is None:
+            return None
+        self._log_decision(state, next_agent, reason, (time.perf_counter() - start) * 1000)
+        update = {"next_agent": next_agent, "arbiter_raw": f"[policy {reason}] {next_agent}"}
+        update.update(self._routing_record(state, next_agent, reason))
+        return update
+
+    def _extract_next_agent(self, ai_output: str) -> str:
+        """
+        Next agent from the arbiter's reply (JSON in structured mode, free text otherwise).
+        Unparseable replies are counted and fall back to the free-text heuristics, then 'maieutics'.
+        """
+        if self.structured_output:
+            next_agent = self._parse_json_field(ai_output, "next_agent")
+            if next_agent in TEACHER_AGENTS:
+                return next_agent
+            self._record_parse_failure("arbiter", ai_output)
+            return self._parse_next_agent(ai_output)
+
+        next_agent = self._find_next_agent(ai_output)
+        if next_agent is None:
+            self._record_parse_failure("arbiter", ai_output)
+            return "maieutics"
+        return next_agent
+
+    def _extract_score(self, ai_output: str):
+        """
+        Mastery score from the dialectic's reply, or None (counted as a parse failure).
+        """
+        if self.structured_output:
+            score = self._parse_json_field(ai_output, "score")
+            if isinstance(score, bool) or not isinstance(score, (int, float)):
+                score = None
+        else:
+            score = self._find_score(ai_output)
+        if score is None:
+            self._record_parse_failure("dialectic", ai_output)
+            return None
+        return min(1.0, max(0.0, float(score)))
+
+    def _route_locally(self, state: SocraticState):
+        """
+        Ask the router for a confident decision. Returns the arbiter update, or None to defer to the LLM.
+        """
+        if self.routing.router is None:
+            return None
+        start = time.perf_counter()
+        next_agent, confidence = self.routing.router.route(state["messages"])
+        if next_agent is None:
+            return None
+        self._log_decision(state, next_agent, "router", (time.perf_counter() - start) * 1000)
+        update = {"next_agent": next_agent, "arbiter_raw": f"[router {confidence:.2f}] {next_agent}"}
+        update.update(self._routing_record(state, next_agent, "router"))
+        return update
+
+    def _get_speculation_pool(self):
+        if self._speculation_pool is None:
+            self._speculation_pool = ThreadPoolExecutor(
+                max_workers=1 + len(TEACHER_AGENTS), thread_name_prefix="speculate"
+            )
+        return self._speculation_pool
+
+    def _discard_speculation(self, future):
+        """
+        Done-callback for discarded teacher calls that were still running: count the tokens they wasted.
+        """
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._stats_lock:
+            self.speculation_stats["wasted_tokens"] += response_tokens(future.result())
+
+    def _speculative_steps(self, state: SocraticState):
+        """
+        Run the arbiter and all three teachers concurrently, keep the teacher the arbiter picks
+        and discard the rest. Discarded calls that have not started are cancelled; the async
+        driver cancels running ones too, the sync one lets them finish in the background. Their
+        tokens are counted as wasted, and count against the turn's max_tokens as far as they are
+        known when the arbiter decides: the whole call if it had finished, else its prompt.
+        """
+        start = time.perf_counter()
+        # Submit same-model calls back to back so Ollama serves them from one resident model
+        order = self.residency.order_roles(("arbiter",) + TEACHER_AGENTS, self.models)
+        prompts = {role: self._build_messages(role, state) for role in order}
+        handles = {}
+        for role in order:
+            handles[role] = yield _Start(role, prompts[role])
+
+        try:
+            arbiter_response = yield _Wait(handles["arbiter"])
+        except BaseException:
+            yield _Discard([handles[role] for role in TEACHER_AGENTS])
+            raise
+        arbiter_ms = (time.perf_counter() - start) * 1000
+        update = self._arbiter_update(state, prompts["arbiter"], arbiter_response, arbiter_ms)
+        chosen = update["next_agent"]
+
+        discarded = [role for role in TEACHER_AGENTS if role != chosen]
+        outcomes = yield _Discard([handles[role] for role in discarded])
+        wasted_tokens = 0
+        charged_tokens = 0
+        for role, (started, response) in zip(discarded, outcomes):
+            if response is not None:
+                wasted_tokens += response_tokens(response)
+                charged_tokens += call_tokens(prompts[role], response)
+            elif started:
+                charged_tokens += prompt_tokens(prompts[role], None)
+
+        chosen_response = yield _Wait(handles[chosen])
+        update["tokens_used"] += call_tokens(prompts[chosen], chosen_response) + charged_tokens
+        with self._stats_lock:
+            self.speculation_stats["iterations"] += 1
+            self.speculation_stats["discarded_calls"] += len(discarded)
+            self.speculation_stats["wasted_tokens"] += wasted_tokens
+
+        update.update({
+            "speculative_agent": chosen,
+            "speculative_message": chosen_response,
+            "speculation": {
+                "arbiter_ms": arbiter_ms,
+                "time_to_response_ms": (time.perf_counter() - start) * 1000,
+                "discarded": discarded,
+                "wasted_tokens_total": self.speculation_stats["wasted_tokens"],
+            },
+        })
+        return update
+
+    def _arbiter_steps(self, state: SocraticState):
+        """
+        Route the iteration, and drop the messages no node's window reaches from the state.
+        """
+        update = yield from self._route_steps(state)
+        removed = self._expired_messages(state)
+        if removed:
+            update = dict(update, messages=removed)
+        return update
+
+    def _route_steps(self, state: SocraticState):
+        local = self._route_by_policy(state) or self._route_locally(state)
+        if local is not None:
+            return local
+        if self.routing.speculative:
+            return (yield from self._speculative_steps(state))
+
+        start = time.perf_counter()
+        messages = self._build_messages("arbiter", state)
+        response = yield _Call("arbiter", messages)
+        return self._arbiter_update(state, messages, response, (time.perf_counter() - start) * 1000)
+
+    def _teacher_steps(self, role: str, state: SocraticState):
+        """
+        Shared body of the three teacher nodes. Reuses the speculative response when the
+        arbiter already generated one for this role.
+        """
+        speculative_message = state.get("speculative_message")
+        if speculative_message is not None and state.get("speculative_agent") == role:
+            return {"messages": [speculative_message], "speculative_message": None, "speculative_agent": ""}
+
+        messages = self._build_messages(role, state)
+        response = yield _Call(role, messages, stream=role in STREAMED_AGENTS)
+        return {"messages": [response], "tokens_used": call_tokens(messages, response)}
+
+    def _dialectic_steps(self, state: SocraticState):
+        if not self._should_score(state):
+            return self._skip_dialectic(state)
+        messages = self._build_messages("dialectic", state)
+        response = yield _Call("dialectic", messages)
+        return self._dialectic_update(state, messages, response)
 
     def arbiter_node(self, state: SocraticState):
         """
@@ -125,17 +873,7 @@ class SocraticAgents():
         Returns:
             dict: Contains the name of the next agent.
         """
-        # get prompt from prompt dict
-        prompt = self.prompts["arbiter"]
-        
-        messages = [SystemMessage(content=prompt)] + state["messages"]
-        response = self.arbiter_llm.invoke(messages)
-        
-        # We extract the name of the next agent (e.g., 'elenchus') 
-        # so the graph knows which edge to take.
-        next_agent = self._parse_next_agent(response.content)
-        # include raw arbiter output for debugging; routing uses next_agent
-        return {"next_agent": next_agent, "arbiter_raw": response.content}
+        return self._run(self._arbiter_steps(state))
 
     def elenchus_node(self, state: SocraticState):
         """
@@ -143,12 +881,7 @@ class SocraticAgents():
         Returns:
             dict: Contains the agent's response messages.
         """
-        prompt = self.prompts["elenchus"]
-
-        messages = [SystemMessage(content=prompt)] + state["messages"]
-        response = self.elenchus_llm.invoke(messages)
-
-        return {"messages": [response]}
+        return self._run(self._teacher_steps("elenchus", state))
 
     def aporia_node(self, state: SocraticState):
         """
@@ -156,12 +889,7 @@ class SocraticAgents():
         Returns:
             dict: Contains the agent's response messages.
         """
-        prompt = self.prompts["aporia"]
-
-        messages = [SystemMessage(content=prompt)] + state["messages"]
-        response = self.aporia_llm.invoke(messages)
-
-        return {"messages": [response]}
+        return self._run(self._teacher_steps("aporia", state))
 
     def maieutics_node(self, state: SocraticState):
         """
@@ -169,12 +897,7 @@ class SocraticAgents():
         Returns:
             dict: Contains the agent's response messages.
         """
-        prompt = self.prompts["maieutics"]
-
-        messages = [SystemMessage(content=prompt)] + state["messages"]
-        response = self.maieutics_llm.invoke(messages)
-
-        return {"messages": [response]}
+        return self._run(self._teacher_steps("maieutics", state))
 
     def dialectic_node(self, state: SocraticState):
         """
@@ -182,16 +905,96 @@ class SocraticAgents():
         Returns:
             dict: Contains the mastery score.
         """
-        prompt = self.prompts["dialectic"]
+        return self._run(self._dialectic_steps(state))
 
-        messages = [SystemMessage(content=prompt)] + state["messages"]
-        response = self.dialectic_llm.invoke(messages)
+    def _should_score(self, state: SocraticState) -> bool:
+        """
+        score_cadence N scores every Nth loop iteration; "user" scores once per learner message and
+        _dialectic_update then ends an unmastered turn with stop_reason "awaiting_user". Skipped
+        iterations keep the last mastery_score.
+        """
+        if self.score_cadence == SCORE_ON_USER_TURN:
+            # Mastery can only change once the learner has said something new
+            return state.get("scored_human_id") != last_human_id(state.get("messages") or [])
+        return int(state.get("iteration", 0) or 0) % self.score_cadence == 0
+
+    def _skip_dialectic(self, state: SocraticState):
+        """
+        Close the iteration without a dialectic LLM call. mastery_score and mastery_reached are
+        left as they are, and the reused score is not added to score_history so it cannot fake a
+        plateau.
+        """
+        with self._stats_lock:
+            self.scoring_stats["skipped"] += 1
+        iteration = int(state.get("iteration", 0) or 0) + 1
+        if self.score_cadence == SCORE_ON_USER_TURN:
+            stop_reason = "awaiting_user"
+        else:
+            stop_reason = budget_stop_reason(
+                state, iteration, int(state.get("tokens_used", 0) or 0), list(state.get("score_history") or [])
+            )
+        return {"iteration": iteration, "stop_reason": stop_reason}
 
-        score = self._parse_score(response.content)
+    def _dialectic_update(self, state: SocraticState, messages, response):
+        with self._stats_lock:
+            self.scoring_stats["scored"] += 1
+        score = self._extract_score(response.content)
+        if score is None:
+            # Keep the previous score rather than reporting a bogus 0.0
+            score = float(state.get("mastery_score", 0.0) or 0.0)
         threshold = float(state.get("mastery_threshold", 0.9) or 0.9)
+        mastery_reached = score >= threshold
+
+        # The dialectic closes one arbiter -> teacher -> dialectic iteration; check the loop budgets here
+        tokens = call_tokens(messages, response)
+        iteration = int(state.get("iteration", 0) or 0) + 1
+        score_history = list(state.get("score_history") or []) + [score]
+        stop_reason = "" if mastery_reached else budget_stop_reason(
+            state, iteration, int(state.get("tokens_used", 0) or 0) + tokens, score_history
+        )
+        if not mastery_reached and not stop_reason and self.score_cadence == SCORE_ON_USER_TURN:
+            # Nothing can move the score until the learner answers this teacher
+            stop_reason = "awaiting_user"
 
         return {
             "mastery_score": score,
-            "mastery_reached": score >= threshold,
+            "mastery_reached": mastery_reached,
             "dialectic_raw": response.content,
+            "tokens_used": tokens,
+            "iteration": iteration,
+            "score_history": score_history,
+            "stop_reason": stop_reason,
+            "scored_human_id": last_human_id(state.get("messages") or []),
         }
+
+    # Async node variants, used when the graph is driven with ainvoke/astream.
+
+    async def aarbiter_node(self, state: SocraticState):
+        """
+        Async arbiter node. See arbiter_node.
+        """
+        return await self._arun(self._arbiter_steps(state))
+
+    async def aelenchus_node(self, state: SocraticState):
+        """
+        Async elenchus node; streams its reply tokens. See elenchus_node.
+        """
+        return await self._arun(self._teacher_steps("elenchus", state))
+
+    async def aaporia_node(self, state: SocraticState):
+        """
+        Async aporia node; streams its reply tokens. See aporia_node.
+        """
+        return await self._arun(self._teacher_steps("aporia", state))
+
+    async def amaieutics_node(self, state: SocraticState):
+        """
+        Async maieutics node; streams its reply tokens. See maieutics_node.
+        """
+        return await self._arun(self._teacher_steps("maieutics", state))
+
+    async def adialectic_node(self, state: SocraticState):
+        """
+        Async dialectic node. See dialectic_node.
+        """
+        return await self._arun(self._dialectic_steps(state))
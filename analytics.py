@@ -0,0 +1,295 @@
+"""
+Per-iteration analytics of the teaching loop: which agent taught, how it was chosen, the mastery
+score after it, latency and tokens, for every loop iteration of every turn.
+
+AnalyticsStore is a column store: one raw little-endian array file per column (session, turn,
+iteration, agent, source, score, threshold, latency_ms, tokens, timestamp) plus a sessions.txt
+dictionary for session ids. Appending a turn appends a few bytes to each column file, and
+loading is one np.fromfile per column, so the queries below are NumPy passes over contiguous
+arrays (sorts, bincounts, histograms) and stay within seconds at millions of rows
+(python -m benchmarks.bench_analytics). TurnRecorder turns a graph run's stream updates into
+rows; main.py and batch_eval.py write them when an analytics directory is set.
+
+Usage:
+    python -m analytics report analytics/ [--bins 10]
+"""
+
+import argparse
+import math
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from routing import ROUTE_LABELS
+
+ANALYTICS_DIR = os.getenv("SOCRATIC_ANALYTICS_DIR", "analytics")
+# How each iteration's agent was chosen (see SocraticAgents.routing_stats)
+ROUTE_SOURCES = ("llm", "router", "reuse", "rotate")
+COLUMNS = {
+    "session": np.int32,
+    "turn": np.int32,
+    "iteration": np.int16,
+    "agent": np.int8,
+    "source": np.int8,
+    # NaN when the dialectic did not score the iteration
+    "score": np.float32,
+    "threshold": np.float32,
+    "latency_ms": np.float32,
+    "tokens": np.int32,
+    "timestamp": np.float64,
+}
+SESSIONS_FILE_NAME = "sessions.txt"
+
+
+def _code(labels, value) -> int:
+    return labels.index(value) if value in labels else -1
+
+
+class TurnRecorder:
+    """
+    Collects one row per loop iteration from a turn's "updates" stream: observe() every node
+    output, then read rows. An iteration ends at the dialectic's update (the one with "iteration").
+    """
+
+    def __init__(self, session: str, turn: int, threshold: float = 0.9):
+        self.session = session
+        self.turn = turn
+        self.threshold = threshold
+        self.rows = []
+        self._reset(time.perf_counter())
+
+    def _reset(self, start: float):
+        self._start = start
+        self._agent = None
+        self._source = None
+        self._tokens = 0
+
+    def observe(self, node_name: str, output: dict):
+        if not output:
+            return
+        self._tokens += int(output.get("tokens_used") or 0)
+        if node_name == "arbiter" and output.get("next_agent"):
+            self._agent = output["next_agent"]
+            decisions = output.get("routing_decisions")
+            self._source = decisions[-1]["source"] if decisions else "llm"
+        if "iteration" not in output:
+            return
+        now = time.perf_counter()
+        score = output.get("mastery_score")
+        self.rows.append({
+            "session": self.session,
+            "turn": self.turn,
+            "iteration": int(output["iteration"]),
+            "agent": self._agent,
+            "source": self._source,
+            "score": math.nan if score is None else float(score),
+            "threshold": self.threshold,
+            "latency_ms": (now - self._start) * 1000,
+            "tokens": self._tokens,
+            "timestamp": time.time(),
+        })
+        self._reset(now)
+
+
+class AnalyticsStore:
+    """
+    Append-only column store of iteration rows, in the directory path (in memory when None).
+    A column file cut short by an interrupted append is trimmed back to the last whole row.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path is not None else None
+        self.sessions = []
+        self._chunks = {name: [] for name in COLUMNS}
+        self._rows = 0
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            sessions_file = self.path / SESSIONS_FILE_NAME
+            if sessions_file.exists():
+                self.sessions = sessions_file.read_text(encoding="utf-8").splitlines()
+            sizes = [self._column_path(name).stat().st_size // np.dtype(dtype).itemsize
+                     if self._column_path(name).exists() else 0 for name, dtype in COLUMNS.items()]
+            self._rows = min(sizes)
+            for name, dtype in COLUMNS.items():
+                column_path = self._column_path(name)
+                if column_path.exists() and column_path.stat().st_size != self._rows * np.dtype(dtype).itemsize:
+                    os.truncate(column_path, self._rows * np.dtype(dtype).itemsize)
+        self._session_codes = {session: code for code, session in enumerate(self.sessions)}
+
+    def __len__(self):
+        return self._rows
+
+    def _column_path(self, name: str) -> Path:
+        return self.path / f"{name}.bin"
+
+    def session_code(self, session: str) -> int:
+        code = self._session_codes.get(session)
+        if code is None:
+            code = self._session_codes[session] = len(self.sessions)
+            self.sessions.append(session)
+            if self.path is not None:
+                with (self.path / SESSIONS_FILE_NAME).open("a", encoding="utf-8") as file:
+                    file.write(session + "\n")
+        return code
+
+    def append(self, rows):
+        """
+        Append rows as written by TurnRecorder (session, agent and source as strings).
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        columns = {name: [row[name] for row in rows] for name in COLUMNS}
+        columns["session"] = [self.session_code(session) for session in columns["session"]]
+        columns["agent"] = [_code(ROUTE_LABELS, agent) for agent in columns["agent"]]
+        columns["source"] = [_code(ROUTE_SOURCES, source) for source in columns["source"]]
+        self.append_columns(columns)
+
+    def append_columns(self, columns: dict):
+        """
+        Append already-encoded columns (equal-length sequences, one per name in COLUMNS).
+        """
+        arrays = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"columns have different lengths: {sorted(lengths)}")
+        if self.path is None:
+            for name, array in arrays.items():
+                self._chunks[name].append(array)
+        else:
+            for name, array in arrays.items():
+                with self._column_path(name).open("ab") as file:
+                    file.write(array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes())
+        self._rows += lengths.pop()
+
+    def columns(self) -> dict:
+        """
+        Every column as a NumPy array, in append order.
+        """
+        if self.path is None:
+            return {name: np.concatenate(chunks) if chunks else np.empty(0, dtype)
+                    for (name, dtype), chunks in zip(COLUMNS.items(), self._chunks.values())}
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            column_path = self._column_path(name)
+            dtype = np.dtype(dtype).newbyteorder("<")
+            columns[name] = np.fromfile(column_path, dtype=dtype, count=self._rows) if column_path.exists() \
+                else np.empty(0, dtype)
+        return columns
+
+
+def _session_order(columns: dict) -> np.ndarray:
+    # Rows of one session are appended in order, but sessions run concurrently can interleave
+    return np.argsort(columns["session"], kind="stable")
+
+
+def convergence_by_agent(columns: dict) -> dict:
+    """
+    Per teaching agent: iterations taught, share chosen without the arbiter LLM, mean latency and
+    tokens, and the mean change in mastery score over the iterations it taught (each scored
+    iteration against the session's previous score).
+    """
+    labels = len(ROUTE_LABELS)
+    # Agent codes shifted by one so unknown agents (-1) land in bin 0 and are dropped
+    agent = columns["agent"].astype(np.intp) + 1
+
+    def per_agent(codes, weights=None):
+        return np.bincount(codes, weights=weights, minlength=labels + 1)[1:]
+
+    rows = per_agent(agent)
+    skipped = per_agent(agent, columns["source"] > 0)
+    latency = per_agent(agent, columns["latency_ms"])
+    tokens = per_agent(agent, columns["tokens"])
+
+    scored = np.flatnonzero(~np.isnan(columns["score"]))
+    scored = scored[np.argsort(columns["session"][scored], kind="stable")]
+    scored_session = columns["session"][scored]
+    scored_score = columns["score"][scored].astype(np.float64)
+    follows = scored_session[1:] == scored_session[:-1]
+    gain = (scored_score[1:] - scored_score[:-1])[follows]
+    gain_agent = agent[scored][1:][follows]
+    gains = per_agent(gain_agent)
+    gain_sum = per_agent(gain_agent, gain)
+
+    report = {}
+    for code, name in enumerate(ROUTE_LABELS):
+        report[name] = {
+            "iterations": int(rows[code]),
+            "without_arbiter_llm": float(skipped[code] / rows[code]) if rows[code] else 0.0,
+            "mean_latency_ms": float(latency[code] / rows[code]) if rows[code] else 0.0,
+            "mean_tokens": float(tokens[code] / rows[code]) if rows[code] else 0.0,
+            "scored_gains": int(gains[code]),
+            "mean_gain": float(gain_sum[code] / gains[code]) if gains[code] else 0.0,
+        }
+    return report
+
+
+def iterations_to_mastery(columns: dict) -> dict:
+    """
+    Over turns: how many reached the mastery threshold, and the mean / median loop iteration
+    at which they first did.
+    """
+    order = _session_order(columns)
+    session, turn = columns["session"][order], columns["turn"][order]
+    if not len(order):
+        return {"turns": 0, "mastered_turns": 0, "mastery_rate": 0.0, "mean_iterations": 0.0, "median_iterations": 0.0}
+    # A session's turns run one after another, so each turn's rows are contiguous in session order
+    turn_id = np.concatenate(([0], np.cumsum((session[1:] != session[:-1]) | (turn[1:] != turn[:-1]))))
+    turns = int(turn_id[-1]) + 1
+    reached = columns["score"][order] >= columns["threshold"][order]
+    reached_turn = turn_id[reached]
+    first = np.concatenate(([True], reached_turn[1:] != reached_turn[:-1])) if len(reached_turn) else reached_turn
+    iterations = columns["iteration"][order][reached][first.astype(bool)].astype(np.float64)
+    return {
+        "turns": turns,
+        "mastered_turns": int(len(iterations)),
+        "mastery_rate": len(iterations) / turns,
+        "mean_iterations": float(iterations.mean()) if len(iterations) else 0.0,
+        "median_iterations": float(np.median(iterations)) if len(iterations) else 0.0,
+    }
+
+
+def score_distribution(columns: dict, bins: int = 10, by_agent: bool = False) -> dict:
+    """
+    Histogram of the scored iterations' mastery scores over [0, 1] ({"edges", "counts"}),
+    or one histogram per agent with by_agent.
+    """
+    scored = ~np.isnan(columns["score"])
+    if not by_agent:
+        counts, edges = np.histogram(columns["score"][scored], bins=bins, range=(0.0, 1.0))
+        return {"edges": edges.tolist(), "counts": counts.tolist()}
+    return {
+        name: score_distribution({"score": columns["score"][scored & (columns["agent"] == code)]}, bins)
+        for code, name in enumerate(ROUTE_LABELS)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report on the per-iteration analytics store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="convergence, iterations to mastery and score histogram")
+    report_parser.add_argument("path", nargs="?", default=ANALYTICS_DIR)
+    report_parser.add_argument("--bins", type=int, default=10)
+    args = parser.parse_args()
+
+    store = AnalyticsStore(args.path)
+    columns = store.columns()
+    mastery = iterations_to_mastery(columns)
+    print(f"{len(store)} iterations over {mastery['turns']} turns in {len(store.sessions)} sessions")
+    print(f"mastery reached in {mastery['mastered_turns']} turns ({mastery['mastery_rate']:.1%}), "
+          f"after {mastery['mean_iterations']:.2f} iterations on average (median {mastery['median_iterations']:.0f})")
+    print()
+    print(f"{'agent':<10} {'iters':>8} {'no LLM':>7} {'gain':>7} {'ms':>8} {'tokens':>8}")
+    for name, row in convergence_by_agent(columns).items():
+        print(f"{name:<10} {row['iterations']:>8} {row['without_arbiter_llm']:>7.1%} {row['mean_gain']:>+7.3f} "
+              f"{row['mean_latency_ms']:>8.0f} {row['mean_tokens']:>8.0f}")
+    print()
+    histogram = score_distribution(columns, args.bins)
+    for low, count in zip(histogram["edges"], histogram["counts"]):
+        print(f"{low:.2f}+ {count:>10}")
+
+
+if __name__ == "__main__":
+    main()
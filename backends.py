@@ -0,0 +1,395 @@
+"""
+Registry of Ollama endpoints (separate `ollama serve` processes, on other ports or hosts) and
+the transport that spreads each agent role's requests across them.
+
+Every role maps to a list of endpoint URLs. Each endpoint keeps its own OllamaPool (keep-alive
+connections, per-model limits and busy retries), and the registry's transport picks the
+endpoint for each request:
+  - endpoints that are down (failed health check, or a connection error within the last
+    cooldown seconds) are tried last,
+  - a model is pinned to the endpoints where it is resident (/api/ps, or it served a request
+    there), so it is not loaded onto another host while those have fewer than spill_at requests
+    outstanding; endpoints known not to have the model (/api/tags, or a 404) come last,
+  - ties go to the endpoint with the fewest outstanding requests (until the reply is read).
+Connection errors, a full model queue, 404s and 5xx replies fail over to the next endpoint.
+Health checks (/api/tags and /api/ps) run on demand with check_health() or in the background
+with start_health_checks().
+
+Configure with SOCRATIC_OLLAMA_HOSTS (comma-separated URLs for every role) and optionally
+SOCRATIC_OLLAMA_HOSTS_<ROLE> (e.g. SOCRATIC_OLLAMA_HOSTS_ARBITER) to give a role its own hosts,
+then pass SocraticAgents(transport=BackendRegistry.from_env()).
+"""
+
+import os
+import threading
+import time
+
+import httpx
+
+from ollama_pool import OllamaBusyError, OllamaPool, _AsyncReleasingStream, _once, _ReleasingStream, request_model
+
+OLLAMA_HOSTS = os.getenv("SOCRATIC_OLLAMA_HOSTS", "")
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("SOCRATIC_OLLAMA_HEALTH_INTERVAL", "15"))
+HEALTH_CHECK_TIMEOUT_SECONDS = 2.0
+# How long an endpoint that failed a request is tried last before it is given another chance
+FAILURE_COOLDOWN_SECONDS = float(os.getenv("SOCRATIC_OLLAMA_FAILURE_COOLDOWN", "30"))
+# Outstanding requests on every endpoint holding a model before it is also sent to other endpoints
+SPILL_OUTSTANDING = int(os.getenv("SOCRATIC_OLLAMA_SPILL_OUTSTANDING", "4"))
+FAILOVER_STATUS_CODES = frozenset({404})
+
+
+def model_key(name: str) -> str:
+    """
+    Ollama model name with the implicit ":latest" tag made explicit, so names compare equal.
+    """
+    return name if ":" in name else f"{name}:latest"
+
+
+def _endpoint_url(base_url: httpx.URL, url: httpx.URL) -> httpx.URL:
+    """
+    url moved onto base_url: its scheme, host and port, with base_url's path (e.g. a reverse
+    proxy's /ollama) in front of url's path. The query is kept.
+    """
+    return url.copy_with(
+        scheme=base_url.scheme, host=base_url.host, port=base_url.port,
+        path=base_url.path.rstrip("/") + url.path,
+    )
+
+
+def _retarget(request: httpx.Request, base_url: httpx.URL) -> httpx.Request:
+    """
+    Copy of request (body already read) sent to base_url instead.
+    """
+    url = _endpoint_url(base_url, request.url)
+    headers = [(key, value) for key, value in request.headers.raw if key.lower() != b"host"]
+    return httpx.Request(request.method, url, headers=headers, content=request.content, extensions=request.extensions)
+
+
+class Endpoint:
+    """
+    One Ollama server: its pool, health and what it is known to hold. available is None until
+    a health check has listed its models.
+    """
+
+    def __init__(self, url: str, pool: OllamaPool):
+        self.url = httpx.URL(url)
+        self.pool = pool
+        self.healthy = True
+        self.retry_at = 0.0
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.available = None
+        self.resident = set()
+
+    def usable(self, now: float) -> bool:
+        return self.healthy or now >= self.retry_at
+
+    def snapshot(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "resident": sorted(self.resident),
+        }
+
+
+class BackendRegistry:
+    """
+    Role -> endpoints map with least-outstanding selection, failover and model pinning.
+    hosts are used for every role not in role_hosts. pool_factory() builds each endpoint's
+    OllamaPool; tests pass one with a mock transport or no retries.
+    """
+
+    def __init__(self, hosts=(), role_hosts=None, pool_factory=OllamaPool, spill_at: int = SPILL_OUTSTANDING,
+                 cooldown: float = FAILURE_COOLDOWN_SECONDS, health_timeout: float = HEALTH_CHECK_TIMEOUT_SECONDS,
+                 clock=time.monotonic):
+        self._endpoints = {}
+        self._pool_factory = pool_factory
+        self.default_hosts = [self._endpoint(url) for url in hosts]
+        self.role_hosts = {role: [self._endpoint(url) for url in urls] for role, urls in (role_hosts or {}).items()}
+        if not self._endpoints:
+            raise ValueError("BackendRegistry needs at least one endpoint")
+        self.spill_at = spill_at
+        self.cooldown = cooldown
+        self.health_timeout = health_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._transports = {}
+        self._health_thread = None
+        self._stop_health = threading.Event()
+        self.stats = {"requests": 0, "failovers": 0}
+
+    @classmethod
+    def from_env(cls, roles=(), **kwargs):
+        """
+        Registry from SOCRATIC_OLLAMA_HOSTS / SOCRATIC_OLLAMA_HOSTS_<ROLE>, or None when no host
+        is configured (one local server, the default).
+        """
+        def split(value):
+            return [url.strip() for url in value.split(",") if url.strip()]
+
+        role_hosts = {}
+        for role in roles:
+            urls = split(os.getenv(f"SOCRATIC_OLLAMA_HOSTS_{role.upper()}", ""))
+            if urls:
+                role_hosts[role] = urls
+        hosts = split(OLLAMA_HOSTS)
+        if not hosts and not role_hosts:
+            return None
+        return cls(hosts, role_hosts, **kwargs)
+
+    def _endpoint(self, url: str) -> Endpoint:
+        key = str(httpx.URL(url))
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            endpoint = self._endpoints[key] = Endpoint(url, self._pool_factory())
+        return endpoint
+
+    @property
+    def endpoints(self) -> list:
+        return list(self._endpoints.values())
+
+    def endpoints_for(self, role=None) -> list:
+        """
+        Endpoints serving role; every endpoint for role None (e.g. model preloads).
+        """
+        if role is None:
+            return self.endpoints
+        return self.role_hosts.get(role) or self.default_hosts or self.endpoints
+
+    def _rank(self, endpoint: Endpoint, model, now: float):
+        if model is None:
+            tier = 1
+        elif model in endpoint.resident and endpoint.outstanding < self.spill_at:
+            tier = 0
+        elif endpoint.available is None or model in endpoint.available or model in endpoint.resident:
+            tier = 1
+        else:
+            tier = 2
+        return (not endpoint.usable(now), tier, endpoint.outstanding, endpoint.requests)
+
+    def select(self, role=None, model=None, exclude=()):
+        """
+        Claim the best endpoint for a request (counted as outstanding until finish() is called),
+        or None when every candidate is in exclude.
+        """
+        model = model_key(model) if model else None
+        with self._lock:
+            now = self._clock()
+            candidates = [e for e in self.endpoints_for(role) if e not in exclude]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=lambda e: self._rank(e, model, now))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            self.stats["requests"] += 1
+            return endpoint
+
+    def finish(self, endpoint: Endpoint, model=None, status_code=None, error=None):
+        """
+        Record the outcome of a request sent to endpoint by select(). A transport error marks the
+        endpoint down for cooldown seconds; a reply marks it up and updates where model is pinned.
+        """
+        model = model_key(model) if model else None
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is not None:
+                endpoint.failures += 1
+                if isinstance(error, httpx.TransportError):
+                    endpoint.healthy = False
+                    endpoint.retry_at = self._clock() + self.cooldown
+                return
+            if status_code is None:
+                return
+            endpoint.healthy = True
+            if model is None:
+                return
+            if status_code == 404:
+                endpoint.resident.discard(model)
+                if endpoint.available is not None:
+                    endpoint.available.discard(model)
+            elif status_code < 400:
+                # Ollama keeps a model loaded after serving it; pin the model here
+                endpoint.resident.add(model)
+
+    def _count_failover(self):
+        with self._lock:
+            self.stats["failovers"] += 1
+
+    def check_health(self) -> dict:
+        """
+        Poll every endpoint's /api/tags and /api/ps. Returns {url: healthy}.
+        """
+        results = {}
+        for endpoint in self.endpoints:
+            try:
+                with httpx.Client(transport=endpoint.pool.transport, timeout=self.health_timeout) as client:
+                    tags = client.get(_endpoint_url(endpoint.url, httpx.URL("/api/tags")))
+                    tags.raise_for_status()
+                    ps = client.get(_endpoint_url(endpoint.url, httpx.URL("/api/ps")))
+                    ps.raise_for_status()
+                available = {model_key(m.get("name") or m.get("model")) for m in tags.json().get("models") or []}
+                resident = {model_key(m.get("name") or m.get("model")) for m in ps.json().get("models") or []}
+            except (httpx.HTTPError, ValueError):
+                with self._lock:
+                    endpoint.healthy = False
+                    endpoint.retry_at = self._clock() + self.cooldown
+                results[str(endpoint.url)] = False
+                continue
+            with self._lock:
+                endpoint.healthy = True
+                endpoint.available = available
+                endpoint.resident = resident
+            results[str(endpoint.url)] = True
+        return results
+
+    def start_health_checks(self, interval: float = HEALTH_CHECK_INTERVAL_SECONDS):
+        """
+        Run check_health() now and then every interval seconds on a daemon thread.
+        """
+        if self._health_thread is not None:
+            return
+
+        def loop():
+            while True:
+                self.check_health()
+                if self._stop_health.wait(interval):
+                    return
+
+        self._stop_health.clear()
+        self._health_thread = threading.Thread(target=loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        if self._health_thread is not None:
+            self._stop_health.set()
+            self._health_thread.join()
+            self._health_thread = None
+
+    def transport(self, role=None):
+        return self._transport(role, _RoutingTransport)
+
+    def async_transport(self, role=None):
+        return self._transport(role, _AsyncRoutingTransport)
+
+    def _transport(self, role, cls):
+        with self._lock:
+            transport = self._transports.get((role, cls))
+            if transport is None:
+                transport = self._transports[(role, cls)] = cls(self, role)
+            return transport
+
+    def client_kwargs(self, role=None) -> dict:
+        """
+        ChatOllama / OllamaEmbeddings keyword arguments that route role's requests through the registry.
+        """
+        return {
+            "sync_client_kwargs": {"transport": self.transport(role)},
+            "async_client_kwargs": {"transport": self.async_transport(role)},
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {str(endpoint.url): endpoint.snapshot() for endpoint in self.endpoints}
+
+    def close(self):
+        self.stop_health_checks()
+        for endpoint in self.endpoints:
+            endpoint.pool.close()
+
+    async def aclose(self):
+        for endpoint in self.endpoints:
+            await endpoint.pool.aclose()
+
+
+def _should_fail_over(response: httpx.Response) -> bool:
+    return response.status_code in FAILOVER_STATUS_CODES or response.status_code >= 500
+
+
+class _RoutingTransport(httpx.BaseTransport):
+
+    def __init__(self, registry: BackendRegistry, role):
+        self.registry = registry
+        self.role = role
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        registry = self.registry
+        request.read()
+        model = request_model(request)
+        tried = []
+        while True:
+            endpoint = registry.select(self.role, model, exclude=tried)
+            tried.append(endpoint)
+            last = len(tried) == len(registry.endpoints_for(self.role))
+            try:
+                response = endpoint.pool.transport.handle_request(_retarget(request, endpoint.url))
+            except (httpx.TransportError, OllamaBusyError) as exc:
+                registry.finish(endpoint, model, error=exc)
+                if last:
+                    raise
+                registry._count_failover()
+                continue
+            except BaseException:
+                registry.finish(endpoint, model)
+                raise
+            if _should_fail_over(response) and not last:
+                response.close()
+                registry.finish(endpoint, model, response.status_code)
+                registry._count_failover()
+                continue
+            done = _once(lambda: registry.finish(endpoint, model, response.status_code))
+            return httpx.Response(
+                response.status_code,
+                headers=response.headers,
+                stream=_ReleasingStream(response.stream, done),
+                extensions=response.extensions,
+            )
+
+    def close(self):
+        # Shared by every client of the role; the endpoint pools are closed by BackendRegistry.close()
+        pass
+
+
+class _AsyncRoutingTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, registry: BackendRegistry, role):
+        self.registry = registry
+        self.role = role
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        registry = self.registry
+        await request.aread()
+        model = request_model(request)
+        tried = []
+        while True:
+            endpoint = registry.select(self.role, model, exclude=tried)
+            tried.append(endpoint)
+            last = len(tried) == len(registry.endpoints_for(self.role))
+            try:
+                response = await endpoint.pool.async_transport.handle_async_request(_retarget(request, endpoint.url))
+            except (httpx.TransportError, OllamaBusyError) as exc:
+                registry.finish(endpoint, model, error=exc)
+                if last:
+                    raise
+                registry._count_failover()
+                continue
+            except BaseException:
+                registry.finish(endpoint, model)
+                raise
+            if _should_fail_over(response) and not last:
+                await response.aclose()
+                registry.finish(endpoint, model, response.status_code)
+                registry._count_failover()
+                continue
+            done = _once(lambda: registry.finish(endpoint, model, response.status_code))
+            return httpx.Response(
+                response.status_code,
+                headers=response.headers,
+                stream=_AsyncReleasingStream(response.stream, done),
+                extensions=response.extensions,
+            )
+
+    async def aclose(self):
+        pass
@@ -0,0 +1,236 @@
+"""
+Batch evaluation: replay a directory of recorded learner sessions through create_agent_graph.
+
+Each input file is one session, either a transcript (.json: {"id", "turns": [learner messages],
+optionally "scripts" for the fake backend}) or a history log written by main.py / the server
+(.jsonl: the learner messages are replayed, the recorded agent replies are ignored).
+Sessions run concurrently on a pool of workers; turns within a session stay in order.
+
+One JSONL record is written per session as soon as it finishes: per-turn routing decisions,
+mastery trajectory, stop reason and latency; with --analytics the per-iteration rows also go to
+an analytics.AnalyticsStore for aggregate queries. Sessions already in the output are skipped, so an
+interrupted run resumes where it stopped. Sessions that failed are retried.
+
+Usage:
+    python -m batch_eval SESSIONS_DIR --output results.jsonl [--concurrency 4] [--fake] [--analytics DIR] [--cache]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from analytics import AnalyticsStore, TurnRecorder
+from history import CONTEXT_TOKEN_BUDGET, TokenIndex, load_history
+
+DEFAULT_CONCURRENCY = 4
+SESSION_SUFFIXES = (".json", ".jsonl")
+
+
+def load_session(path: Path) -> dict:
+    """
+    Read one session file as {"id", "turns", "scripts"}.
+    """
+    if path.suffix == ".jsonl":
+        turns = [m.content for m in load_history(path) if isinstance(m, HumanMessage)]
+        return {"id": path.stem, "turns": turns, "scripts": None}
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return {"id": data.get("id") or path.stem, "turns": data["turns"], "scripts": data.get("scripts")}
+
+
+def session_paths(directory) -> list:
+    return sorted(p for p in Path(directory).iterdir() if p.suffix in SESSION_SUFFIXES and p.is_file())
+
+
+def completed_ids(output_path: Path) -> set:
+    """
+    Ids of sessions that already have a successful record in output_path. A line cut short by
+    an interrupted run is ignored.
+    """
+    if not output_path.exists():
+        return set()
+    done = set()
+    for line in output_path.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record.get("status") == "ok":
+            done.add(record["id"])
+    return done
+
+
+async def evaluate_session(graph, session: dict, context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+                           mastery_threshold: float = 0.9, analytics=None) -> dict:
+    """
+    Run every learner turn of session through graph (stateless, like server.py) and record it.
+    The iteration rows are appended to analytics (analytics.AnalyticsStore) when given, once the
+    whole session has run, so a failed session that is retried is not counted twice.
+    """
+    token_index = TokenIndex()
+    mastery_score = 0.0
+    turns = []
+    rows = []
+    start = time.perf_counter()
+    for turn_number, text in enumerate(session["turns"]):
+        recorder = TurnRecorder(session["id"], turn_number, mastery_threshold) if analytics is not None else None
+        user_message = HumanMessage(content=text)
+        token_index.append(user_message)
+        graph_input = {
+            "messages": token_index.cap(context_token_budget),
+            "mastery_score": mastery_score,
+            "mastery_threshold": mastery_threshold,
+            "mastery_reached": False,
+        }
+        turn = {"routes": [], "scores": [], "stop_reason": "", "iterations": 0}
+        agent_messages = []
+        turn_start = time.perf_counter()
+        async for event in graph.astream(graph_input):
+            for node_name, output in event.items():
+                if not output:
+                    continue
+                if recorder is not None:
+                    recorder.observe(node_name, output)
+                agent_messages.extend(m for m in output.get("messages") or [] if isinstance(m, AIMessage))
+                if node_name == "arbiter" and output.get("next_agent"):
+                    turn["routes"].append(output["next_agent"])
+                if "mastery_score" in output:
+                    mastery_score = output["mastery_score"]
+                    turn["scores"].append(mastery_score)
+                if "iteration" in output:
+                    turn["iterations"] = output["iteration"]
+                    turn["stop_reason"] = output.get("stop_reason") or ""
+        turn["latency_ms"] = round((time.perf_counter() - turn_start) * 1000, 3)
+        token_index.extend(agent_messages)
+        turns.append(turn)
+        if recorder is not None:
+            rows.extend(recorder.rows)
+
+    if analytics is not None:
+        analytics.append(rows)
+
+    return {
+        "id": session["id"],
+        "status": "ok",
+        "turns": turns,
+        "mastery_trajectory": [turn["scores"][-1] if turn["scores"] else None for turn in turns],
+        "final_mastery": mastery_score,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+async def run_batch(paths, output_path, build_graph, concurrency: int = DEFAULT_CONCURRENCY,
+                    context_token_budget: int = CONTEXT_TOKEN_BUDGET, analytics=None) -> dict:
+    """
+    Evaluate every session in paths not yet completed in output_path, concurrency at a time.
+    build_graph(session) returns the graph to run a session with. Returns run totals.
+    """
+    output_path = Path(output_path)
+    done = completed_ids(output_path)
+    queue = asyncio.Queue()
+    skipped = 0
+    for path in paths:
+        if Path(path).resolve() == output_path.resolve():
+            continue
+        session = load_session(path)
+        if not session["turns"]:
+            continue
+        if session["id"] in done:
+            skipped += 1
+        else:
+            queue.put_nowait(session)
+
+    totals = {"sessions": 0, "turns": 0, "errors": 0, "skipped": skipped}
+    start = time.perf_counter()
+    with output_path.open("a", encoding="utf-8") as output:
+        # Terminate a line cut short by an interrupted run before appending
+        if output.tell() and not output_path.read_bytes().endswith(b"\n"):
+            output.write("\n")
+
+        def write(record):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+
+        async def worker():
+            while True:
+                try:
+                    session = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    record = await evaluate_session(
+                        build_graph(session), session, context_token_budget, analytics=analytics
+                    )
+                except Exception as exc:
+                    totals["errors"] += 1
+                    write({"id": session["id"], "status": "error", "error": repr(exc)})
+                    continue
+                totals["sessions"] += 1
+                totals["turns"] += len(record["turns"])
+                write(record)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    totals["seconds"] = time.perf_counter() - start
+    return totals
+
+
+def main():
+    from agent_graph import create_agent_graph
+    from agents import SCORE_ON_USER_TURN, SocraticAgents
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sessions", help="directory of .json transcripts and/or .jsonl history logs")
+    parser.add_argument("--output", required=True, help="JSONL results file (appended to; resumes)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="sessions run at once")
+    parser.add_argument("--context-token-budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--score-cadence", default="1",
+                        help='dialectic scoring cadence: "user" or every N iterations (default 1)')
+    parser.add_argument("--fake", action="store_true",
+                        help="use the offline fake backend with each transcript's scripts")
+    parser.add_argument("--analytics", help="also append per-iteration rows to this analytics directory")
+    parser.add_argument("--cache", action="store_true",
+                        help="serve repeated arbiter/dialectic calls from the response cache (off: latencies "
+                             "and routing do not depend on which sessions ran first)")
+    args = parser.parse_args()
+    score_cadence = args.score_cadence if args.score_cadence == SCORE_ON_USER_TURN else int(args.score_cadence)
+    # None: SocraticAgents' default in-memory ResponseCache
+    cache = None if args.cache else False
+
+    if args.fake:
+        from benchmarks.fake_llm import fake_llm_factory
+
+        def build_graph(session):
+            factory = fake_llm_factory(scripts=session["scripts"])
+            return create_agent_graph(SocraticAgents(llm_factory=factory, score_cadence=score_cadence, cache=cache))
+    else:
+        from agents import TEMPERATURES
+        from backends import BackendRegistry
+        from ollama_pool import OllamaPool
+
+        # One set of agents for every session: sessions share the clients and one connection pool
+        # (one per endpoint when SOCRATIC_OLLAMA_HOSTS spreads them over several servers)
+        backends = BackendRegistry.from_env(roles=TEMPERATURES)
+        graph = create_agent_graph(SocraticAgents(
+            context_switch=True, score_cadence=score_cadence, cache=cache,
+            transport=backends if backends is not None else OllamaPool(),
+        ))
+
+        def build_graph(session):
+            return graph
+
+    analytics = AnalyticsStore(args.analytics) if args.analytics else None
+    totals = asyncio.run(run_batch(
+        session_paths(args.sessions), args.output, build_graph, args.concurrency, args.context_token_budget,
+        analytics,
+    ))
+    rate = totals["turns"] / totals["seconds"] if totals["seconds"] else 0.0
+    print(f"{totals['sessions']} sessions ({totals['turns']} turns) in {totals['seconds']:.1f}s, "
+          f"{rate:.1f} turns/sec; {totals['skipped']} already done, {totals['errors']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Micro-benchmarks for the Socratic agent loop. Run from the repository root, e.g.
+`python -m benchmarks.bench_token_index`.
+"""
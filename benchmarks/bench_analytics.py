@@ -0,0 +1,118 @@
+"""
+Analytics queries at scale: fills an AnalyticsStore with synthetic sessions (1-5 loop iterations
+per turn, scores drifting towards mastery, a share of routing decisions reused) and times
+writing, loading and each query. For comparison, the same convergence and iterations-to-mastery
+figures are computed with a plain Python loop over the rows.
+
+Usage: python -m benchmarks.bench_analytics [--rows 2000000] [--turns-per-session 20]
+"""
+
+import argparse
+import math
+import tempfile
+import time
+
+import numpy as np
+
+from analytics import AnalyticsStore, convergence_by_agent, iterations_to_mastery, score_distribution
+
+WRITE_CHUNK_ROWS = 100_000
+
+
+def synthetic_columns(rows: int, turns_per_session: int = 20, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    iterations_per_turn = rng.integers(1, 6, size=rows // 3 + 1)
+    iterations_per_turn = iterations_per_turn[:np.searchsorted(np.cumsum(iterations_per_turn), rows) + 1]
+    turn_ids = np.repeat(np.arange(len(iterations_per_turn)), iterations_per_turn)[:rows]
+    starts = np.cumsum(iterations_per_turn) - iterations_per_turn
+    iteration = (np.arange(rows) - starts[turn_ids] + 1).astype(np.int16)
+    agent = rng.integers(0, 3, size=rows).astype(np.int8)
+    # Each agent moves the score by a different amount on average
+    score = np.clip(0.1 * iteration + rng.normal(0.1, 0.15, size=rows) + 0.05 * agent, 0.0, 1.0).astype(np.float32)
+    score[rng.random(rows) < 0.3] = np.nan
+    return {
+        "session": (turn_ids // turns_per_session).astype(np.int32),
+        "turn": (turn_ids % turns_per_session).astype(np.int32),
+        "iteration": iteration,
+        "agent": agent,
+        "source": rng.choice(np.array([0, 1, 2, 3], dtype=np.int8), size=rows, p=[0.5, 0.1, 0.35, 0.05]),
+        "score": score,
+        "threshold": np.full(rows, 0.9, dtype=np.float32),
+        "latency_ms": rng.gamma(4.0, 250.0, size=rows).astype(np.float32),
+        "tokens": rng.integers(200, 2000, size=rows).astype(np.int32),
+        "timestamp": np.linspace(1.7e9, 1.7e9 + rows, rows),
+    }
+
+
+def python_queries(columns: dict):
+    """
+    Mean score gain per agent and mean iterations to mastery, one row at a time.
+    """
+    rows = zip(*(columns[name].tolist() for name in ("session", "turn", "iteration", "agent", "score", "threshold")))
+    last_score = {}
+    gains = {}
+    first_mastery = {}
+    turns = set()
+    for session, turn, iteration, agent, score, threshold in rows:
+        turns.add((session, turn))
+        if math.isnan(score):
+            continue
+        if session in last_score:
+            total, count = gains.get(agent, (0.0, 0))
+            gains[agent] = (total + score - last_score[session], count + 1)
+        last_score[session] = score
+        if score >= threshold and (session, turn) not in first_mastery:
+            first_mastery[(session, turn)] = iteration
+    mean_gain = {agent: total / count for agent, (total, count) in gains.items()}
+    return mean_gain, sum(first_mastery.values()) / max(len(first_mastery), 1), len(turns)
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(rows: int = 2_000_000, turns_per_session: int = 20) -> dict:
+    columns = synthetic_columns(rows, turns_per_session)
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnalyticsStore(tmp)
+        start = time.perf_counter()
+        for offset in range(0, rows, WRITE_CHUNK_ROWS):
+            store.append_columns({name: array[offset:offset + WRITE_CHUNK_ROWS] for name, array in columns.items()})
+        timings["write"] = time.perf_counter() - start
+        loaded, timings["load"] = _timed(AnalyticsStore(tmp).columns)
+        disk_bytes = sum(array.nbytes for array in loaded.values())
+
+    convergence, timings["convergence_by_agent"] = _timed(convergence_by_agent, loaded)
+    mastery, timings["iterations_to_mastery"] = _timed(iterations_to_mastery, loaded)
+    _, timings["score_distribution"] = _timed(score_distribution, loaded, 20, by_agent=True)
+    (python_gain, python_iterations, python_turns), timings["python_loop"] = _timed(python_queries, loaded)
+
+    # The vectorized and row-by-row answers must agree
+    for code, row in enumerate(convergence.values()):
+        assert abs(row["mean_gain"] - python_gain[code]) < 1e-6
+    assert abs(mastery["mean_iterations"] - python_iterations) < 1e-9 and mastery["turns"] == python_turns
+
+    return {"rows": rows, "disk_bytes": disk_bytes, "timings": timings, "mastery": mastery}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--turns-per-session", type=int, default=20)
+    args = parser.parse_args()
+
+    report = run(args.rows, args.turns_per_session)
+    mastery = report["mastery"]
+    print(f"{report['rows']:,} iterations, {mastery['turns']:,} turns, "
+          f"{report['disk_bytes'] / 1024 / 1024:.1f} MB on disk")
+    for name, seconds in report["timings"].items():
+        print(f"{name:<24} {seconds * 1000:>10.1f} ms")
+    vectorized = report["timings"]["convergence_by_agent"] + report["timings"]["iterations_to_mastery"]
+    print(f"convergence + mastery: {report['timings']['python_loop'] / vectorized:.0f}x faster than the Python loop")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Per-turn overhead of SQLite checkpointing over a long session with the fake LLM backend.
+
+Compares the stateless mode (main.py re-sends the capped history every turn) with a SQLite
+checkpointer under each durability mode, where only the new message is sent and nodes trim the
+state to the budget. Checkpoints are pruned after every turn as main.py does.
+
+Usage: python -m benchmarks.bench_checkpoint [--turns N]
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent_graph import create_agent_graph
+from agents import SocraticAgents
+from benchmarks.fake_llm import fake_llm_factory
+from checkpoint import DURABILITY_MODES, open_checkpointer, prune_checkpoints, thread_config
+from history import CONTEXT_TOKEN_BUDGET, ContextWindows, TokenIndex
+
+SCRIPTS = {"arbiter": ["elenchus", "aporia", "maieutics"], "dialectic": ["0.4", "0.95"]}
+
+
+def _turn_input(text: str) -> dict:
+    return {
+        "mastery_threshold": 0.9,
+        "mastery_reached": False,
+        "iteration": 0,
+        "score_history": [],
+        "messages": [HumanMessage(content=text)],
+    }
+
+
+def run_stateless(turns: int):
+    agents = SocraticAgents(llm_factory=fake_llm_factory(scripts=SCRIPTS), cache=False)
+    graph = create_agent_graph(agents)
+    token_index = TokenIndex()
+    mastery_score = 0.0
+    timings = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        token_index.append(HumanMessage(content=f"learner message {turn} " + "word " * 40))
+        graph_input = _turn_input("")
+        graph_input.update(messages=token_index.cap(CONTEXT_TOKEN_BUDGET), mastery_score=mastery_score)
+        result = graph.invoke(graph_input)
+        mastery_score = result["mastery_score"]
+        token_index.extend(m for m in result["messages"][len(graph_input["messages"]):] if isinstance(m, AIMessage))
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, 0
+
+
+def run_checkpointed(turns: int, durability: str, db_path: Path):
+    checkpointer = open_checkpointer(db_path)
+    agents = SocraticAgents(
+        llm_factory=fake_llm_factory(scripts=SCRIPTS), cache=False, windows=ContextWindows(CONTEXT_TOKEN_BUDGET)
+    )
+    graph = create_agent_graph(agents, checkpointer=checkpointer)
+    config = thread_config("bench")
+    timings = []
+    try:
+        for turn in range(turns):
+            start = time.perf_counter()
+            graph_input = _turn_input(f"learner message {turn} " + "word " * 40)
+            graph_input.update(tokens_used=None, stop_reason="")
+            graph.invoke(graph_input, config, durability=durability)
+            prune_checkpoints(db_path, "bench")
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        checkpointer.conn.close()
+    size = sum(path.stat().st_size for path in db_path.parent.glob(db_path.name + "*"))
+    return timings, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    results = {"stateless": run_stateless(args.turns)}
+    with tempfile.TemporaryDirectory() as tmp:
+        for durability in DURABILITY_MODES:
+            results[f"sqlite/{durability}"] = run_checkpointed(args.turns, durability, Path(tmp) / f"{durability}.sqlite")
+
+    tail = max(1, args.turns // 10)
+    baseline = statistics.mean(results["stateless"][0])
+    print(f"{args.turns} turns; first/last columns average the first and last {tail} turns")
+    print(f"{'mode':<14} {'ms/turn':>9} {'first':>8} {'last':>8} {'overhead':>9} {'db KB':>8}")
+    for mode, (timings, size) in results.items():
+        mean = statistics.mean(timings)
+        print(f"{mode:<14} {mean:>9.2f} {statistics.mean(timings[:tail]):>8.2f} {statistics.mean(timings[-tail:]):>8.2f} "
+              f"{mean - baseline:>+9.2f} {size / 1024:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Memory of a long session's history: a list of full LangChain messages (rebuilt with
+`history = history + [user_message] + agent_messages` each turn, the pre-TokenIndex main loop)
+against TokenIndex's compact MessageRecords, which only materialize the capped window.
+
+Agent replies are built like ChatOllama output (id, response and usage metadata). Reports
+retained bytes per session and the peak extra memory of one turn (history update plus the
+window sent to the model), measured with tracemalloc.
+
+Usage: python -m benchmarks.bench_history_memory [--messages 10000] [--turns 50] [--budget 4096]
+"""
+
+import argparse
+import gc
+import random
+import tracemalloc
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from history import TokenIndex
+
+WORDS = "why because premise analogy paradox concept energy mass gravity orbit proof example".split()
+
+
+def _text(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 60)))
+
+
+def _agent_reply(rng: random.Random) -> AIMessage:
+    return AIMessage(
+        content=_text(rng),
+        id=f"run-{uuid.UUID(int=rng.getrandbits(128))}-0",
+        response_metadata={
+            "model": "llama3.1:8b-instruct-q2_K", "created_at": "2025-01-01T00:00:00.000000Z", "done": True,
+            "done_reason": "stop", "total_duration": 1_234_567_890, "load_duration": 1_234_567,
+            "prompt_eval_count": 812, "prompt_eval_duration": 123_456_789, "eval_count": 96,
+            "eval_duration": 987_654_321, "model_name": "llama3.1:8b-instruct-q2_K",
+        },
+        usage_metadata={"input_tokens": 812, "output_tokens": 96, "total_tokens": 908},
+        additional_kwargs={"timestamp": "2025-01-01T00:00:00.000000+00:00"},
+    )
+
+
+def _turn(rng: random.Random):
+    user = HumanMessage(content=_text(rng), additional_kwargs={"timestamp": "2025-01-01T00:00:00.000000+00:00"})
+    return user, [_agent_reply(rng)]
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return retained, kept
+
+
+def _turn_peak(turn, new_turns) -> float:
+    """
+    Mean peak of extra memory while a turn builds the history and the window it sends.
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for user, replies in new_turns:
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            turn(user, replies)
+            peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks)
+
+
+def run(messages: int = 10_000, turns: int = 50, budget: int = 4096) -> dict:
+    rng = random.Random(0)
+    session = []
+    while len(session) < messages:
+        user, replies = _turn(rng)
+        session.extend([user] + replies)
+    new_turns = [_turn(rng) for _ in range(turns)]
+
+    def legacy_session():
+        return [message.model_copy(deep=True) for message in session]
+
+    def compact_session():
+        return TokenIndex(message.model_copy(deep=True) for message in session)
+
+    legacy_bytes, legacy = _measure(legacy_session)
+    compact_bytes, index = _measure(compact_session)
+
+    def legacy_turn(user, replies):
+        nonlocal legacy
+        legacy = legacy + [user] + replies
+        return legacy[-window_size:]
+
+    def compact_turn(user, replies):
+        index.append(user)
+        window = index.cap(budget)
+        index.extend(replies)
+        return window
+
+    window_size = len(index.cap(budget))
+    legacy_turn_bytes = _turn_peak(legacy_turn, new_turns)
+    compact_turn_bytes = _turn_peak(compact_turn, new_turns)
+
+    return {
+        "messages": len(session),
+        "legacy_bytes": legacy_bytes,
+        "compact_bytes": compact_bytes,
+        "legacy_turn_bytes": legacy_turn_bytes,
+        "compact_turn_bytes": compact_turn_bytes,
+        "window_messages": window_size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=4096)
+    args = parser.parse_args()
+
+    report = run(args.messages, args.turns, args.budget)
+    mb = 1024 * 1024
+    print(f"session of {report['messages']} messages; window of {report['window_messages']} "
+          f"messages at {args.budget} tokens")
+    print(f"{'':<22} {'retained MB':>12} {'peak KB/turn':>18}")
+    print(f"{'LangChain list':<22} {report['legacy_bytes'] / mb:>12.2f} {report['legacy_turn_bytes'] / 1024:>18.1f}")
+    print(f"{'TokenIndex records':<22} {report['compact_bytes'] / mb:>12.2f} {report['compact_turn_bytes'] / 1024:>18.1f}")
+    print(f"retained memory: {report['legacy_bytes'] / max(report['compact_bytes'], 1):.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
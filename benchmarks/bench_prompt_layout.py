@@ -0,0 +1,70 @@
+"""
+Prompt-eval time per node with the system_first and history_first prompt layouts when every
+role shares one model (context_switch=False).
+
+By default the scripted transcripts run against a fake Ollama server that keeps a prompt-prefix
+cache per resident model and charges --prompt-tokens-per-second for the uncached part. With
+--ollama the same transcripts run against a local Ollama server and the prompt_eval_duration it
+reports is used instead.
+
+Usage: python -m benchmarks.bench_prompt_layout [--prompt-tokens-per-second R] [--ollama]
+"""
+
+import argparse
+import asyncio
+import statistics
+
+from agents import PROMPT_LAYOUTS, _ollama_factory
+from benchmarks.bench_transcripts import load_transcripts, run_transcript
+from benchmarks.fake_llm import FakeOllamaServer
+
+
+async def run(layout: str, transcripts, prompt_tokens_per_second: float, use_ollama: bool):
+    server = None if use_ollama else FakeOllamaServer(prompt_tokens_per_second=prompt_tokens_per_second)
+    agent_kwargs = {"context_switch": False, "prompt_layout": layout, "cache": False}
+    spans = []
+    for transcript in transcripts:
+        result = await run_transcript(
+            transcript, server=server, llm_factory=_ollama_factory if use_ollama else None, agent_kwargs=agent_kwargs
+        )
+        spans.extend(result["spans"])
+
+    by_node = {}
+    for span in spans:
+        for call in span["llm_calls"]:
+            if call["prompt_eval_ms"] is not None:
+                by_node.setdefault(span["node"], []).append(call["prompt_eval_ms"])
+    report = {
+        "nodes": {node: statistics.mean(values) for node, values in sorted(by_node.items())},
+        "total_ms": sum(sum(values) for values in by_node.values()),
+    }
+    if server is not None:
+        total = server.prompt_tokens_evaluated + server.prompt_tokens_reused
+        report["reused"] = server.prompt_tokens_reused / total if total else 0.0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=20000.0, help="fake prompt eval rate")
+    parser.add_argument("--ollama", action="store_true", help="measure against a local Ollama server")
+    args = parser.parse_args()
+
+    transcripts = load_transcripts()
+    reports = {
+        layout: asyncio.run(run(layout, transcripts, args.prompt_tokens_per_second, args.ollama))
+        for layout in PROMPT_LAYOUTS
+    }
+
+    nodes = sorted({node for report in reports.values() for node in report["nodes"]})
+    print("mean prompt-eval ms per call")
+    print(f"{'node':<12}" + "".join(f"{layout:>15}" for layout in PROMPT_LAYOUTS))
+    for node in nodes:
+        print(f"{node:<12}" + "".join(f"{reports[layout]['nodes'].get(node, 0.0):>15.1f}" for layout in PROMPT_LAYOUTS))
+    print(f"{'total':<12}" + "".join(f"{reports[layout]['total_ms']:>15.1f}" for layout in PROMPT_LAYOUTS))
+    if not args.ollama:
+        print(f"{'reused':<12}" + "".join(f"{reports[layout]['reused']:>15.0%}" for layout in PROMPT_LAYOUTS))
+
+
+if __name__ == "__main__":
+    main()
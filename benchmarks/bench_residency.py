@@ -0,0 +1,61 @@
+"""
+Model loads per turn with context_switch=True on a fake Ollama server with limited VRAM,
+with and without the residency planner.
+
+Usage: python -m benchmarks.bench_residency [--turns N] [--load-latency S] [--vram 24 8 4]
+"""
+
+import argparse
+import time
+
+from langchain_core.messages import HumanMessage
+
+from agent_graph import create_agent_graph
+from agents import SocraticAgents
+from benchmarks.fake_llm import FakeOllamaServer, fake_llm_factory
+from residency import ModelResidency
+
+
+def run(vram_gb: float, planned: bool, turns: int, load_latency: float):
+    server = FakeOllamaServer(vram_budget_gb=vram_gb, load_latency=load_latency)
+    # Three iterations per turn, rotating through the teachers
+    factory = fake_llm_factory(scripts={"dialectic": ["0.4", "0.6", "0.95"]}, server=server)
+    residency = ModelResidency(vram_budget_gb=vram_gb if planned else None)
+    agents = SocraticAgents(context_switch=True, llm_factory=factory, residency=residency)
+    graph = create_agent_graph(agents)
+
+    start = time.perf_counter()
+    for turn in range(turns):
+        residency.start_turn()
+        graph.invoke({
+            "messages": [HumanMessage(content=f"question {turn}")],
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        })
+    elapsed = time.perf_counter() - start
+    return {
+        "server_loads_per_turn": server.loads / turns,
+        "counted_loads_per_turn": residency.total_loads / turns,
+        "turn_ms": elapsed * 1000 / turns,
+        "fell_back": residency.fell_back,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--load-latency", type=float, default=0.5, help="seconds per model load")
+    parser.add_argument("--vram", type=float, nargs="+", default=[24.0, 8.0, 4.0])
+    args = parser.parse_args()
+
+    print(f"{'vram GB':>8} {'planner':>8} {'loads/turn':>11} {'counted':>8} {'turn ms':>9} {'fallback':>9}")
+    for vram_gb in args.vram:
+        for planned in (False, True):
+            result = run(vram_gb, planned, args.turns, args.load_latency)
+            print(f"{vram_gb:>8.1f} {'on' if planned else 'off':>8} {result['server_loads_per_turn']:>11.1f} "
+                  f"{result['counted_loads_per_turn']:>8.1f} {result['turn_ms']:>9.1f} {str(result['fell_back']):>9}")
+
+
+if __name__ == "__main__":
+    main()
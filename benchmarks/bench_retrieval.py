@@ -0,0 +1,93 @@
+"""
+Retrieval latency of VectorIndex at 100k stored messages: sign-bit prefilter plus exact rescoring
+against a full float32 scan, with recall@k of the prefiltered search against the exact top-k.
+
+Vectors are synthetic but clustered like topic embeddings (unit-norm centroids plus noise).
+The index is memory-mapped from a temporary directory, as in main.py.
+
+Usage: python -m benchmarks.bench_retrieval [--messages 100000] [--dim 768] [--queries 200] [--k 3]
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from retrieval import VectorIndex
+
+
+def _clustered(rng, count: int, dim: int, clusters: int = 2000, noise: float = 0.6):
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    labels = rng.integers(0, clusters, count)
+    vectors = centroids[labels] + noise * rng.standard_normal((count, dim)).astype(np.float32) / np.sqrt(dim)
+    return vectors, centroids, labels
+
+
+def run(messages: int = 100_000, dim: int = 768, queries: int = 200, k: int = 3, batch: int = 1000) -> dict:
+    rng = np.random.default_rng(0)
+    vectors, _, _ = _clustered(rng, messages, dim)
+    keys = [f"{i:08d}" for i in range(messages)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(Path(tmp) / "bench.vectors")
+        start = time.perf_counter()
+        for offset in range(0, messages, batch):
+            index.upsert(keys[offset:offset + batch], vectors[offset:offset + batch], [None] * len(keys[offset:offset + batch]))
+        upsert_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = VectorIndex(Path(tmp) / "bench.vectors")
+        load_seconds = time.perf_counter() - start
+
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        # Queries are perturbed stored messages: a learner returning to an earlier topic
+        rows = rng.integers(0, messages, queries)
+        query_vectors = vectors[rows] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32) / np.sqrt(dim)
+
+        index.search(query_vectors[0], k)
+        fast_ms, exact_ms, hits = [], [], 0
+        for query in query_vectors:
+            start = time.perf_counter()
+            found = [key for key, _ in index.search(query, k)]
+            fast_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            scores = unit @ (query / np.linalg.norm(query))
+            exact = [keys[i] for i in np.argpartition(-scores, k)[:k]]
+            exact_ms.append((time.perf_counter() - start) * 1000)
+            hits += len(set(found) & set(exact))
+
+    return {
+        "messages": messages,
+        "dim": dim,
+        "upserts_per_sec": messages / upsert_seconds,
+        "load_ms": load_seconds * 1000,
+        "search_p50_ms": statistics.median(fast_ms),
+        "search_p95_ms": sorted(fast_ms)[int(0.95 * (len(fast_ms) - 1))],
+        "scan_p50_ms": statistics.median(exact_ms),
+        "recall_at_k": hits / (k * queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    report = run(args.messages, args.dim, args.queries, args.k)
+    print(f"{report['messages']} vectors x {report['dim']} dims: {report['upserts_per_sec']:.0f} upserts/sec, "
+          f"reload {report['load_ms']:.0f} ms")
+    print(f"prefiltered search: p50 {report['search_p50_ms']:.2f} ms, p95 {report['search_p95_ms']:.2f} ms, "
+          f"recall@{args.k} {report['recall_at_k']:.3f}")
+    print(f"full float32 scan:  p50 {report['scan_p50_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Load generator for server.SessionManager against the fake LLM backend.
+
+Each simulated learner sends --turns messages one after another; all learners run at once.
+Reports throughput and p50/p99 turn latency as the number of sessions grows.
+
+Usage: python -m benchmarks.bench_server [--sessions 1 4 16 64] [--concurrency 4] [--latency S]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from agent_graph import create_agent_graph
+from agents import SocraticAgents
+from benchmarks.fake_llm import fake_llm_factory
+from server import SessionManager
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def _learner(manager: SessionManager, session_id: str, turns: int, latencies):
+    for turn in range(turns):
+        start = time.perf_counter()
+        await manager.chat(session_id, f"learner {session_id} message {turn}")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(sessions: int, turns: int, concurrency: int, latency: float):
+    # One iteration per turn: arbiter, teacher, dialectic
+    graph = create_agent_graph(SocraticAgents(llm_factory=fake_llm_factory(scripts={"dialectic": ["0.95"]}, latency=latency)))
+    manager = SessionManager(graph, max_concurrency=concurrency)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_learner(manager, f"s{i}", turns, latencies) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    return {
+        "turns_per_sec": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": _percentile(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake LLM delay per call (s)")
+    args = parser.parse_args()
+
+    print(f"concurrency limit {args.concurrency}; fake LLM latency {args.latency * 1000:.0f} ms/call")
+    print(f"{'sessions':>9} {'turns/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for sessions in args.sessions:
+        result = asyncio.run(run(sessions, args.turns, args.concurrency, args.latency))
+        print(f"{sessions:>9} {result['turns_per_sec']:>9.1f} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
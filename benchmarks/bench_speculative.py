@@ -0,0 +1,73 @@
+"""
+Sequential vs speculative arbiter execution against the fake LLM backend.
+
+Reports time-to-first-response (graph start until the teacher's reply is available) and the
+tokens generated by teacher calls that speculation discarded.
+
+Usage: python -m benchmarks.bench_speculative [--turns N] [--arbiter-latency S] [--teacher-latency S]
+"""
+
+import argparse
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from agent_graph import create_agent_graph
+from agents import TEACHER_AGENTS, SocraticAgents
+from benchmarks.fake_llm import fake_llm_factory
+from routing import RoutingOptions
+
+
+def run(speculative: bool, turns: int, arbiter_latency: float, teacher_latency: float, dialectic_latency: float):
+    latency = {"arbiter": arbiter_latency, "dialectic": dialectic_latency}
+    latency.update({role: teacher_latency for role in TEACHER_AGENTS})
+    # Mastery is reached on every turn so each turn is exactly one loop iteration
+    factory = fake_llm_factory(scripts={"dialectic": ["0.95"]}, latency=latency)
+    agents = SocraticAgents(llm_factory=factory, routing=RoutingOptions(speculative=speculative))
+    graph = create_agent_graph(agents)
+
+    first_response_ms = []
+    turn_ms = []
+    for turn in range(turns):
+        graph_input = {
+            "messages": [HumanMessage(content=f"question {turn}")],
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        }
+        start = time.perf_counter()
+        for event in graph.stream(graph_input):
+            if any(node in TEACHER_AGENTS for node in event):
+                first_response_ms.append((time.perf_counter() - start) * 1000)
+        turn_ms.append((time.perf_counter() - start) * 1000)
+
+    # Let discarded in-flight calls finish so their tokens are counted
+    if agents._speculation_pool is not None:
+        agents._speculation_pool.shutdown(wait=True)
+    return {
+        "ttfr_ms": statistics.mean(first_response_ms),
+        "turn_ms": statistics.mean(turn_ms),
+        "wasted_tokens_per_turn": agents.speculation_stats["wasted_tokens"] / turns,
+        "discarded_calls_per_turn": agents.speculation_stats["discarded_calls"] / turns,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--arbiter-latency", type=float, default=0.2)
+    parser.add_argument("--teacher-latency", type=float, default=0.4)
+    parser.add_argument("--dialectic-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(f"{'mode':>12} {'ttfr ms':>9} {'turn ms':>9} {'wasted tok/turn':>16} {'discarded/turn':>15}")
+    for speculative in (False, True):
+        result = run(speculative, args.turns, args.arbiter_latency, args.teacher_latency, args.dialectic_latency)
+        mode = "speculative" if speculative else "sequential"
+        print(f"{mode:>12} {result['ttfr_ms']:>9.1f} {result['turn_ms']:>9.1f} "
+              f"{result['wasted_tokens_per_turn']:>16.1f} {result['discarded_calls_per_turn']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
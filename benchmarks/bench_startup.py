@@ -0,0 +1,73 @@
+"""
+CLI startup cost: `import main` time (from python -X importtime) and time-to-prompt, the wall
+time from launching `python main.py` until the first "User: " prompt is printed.
+
+Usage: python -m benchmarks.bench_startup [--runs N]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_time_ms() -> float:
+    """
+    Cumulative import time of the main module in milliseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    for line in reversed(result.stderr.splitlines()):
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == "main":
+            return int(fields[1]) / 1000
+    raise RuntimeError("main not found in -X importtime output")
+
+
+def time_to_prompt_ms() -> float:
+    """
+    Launch the CLI, wait for the first prompt, then quit it.
+    """
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=REPO_ROOT, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    seen = b""
+    try:
+        while b"User: " not in seen:
+            chunk = process.stdout.read1(1024)
+            if not chunk:
+                raise RuntimeError("CLI exited before showing a prompt")
+            seen += chunk
+        elapsed = (time.perf_counter() - start) * 1000
+        process.stdin.write(b"quit\n")
+        process.stdin.flush()
+        process.wait(timeout=30)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports = [import_time_ms() for _ in range(args.runs)]
+    prompts = [time_to_prompt_ms() for _ in range(args.runs)]
+    print(f"import main:     median {statistics.median(imports):7.1f} ms  (min {min(imports):.1f})")
+    print(f"time to prompt:  median {statistics.median(prompts):7.1f} ms  (min {min(prompts):.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Time-to-first-token of the async streaming path versus the synchronous stream path, which
+only surfaces a teacher's reply once the whole LLM call has finished.
+
+Usage: python -m benchmarks.bench_streaming [--turns N] [--tokens-per-second R]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from agent_graph import create_agent_graph
+from agents import TEACHER_AGENTS, SocraticAgents
+from benchmarks.fake_llm import fake_llm_factory
+
+
+def _graph_input(turn: int):
+    return {
+        "messages": [HumanMessage(content=f"question {turn}")],
+        "mastery_score": 0.0,
+        "mastery_threshold": 0.9,
+        "mastery_reached": False,
+    }
+
+
+def _graph(latency: float, tokens_per_second: float):
+    factory = fake_llm_factory(scripts={"dialectic": ["0.95"]}, latency=latency, tokens_per_second=tokens_per_second)
+    return create_agent_graph(SocraticAgents(llm_factory=factory))
+
+
+def run_sync(turns: int, latency: float, tokens_per_second: float):
+    graph = _graph(latency, tokens_per_second)
+    first = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        for event in graph.stream(_graph_input(turn)):
+            if any(node in TEACHER_AGENTS for node in event):
+                first.append((time.perf_counter() - start) * 1000)
+    return statistics.mean(first)
+
+
+async def run_async(turns: int, latency: float, tokens_per_second: float):
+    graph = _graph(latency, tokens_per_second)
+    first = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        seen = False
+        async for mode, _payload in graph.astream(_graph_input(turn), stream_mode=["custom", "updates"]):
+            if mode == "custom" and not seen:
+                first.append((time.perf_counter() - start) * 1000)
+                seen = True
+    return statistics.mean(first)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="prompt-eval delay per call (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    args = parser.parse_args()
+
+    sync_ms = run_sync(args.turns, args.latency, args.tokens_per_second)
+    async_ms = asyncio.run(run_async(args.turns, args.latency, args.tokens_per_second))
+    print(f"first visible teacher output, sync stream:  {sync_ms:8.1f} ms")
+    print(f"first visible teacher token, async astream: {async_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
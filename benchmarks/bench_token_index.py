@@ -0,0 +1,89 @@
+"""
+Compare the per-turn cost of the old cap_messages path (re-tokenize the full history on every
+turn) with the incremental TokenIndex at 100, 1k and 10k messages of history.
+
+Usage: python -m benchmarks.bench_token_index [--turns N]
+"""
+
+import argparse
+import random
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from history import TokenIndex, _get_encoder
+
+WORDS = "why because premise analogy paradox concept energy mass gravity orbit proof example".split()
+
+
+def _legacy_estimate(text: str) -> int:
+    # The pre-index behaviour: encode every message again on every call
+    if not text:
+        return 0
+    enc = _get_encoder()
+    if enc is not None:
+        return len(enc.encode(text))
+    return max(1, int(len(text) / 4))
+
+
+def _legacy_cap(messages, max_tokens: int):
+    tokens = [_legacy_estimate(message.content) for message in messages]
+    total = 0
+    kept = []
+    for message, token_count in reversed(list(zip(messages, tokens))):
+        if total + token_count > max_tokens and kept:
+            break
+        kept.append(message)
+        total += token_count
+    kept.reverse()
+    return kept
+
+
+def _make_history(size: int, rng: random.Random):
+    history = []
+    for i in range(size):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 60)))
+        history.append(HumanMessage(content=text) if i % 2 == 0 else AIMessage(content=text))
+    return history
+
+
+def run(sizes=(100, 1_000, 10_000), turns: int = 20, budget: int = 4096):
+    rng = random.Random(0)
+    rows = []
+    for size in sizes:
+        history = _make_history(size, rng)
+        new_messages = _make_history(turns, rng)
+
+        legacy = list(history)
+        start = time.perf_counter()
+        for message in new_messages:
+            legacy.append(message)
+            _legacy_cap(legacy, budget)
+        legacy_ms = (time.perf_counter() - start) * 1000 / turns
+
+        index = TokenIndex(history)
+        start = time.perf_counter()
+        for message in new_messages:
+            index.append(message)
+            index.cap(budget)
+        index_ms = (time.perf_counter() - start) * 1000 / turns
+
+        rows.append((size, legacy_ms, index_ms))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=4096)
+    args = parser.parse_args()
+
+    tokenizer = "tiktoken" if _get_encoder() is not None else "chars/4 heuristic"
+    print(f"tokenizer: {tokenizer}; budget: {args.budget} tokens; {args.turns} turns per size")
+    print(f"{'messages':>10} {'legacy ms/turn':>16} {'index ms/turn':>15} {'speedup':>9}")
+    for size, legacy_ms, index_ms in run(turns=args.turns, budget=args.budget):
+        print(f"{size:>10} {legacy_ms:>16.3f} {index_ms:>15.4f} {legacy_ms / max(index_ms, 1e-9):>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
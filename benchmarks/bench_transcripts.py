@@ -0,0 +1,263 @@
+"""
+End-to-end regression benchmark: drives the scripted learner transcripts in
+benchmarks/transcripts/ through create_agent_graph with the fake LLM backend, the same way
+main.py runs a session (token-capped history, loop budgets, async streaming).
+
+Reports turns/sec, per-turn latency and LLM calls, per-node orchestration overhead (node wall
+time minus LLM time), loop iterations and stop reasons per turn, and memory growth across a
+session (tracemalloc). --score-cadence sets how often the dialectic scores (see SocraticAgents);
+--route-reuse N lets loop back-edges reuse the previous routing decision (routing.ReusePolicy);
+--control-window-turns K limits the arbiter and dialectic prompts to the last K learner turns.
+Runs on a CPU-only box with no network. With --baseline, exits non-zero when turns/sec drops
+or per-turn memory growth rises by more than --tolerance against a previous --json report.
+
+Usage: python -m benchmarks.bench_transcripts [--repeat N] [--latency S] [--tokens-per-second R]
+                                              [--score-cadence user|N] [--route-reuse N]
+                                              [--control-window-turns K]
+                                              [--json report.json] [--baseline report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent_graph import create_agent_graph
+from agents import SocraticAgents, control_windows
+from benchmarks.fake_llm import fake_llm_factory
+from history import CONTEXT_TOKEN_BUDGET, TokenIndex
+from routing import ReusePolicy, RoutingOptions
+from tracing import Tracer
+
+TRANSCRIPTS_DIR = Path(__file__).with_name("transcripts")
+
+
+def load_transcripts(directory=TRANSCRIPTS_DIR):
+    """
+    Transcript files are {"id": str, "scripts": {role: [replies]}, "turns": [learner messages]}.
+    """
+    return [json.loads(path.read_text(encoding="utf-8")) for path in sorted(Path(directory).glob("*.json"))]
+
+
+async def run_transcript(transcript: dict, latency=0.0, tokens_per_second: float = None,
+                         context_token_budget: int = CONTEXT_TOKEN_BUDGET, max_iterations: int = 5,
+                         track_memory: bool = False, server=None, llm_factory=None, agent_kwargs=None) -> dict:
+    """
+    Run every turn of one transcript as a single session and collect per-turn results.
+    The fake backend is used unless llm_factory is given; server (FakeOllamaServer) and
+    agent_kwargs (extra SocraticAgents arguments) are optional.
+    """
+    llm_factory = llm_factory or fake_llm_factory(
+        scripts=transcript.get("scripts"), latency=latency, tokens_per_second=tokens_per_second, server=server
+    )
+    agents = SocraticAgents(llm_factory=llm_factory, **(agent_kwargs or {}))
+    tracer = Tracer()
+    graph = create_agent_graph(agents, tracer=tracer)
+    token_index = TokenIndex()
+    mastery_score = 0.0
+    turns = []
+    memory = []
+
+    start = time.perf_counter()
+    for text in transcript["turns"]:
+        user_message = HumanMessage(content=text)
+        token_index.append(user_message)
+        graph_input = {
+            "messages": token_index.cap(context_token_budget),
+            "mastery_score": mastery_score,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+            "max_iterations": max_iterations,
+            "iteration": 0,
+            "score_history": [],
+        }
+        agent_messages = []
+        turn = {"iterations": 0, "stop_reason": "", "tokens_streamed": 0}
+        turn_start = time.perf_counter()
+        spans_before = len(tracer.spans)
+        async for mode, payload in graph.astream(graph_input, stream_mode=["custom", "updates"]):
+            if mode == "custom":
+                turn["tokens_streamed"] += 1
+                continue
+            for output in payload.values():
+                if not output:
+                    continue
+                agent_messages.extend(m for m in output.get("messages") or [] if isinstance(m, AIMessage))
+                if "iteration" in output:
+                    turn["iterations"] = output["iteration"]
+                    turn["stop_reason"] = output.get("stop_reason") or ""
+                if "mastery_score" in output:
+                    mastery_score = output["mastery_score"]
+        turn["ms"] = (time.perf_counter() - turn_start) * 1000
+        turn["llm_calls"] = sum(len(span["llm_calls"]) for span in tracer.spans[spans_before:])
+        token_index.extend(agent_messages)
+        turns.append(turn)
+        if track_memory:
+            memory.append(tracemalloc.get_traced_memory()[0])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "id": transcript["id"],
+        "seconds": elapsed,
+        "turns": turns,
+        "spans": tracer.spans,
+        "memory": memory,
+        "history_messages": len(token_index),
+    }
+
+
+def node_overhead(spans) -> dict:
+    """
+    Mean node wall time, the part of it not spent inside LLM calls, and prompt tokens, per node.
+    """
+    by_node = {}
+    for span in spans:
+        llm_ms = sum(call["llm_ms"] for call in span["llm_calls"])
+        prompt_tokens = sum(call["prompt_tokens"] or 0 for call in span["llm_calls"])
+        by_node.setdefault(span["node"], []).append((span["wall_ms"], span["wall_ms"] - llm_ms, prompt_tokens))
+    return {
+        node: {
+            "runs": len(rows),
+            "wall_ms": statistics.mean(row[0] for row in rows),
+            "overhead_ms": statistics.mean(row[1] for row in rows),
+            "prompt_tokens": statistics.mean(row[2] for row in rows),
+        }
+        for node, rows in sorted(by_node.items())
+    }
+
+
+async def run_suite(transcripts, repeat: int = 3, latency=0.0, tokens_per_second: float = None,
+                    score_cadence=1, route_reuse: int = 0, control_window_turns: int = 0) -> dict:
+    """
+    Time repeat passes over every transcript, then run one more pass under tracemalloc for
+    memory growth (kept separate because tracing allocations slows everything down).
+    """
+    agent_kwargs = {"score_cadence": score_cadence, "windows": control_windows(control_window_turns)}
+    if route_reuse > 0:
+        agent_kwargs["routing"] = RoutingOptions(reuse=ReusePolicy(reuse_iterations=route_reuse))
+    results = []
+    for _ in range(repeat):
+        for transcript in transcripts:
+            results.append(await run_transcript(transcript, latency=latency, tokens_per_second=tokens_per_second,
+                                                agent_kwargs=agent_kwargs))
+
+    tracemalloc.start()
+    try:
+        memory_runs = [await run_transcript(t, latency=latency, tokens_per_second=tokens_per_second,
+                                            track_memory=True, agent_kwargs=agent_kwargs) for t in transcripts]
+    finally:
+        tracemalloc.stop()
+
+    total_turns = sum(len(r["turns"]) for r in results)
+    total_seconds = sum(r["seconds"] for r in results)
+    iterations = [turn["iterations"] for r in results for turn in r["turns"]]
+    turn_ms = [turn["ms"] for r in results for turn in r["turns"]]
+    stop_reasons = {}
+    for r in results:
+        for turn in r["turns"]:
+            reason = turn["stop_reason"] or "mastery"
+            stop_reasons[reason] = stop_reasons.get(reason, 0) + 1
+
+    per_transcript = {}
+    for transcript in transcripts:
+        runs = [r for r in results if r["id"] == transcript["id"]]
+        memory = next(m["memory"] for m in memory_runs if m["id"] == transcript["id"])
+        growth = (memory[-1] - memory[0]) / (len(memory) - 1) if len(memory) > 1 else 0.0
+        per_transcript[transcript["id"]] = {
+            "turns": len(transcript["turns"]),
+            "turns_per_sec": sum(len(r["turns"]) for r in runs) / sum(r["seconds"] for r in runs),
+            "mean_iterations": statistics.mean(t["iterations"] for r in runs for t in r["turns"]),
+            "memory_growth_per_turn_kb": growth / 1024,
+        }
+
+    return {
+        "turns": total_turns,
+        "turns_per_sec": total_turns / total_seconds if total_seconds else 0.0,
+        "mean_iterations": statistics.mean(iterations) if iterations else 0.0,
+        "max_iterations": max(iterations) if iterations else 0,
+        "turn_ms_p50": statistics.median(turn_ms) if turn_ms else 0.0,
+        "turn_ms_mean": statistics.mean(turn_ms) if turn_ms else 0.0,
+        "llm_calls_per_turn": statistics.mean(t["llm_calls"] for r in results for t in r["turns"]) if turn_ms else 0.0,
+        "stop_reasons": stop_reasons,
+        "nodes": node_overhead([span for r in results for span in r["spans"]]),
+        "memory_growth_per_turn_kb": statistics.mean(
+            row["memory_growth_per_turn_kb"] for row in per_transcript.values()
+        ),
+        "transcripts": per_transcript,
+    }
+
+
+def regressions(report: dict, baseline: dict, tolerance: float):
+    """
+    Regression messages for report against baseline (empty when within tolerance).
+    """
+    problems = []
+    if report["turns_per_sec"] < baseline["turns_per_sec"] * (1 - tolerance):
+        problems.append(f"turns/sec {report['turns_per_sec']:.1f} < baseline {baseline['turns_per_sec']:.1f}")
+    # Small absolute slack so noise around zero growth does not trip the check
+    allowed_growth = baseline["memory_growth_per_turn_kb"] * (1 + tolerance) + 4.0
+    if report["memory_growth_per_turn_kb"] > allowed_growth:
+        problems.append(f"memory growth {report['memory_growth_per_turn_kb']:.1f} KB/turn > "
+                        f"baseline {baseline['memory_growth_per_turn_kb']:.1f} KB/turn")
+    if report["mean_iterations"] != baseline["mean_iterations"]:
+        problems.append(f"mean iterations {report['mean_iterations']:.2f} != baseline {baseline['mean_iterations']:.2f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transcripts", default=str(TRANSCRIPTS_DIR), help="directory of transcript .json files")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over every transcript")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake per-call latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="fake decode rate")
+    parser.add_argument("--score-cadence", default="1",
+                        help='dialectic scoring cadence: "user" or every N iterations (default 1)')
+    parser.add_argument("--route-reuse", type=int, default=0,
+                        help="iterations a routing decision is reused within a turn (default 0: route every iteration)")
+    parser.add_argument("--control-window-turns", type=int, default=0,
+                        help="latest learner turns in the arbiter and dialectic prompts (default 0: full window)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    transcripts = load_transcripts(args.transcripts)
+    score_cadence = args.score_cadence if args.score_cadence == "user" else int(args.score_cadence)
+    report = asyncio.run(run_suite(transcripts, args.repeat, args.latency, args.tokens_per_second, score_cadence,
+                                   args.route_reuse, args.control_window_turns))
+
+    print(f"{len(transcripts)} transcripts, {report['turns']} turns: {report['turns_per_sec']:.1f} turns/sec, "
+          f"{report['mean_iterations']:.2f} loop iterations/turn (max {report['max_iterations']})")
+    print(f"turn latency: p50 {report['turn_ms_p50']:.1f} ms, mean {report['turn_ms_mean']:.1f} ms, "
+          f"{report['llm_calls_per_turn']:.2f} LLM calls/turn")
+    print(f"stop reasons: {report['stop_reasons']}")
+    print(f"memory growth: {report['memory_growth_per_turn_kb']:.1f} KB/turn")
+    print()
+    print(f"{'transcript':<12} {'turns':>6} {'turns/s':>9} {'iters':>6} {'KB/turn':>8}")
+    for transcript_id, row in report["transcripts"].items():
+        print(f"{transcript_id:<12} {row['turns']:>6} {row['turns_per_sec']:>9.1f} "
+              f"{row['mean_iterations']:>6.2f} {row['memory_growth_per_turn_kb']:>8.1f}")
+    print()
+    print(f"{'node':<12} {'runs':>6} {'wall ms':>9} {'overhead ms':>12} {'prompt tok':>11}")
+    for node, row in report["nodes"].items():
+        print(f"{node:<12} {row['runs']:>6} {row['wall_ms']:>9.3f} {row['overhead_ms']:>12.3f} "
+              f"{row['prompt_tokens']:>11.0f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.baseline:
+        problems = regressions(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
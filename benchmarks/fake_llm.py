@@ -0,0 +1,231 @@
+"""
+Deterministic stand-in for ChatOllama so the agent graph can run without an Ollama server.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+DEFAULT_SCRIPTS = {
+    "arbiter": ["maieutics", "elenchus", "aporia"],
+    "elenchus": ["If that premise holds, what happens when the mass doubles?"],
+    "aporia": ["If both of these seem true, where does that leave our definition of force?"],
+    "maieutics": ["Think of a ball on a trampoline. How does that picture apply to your question?"],
+    "dialectic": ["0.4", "0.6", "0.95"],
+    "summarizer": ["The learner first thought heavier objects fall faster, then linked the difference to air resistance."],
+}
+
+
+def _message_tokens(message) -> int:
+    return len(str(getattr(message, "content", "")).split())
+
+
+class FakeOllamaServer:
+    """
+    Simulates Ollama's model residency: models share a VRAM budget, the least recently used
+    model is evicted when a new one does not fit, and loading a model costs load_latency seconds.
+    Shared by every FakeChatModel that talks to the same "server".
+
+    With prompt_tokens_per_second set it also simulates the prompt (KV) cache of each resident
+    model: only the part of a prompt after the longest message prefix shared with that model's
+    previous prompt is evaluated, and the time is charged and reported as prompt_eval_duration.
+    """
+
+    def __init__(self, vram_budget_gb: float = None, load_latency: float = 0.0, footprints=None,
+                 prompt_tokens_per_second: float = None):
+        from residency import DEFAULT_FOOTPRINT_GB, MODEL_FOOTPRINTS_GB
+
+        self.vram_budget_gb = vram_budget_gb
+        self.load_latency = load_latency
+        self.footprints = dict(MODEL_FOOTPRINTS_GB, **(footprints or {}))
+        self.default_footprint = DEFAULT_FOOTPRINT_GB
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.loads = 0
+        self.prompt_tokens_evaluated = 0
+        self.prompt_tokens_reused = 0
+        self._resident = OrderedDict()
+        self._prompt_cache = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, model: str) -> float:
+        """
+        Make model resident. Returns the load delay in seconds (0.0 when already resident).
+        """
+        with self._lock:
+            if model in self._resident:
+                self._resident.move_to_end(model)
+                return 0.0
+            self._resident[model] = self.footprints.get(model, self.default_footprint)
+            if self.vram_budget_gb is not None:
+                while len(self._resident) > 1 and sum(self._resident.values()) > self.vram_budget_gb:
+                    evicted, _ = self._resident.popitem(last=False)
+                    self._prompt_cache.pop(evicted, None)
+            self.loads += 1
+            return self.load_latency
+
+    def prompt_eval(self, model: str, messages):
+        """
+        Evaluate a prompt against model's cached prefix. Returns (evaluated tokens, seconds).
+        """
+        key = [(message.type, message.content) for message in messages]
+        with self._lock:
+            cached = self._prompt_cache.get(model, [])
+            shared = 0
+            while shared < min(len(key), len(cached)) and key[shared] == cached[shared]:
+                shared += 1
+            self._prompt_cache[model] = key
+            reused = sum(_message_tokens(message) for message in messages[:shared])
+            evaluated = sum(_message_tokens(message) for message in messages[shared:])
+            self.prompt_tokens_reused += reused
+            self.prompt_tokens_evaluated += evaluated
+        seconds = evaluated / self.prompt_tokens_per_second if self.prompt_tokens_per_second else 0.0
+        return evaluated, seconds
+
+
+class FakeChatModel:
+    """
+    Minimal chat model with scripted replies and simulated latency.
+
+    responses may be a string, a list (cycled) or a callable taking the prompt messages.
+    latency is a fixed delay in seconds before the reply; tokens_per_second, when set,
+    adds a decode delay proportional to the reply length. With a FakeOllamaServer, calls also
+    pay its model-load delay and report it as load_duration like Ollama does.
+    """
+
+    def __init__(self, role: str = "", model: str = "fake", temperature: float = 0.0, responses=None,
+                 latency: float = 0.0, tokens_per_second: float = None, server: FakeOllamaServer = None,
+                 **llm_kwargs):
+        self.role = role
+        self.server = server
+        self.model = model
+        self.temperature = temperature
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.llm_kwargs = llm_kwargs
+        self.calls = 0
+        if responses is None:
+            responses = DEFAULT_SCRIPTS.get(role, ["ok"])
+        if isinstance(responses, str):
+            responses = [responses]
+        self._responses = responses if callable(responses) else itertools.cycle(responses)
+
+    def _next_content(self, messages) -> str:
+        if callable(self._responses):
+            return self._responses(messages)
+        return next(self._responses)
+
+    def _usage(self, messages, content: str) -> dict:
+        input_tokens = sum(_message_tokens(m) for m in messages)
+        output_tokens = max(1, len(content.split()))
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _load(self, messages):
+        """
+        Model load and prompt evaluation on the server: (load delay, prompt delay, prompt tokens evaluated).
+        """
+        if self.server is None:
+            return 0.0, 0.0, None
+        load_delay = self.server.acquire(self.model)
+        evaluated, prompt_delay = self.server.prompt_eval(self.model, messages)
+        return load_delay, prompt_delay, evaluated
+
+    def _metadata(self, load) -> dict:
+        load_delay, prompt_delay, evaluated = load
+        metadata = {"model": self.model}
+        if self.server is not None:
+            metadata["load_duration"] = int(load_delay * 1e9)
+            metadata["prompt_eval_count"] = evaluated
+            metadata["prompt_eval_duration"] = int(prompt_delay * 1e9)
+        return metadata
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _pieces(self, content: str):
+        # One chunk per word, keeping the separating spaces so chunks concatenate back to content
+        words = content.split(" ")
+        return [word if i == len(words) - 1 else word + " " for i, word in enumerate(words)]
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        content = self._next_content(messages)
+        usage = self._usage(messages, content)
+        load = self._load(messages)
+        delay = load[0] + load[1] + self.latency + usage["output_tokens"] * self._token_delay()
+        if delay:
+            time.sleep(delay)
+        return AIMessage(content=content, response_metadata=self._metadata(load), usage_metadata=usage)
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        content = self._next_content(messages)
+        usage = self._usage(messages, content)
+        load = self._load(messages)
+        delay = load[0] + load[1] + self.latency + usage["output_tokens"] * self._token_delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return AIMessage(content=content, response_metadata=self._metadata(load), usage_metadata=usage)
+
+    def stream(self, messages, **kwargs):
+        self.calls += 1
+        content = self._next_content(messages)
+        load = self._load(messages)
+        if load[0] + load[1] + self.latency:
+            time.sleep(load[0] + load[1] + self.latency)
+        pieces = self._pieces(content)
+        for i, piece in enumerate(pieces):
+            if self.tokens_per_second:
+                time.sleep(self._token_delay())
+            last = i == len(pieces) - 1
+            yield AIMessageChunk(
+                content=piece,
+                response_metadata=self._metadata(load) if last else {},
+                usage_metadata=self._usage(messages, content) if last else None,
+            )
+
+    async def astream(self, messages, **kwargs):
+        self.calls += 1
+        content = self._next_content(messages)
+        load = self._load(messages)
+        if load[0] + load[1] + self.latency:
+            await asyncio.sleep(load[0] + load[1] + self.latency)
+        pieces = self._pieces(content)
+        for i, piece in enumerate(pieces):
+            if self.tokens_per_second:
+                await asyncio.sleep(self._token_delay())
+            last = i == len(pieces) - 1
+            yield AIMessageChunk(
+                content=piece,
+                response_metadata=self._metadata(load) if last else {},
+                usage_metadata=self._usage(messages, content) if last else None,
+            )
+
+
+def fake_llm_factory(scripts=None, latency=0.0, tokens_per_second: float = None, server: FakeOllamaServer = None):
+    """
+    Build an llm_factory for SocraticAgents that returns FakeChatModel clients.
+    scripts maps role name to that role's responses (see FakeChatModel); latency is either
+    one delay for every role or a dict of per-role delays. All clients share server, if given.
+    """
+    scripts = scripts or {}
+
+    def factory(role: str, **llm_kwargs):
+        role_latency = latency.get(role, 0.0) if isinstance(latency, dict) else latency
+        return FakeChatModel(
+            role=role,
+            responses=scripts.get(role),
+            latency=role_latency,
+            tokens_per_second=tokens_per_second,
+            server=server,
+            **llm_kwargs,
+        )
+
+    return factory
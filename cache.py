@@ -0,0 +1,137 @@
+"""
+Response cache for agent LLM calls: an in-memory LRU with a TTL in front of an optional SQLite tier.
+
+Entries are keyed on a hash of (model, temperature, decoding options, prompt messages), with each
+message's whitespace stripped and collapsed, so calls that send Ollama the same request up to
+spacing and line breaks share an entry.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage
+
+CACHE_MAX_ENTRIES = int(os.getenv("SOCRATIC_CACHE_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("SOCRATIC_CACHE_TTL", "86400"))
+CACHE_DB_PATH = os.getenv("SOCRATIC_CACHE_DB", "")
+# Only the low-temperature control nodes are cached by default; teacher replies should vary
+CACHE_ROLES = ("arbiter", "dialectic")
+
+
+def _normalize(content):
+    # Multi-part (non-string) content is hashed as is
+    return " ".join(content.split()) if isinstance(content, str) else content
+
+
+class ResponseCache:
+    """
+    Two-tier response cache. get/put are thread-safe; stats tracks hits, misses and the LLM
+    time saved (the latency recorded when each hit entry was first generated). The agents only
+    cache the calls of the agent roles in roles.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: float = CACHE_TTL_SECONDS,
+                 db_path=CACHE_DB_PATH or None, roles=CACHE_ROLES):
+        self.roles = frozenset(roles)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, latency_ms REAL NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "saved_ms": 0.0}
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages, options=None) -> str:
+        payload = [
+            model,
+            temperature,
+            options or {},
+            [[message.type, _normalize(message.content)] for message in messages],
+        ]
+        encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def _remember(self, key: str, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        """
+        Cached reply for key as an AIMessage, or None on a miss.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            tier = "memory_hits"
+            if entry is not None and self._expired(entry[2]):
+                del self._memory[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT content, latency_ms, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[2]):
+                    entry = row
+                    tier = "disk_hits"
+                    self._remember(key, entry)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            self._memory.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats[tier] += 1
+            self.stats["saved_ms"] += entry[1]
+
+        content = entry[0]
+        # No model ran, so the call costs no tokens
+        return AIMessage(
+            content=content,
+            response_metadata={"cache_hit": True},
+            usage_metadata={"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+        )
+
+    def put(self, key: str, response, latency_ms: float):
+        entry = (response.content, float(latency_ms), time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, latency_ms, created) VALUES (?, ?, ?, ?)",
+                    (key, *entry),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,100 @@
+"""
+SQLite checkpointing for the agent graph.
+
+With a checkpointer, the graph state (conversation, mastery score, loop accounting) lives in a
+SQLite database keyed by thread id, so each turn only sends the new HumanMessage and a run
+interrupted mid-loop can be resumed with graph.astream(None, config).
+
+The SQLite savers write the full state on every checkpoint, so writes are kept cheap by:
+  - WAL journaling with synchronous=NORMAL (no fsync per write; a crash loses at most the last
+    few checkpoints, never corrupts the database),
+  - the durability mode passed to stream/invoke ("sync", "async" in the background, or "exit"
+    for one write per turn),
+  - prune_checkpoints, which keeps only the newest checkpoints of a thread so the database
+    does not grow with every step ever taken.
+"""
+
+import os
+import sqlite3
+
+CHECKPOINT_DB = os.getenv("SOCRATIC_CHECKPOINT_DB", "socratic_checkpoints.sqlite")
+# "exit" writes once per turn; "async" writes every step in the background so a turn can resume
+# mid-loop, at several times the per-turn cost (python -m benchmarks.bench_checkpoint)
+CHECKPOINT_DURABILITY = os.getenv("SOCRATIC_CHECKPOINT_DURABILITY", "exit")
+CHECKPOINTS_KEPT = 2
+DURABILITY_MODES = ("sync", "async", "exit")
+
+_PRAGMAS = ("PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL")
+
+
+def thread_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def open_checkpointer(path=CHECKPOINT_DB):
+    """
+    SqliteSaver for sync graph runs (invoke/stream).
+    """
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return SqliteSaver(conn)
+
+
+async def open_async_checkpointer(path=CHECKPOINT_DB):
+    """
+    AsyncSqliteSaver for async graph runs (ainvoke/astream).
+    """
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    conn = await aiosqlite.connect(str(path))
+    for pragma in _PRAGMAS:
+        await conn.execute(pragma)
+    return AsyncSqliteSaver(conn)
+
+
+def prune_checkpoints(path, thread_id: str, keep: int = CHECKPOINTS_KEPT) -> int:
+    """
+    Delete all but the newest keep checkpoints (and their pending writes) of a thread.
+    Checkpoint ids sort in creation order. Returns the number of checkpoints deleted.
+    """
+    conn = sqlite3.connect(str(path))
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "checkpoints" not in tables:
+            return 0
+        newest = (
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? "
+            "ORDER BY checkpoint_id DESC LIMIT ?"
+        )
+        with conn:
+            deleted = conn.execute(
+                f"DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id NOT IN ({newest})",
+                (thread_id, thread_id, keep),
+            ).rowcount
+            if "writes" in tables:
+                conn.execute(
+                    f"DELETE FROM writes WHERE thread_id = ? AND checkpoint_id NOT IN ({newest})",
+                    (thread_id, thread_id, keep),
+                )
+        return deleted
+    finally:
+        conn.close()
+
+
+def delete_thread(path, thread_id: str):
+    """
+    Remove every checkpoint of a thread (used when the learner resets their history).
+    """
+    conn = sqlite3.connect(str(path))
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        with conn:
+            for table in ("checkpoints", "writes"):
+                if table in tables:
+                    conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+    finally:
+        conn.close()
@@ -1,13 +1,49 @@
+import glob
 import json
 import os
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
 HISTORY_ENABLED_DEFAULT = True
 HISTORY_FILE_NAME = "message_history.json"
+HISTORY_LOG_FILE_NAME = "message_history.jsonl"
 CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4096"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "65536"))
+# Evicted tokens that must accumulate before the rolling summary is regenerated (0 disables it)
+SUMMARY_REFRESH_TOKENS = int(os.getenv("SUMMARY_REFRESH_TOKENS", "1024"))
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """
+    Load the tiktoken encoder once per process. Returns None when tiktoken (or its
+    encoding files) is unavailable so callers fall back to the heuristic without retrying.
+    """
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _count_tokens(text: str) -> int:
+    """
+    Token count for a non-empty string, memoized by content.
+    """
+    enc = _get_encoder()
+    if enc is not None:
+        try:
+            return len(enc.encode(text))
+        except Exception:
+            pass
+    return max(1, int(len(text) / 4))
 
 
 def estimate_tokens(text: str) -> int:
@@ -17,62 +53,336 @@ def estimate_tokens(text: str) -> int:
     """
     if not text:
         return 0
+    if not isinstance(text, str):
+        text = str(text)
+    return _count_tokens(text)
 
-    try:
-        import tiktoken
 
-        enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(text))
-    except Exception:
-        return max(1, int(len(text) / 4))
+# Compact role codes for MessageRecord; index into _ROLE_TYPES
+ROLE_HUMAN, ROLE_AI, ROLE_SYSTEM = 0, 1, 2
+_ROLE_TYPES = (HumanMessage, AIMessage, SystemMessage)
+
+
+class MessageRecord:
+    """
+    Compact history entry: role code, content, timestamp and token count.
+
+    A LangChain AIMessage from ChatOllama also carries response/usage metadata, an id and
+    pydantic bookkeeping, none of which the history needs. Records keep only what is persisted
+    and are turned back into messages (to_message) for the window actually sent to a model.
+    """
+
+    __slots__ = ("role", "content", "timestamp", "tokens")
+
+    def __init__(self, role: int, content: str, timestamp: str, tokens: int):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+        self.tokens = tokens
+
+    @classmethod
+    def of(cls, message):
+        """
+        Record for a Human/AI/System message (returned unchanged if it already is a record).
+        Stamps the message with its timestamp, so append_history later persists the same value.
+        """
+        if isinstance(message, cls):
+            return message
+        for role, message_type in enumerate(_ROLE_TYPES):
+            if isinstance(message, message_type):
+                break
+        else:
+            raise TypeError(f"cannot store {type(message).__name__} in the history")
+        content = message.content
+        return cls(role, content, _message_timestamp(message), estimate_tokens(content))
+
+    def to_message(self):
+        return _ROLE_TYPES[self.role](content=self.content, additional_kwargs={"timestamp": self.timestamp})
+
+
+class TokenIndex:
+    """
+    Token counts for a growing message list, stored as a running prefix sum, plus the position
+    of every learner message.
+
+    Appending costs one (memoized) count per new message and trimming to a budget is a
+    binary search, so per-turn work no longer grows with the length of the history. The agents
+    build one over the graph state's messages to cut each node's window.
+    Messages are kept as MessageRecords; LangChain messages are only built for the slice
+    returned by cap() (or messages_between()). The last window is kept, so as it slides
+    forward each turn only the newly appended messages are built.
+    """
+
+    def __init__(self, messages=None):
+        self.records = []
+        # _prefix[i] is the token total of records[:i]
+        self._prefix = [0]
+        # Positions of the HumanMessage records, oldest first
+        self._turns = []
+        # Position -> message for the window returned by the last cap()
+        self._window = {}
+        if messages:
+            self.extend(messages)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def total_tokens(self) -> int:
+        return self._prefix[-1]
+
+    @property
+    def messages(self):
+        """
+        The whole history as LangChain messages (materializes every record; prefer cap()).
+        """
+        return self.messages_between(0, len(self.records))
+
+    def append(self, message):
+        record = MessageRecord.of(message)
+        if record.role == ROLE_HUMAN:
+            self._turns.append(len(self.records))
+        self.records.append(record)
+        self._prefix.append(self._prefix[-1] + record.tokens)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def messages_between(self, start: int, end: int):
+        """
+        LangChain messages for records[start:end].
+        """
+        return [record.to_message() for record in self.records[start:end]]
+
+    def tokens_between(self, start: int, end: int) -> int:
+        """
+        Token total of records[start:end].
+        """
+        return self._prefix[end] - self._prefix[start]
+
+    def truncate(self, length: int):
+        """
+        Drop every message after the first `length` entries.
+        """
+        del self.records[length:]
+        del self._prefix[length + 1:]
+        del self._turns[bisect_left(self._turns, length):]
+        self._window = {i: m for i, m in self._window.items() if i < length}
+
+    def window_start(self, max_tokens: int = None, last_turns: int = None) -> int:
+        """
+        Index of the oldest message in the most recent window that fits max_tokens and starts no
+        earlier than the last_turns-th newest learner message (either may be None). The last
+        message is always kept; `cap` keeps the messages from here on.
+        """
+        count = len(self.records)
+        if count == 0:
+            return 0
+        start = 0
+        if last_turns and len(self._turns) >= last_turns:
+            start = self._turns[-last_turns]
+        if max_tokens is not None:
+            # Smallest start whose suffix fits the budget
+            start = max(start, bisect_left(self._prefix, self._prefix[-1] - max_tokens, 0, count))
+        return min(start, count - 1)
+
+    def cap(self, max_tokens: int):
+        """
+        Most recent messages whose token total fits max_tokens (always includes the last one).
+        """
+        if not self.records:
+            return []
+        positions = range(self.window_start(max_tokens), len(self.records))
+        window = self._window
+        messages = [window.get(i) or self.records[i].to_message() for i in positions]
+        self._window = dict(zip(positions, messages))
+        return messages
+
+
+class WindowPolicy:
+    """
+    How much of the conversation one node sends: at most max_tokens (None: the ContextWindows'
+    max_tokens) and, with last_turns, nothing older than the last_turns-th newest learner message.
+    """
+
+    def __init__(self, max_tokens: int = None, last_turns: int = None):
+        if last_turns is not None and last_turns < 1:
+            raise ValueError(f"last_turns must be a positive int, got {last_turns!r}")
+        self.max_tokens = max_tokens
+        self.last_turns = last_turns
+
+    def __repr__(self):
+        return f"WindowPolicy(max_tokens={self.max_tokens!r}, last_turns={self.last_turns!r})"
+
+
+class ContextWindows:
+    """
+    The conversation window of each agent role. Roles in policies follow their WindowPolicy; the
+    rest get every message trimmed to max_tokens (None: no trimming). Set max_tokens when a
+    checkpointer keeps the conversation in graph state: each node trims it itself, and the
+    arbiter drops the messages no window reaches (see retained_tokens).
+    """
+
+    def __init__(self, max_tokens: int = None, policies=None):
+        self.max_tokens = max_tokens
+        self.policies = dict(policies or {})
+
+    def limits(self, role: str):
+        """
+        (max_tokens, last_turns) for role's window; either may be None.
+        """
+        policy = self.policies.get(role)
+        if policy is None:
+            return self.max_tokens, None
+        return (policy.max_tokens if policy.max_tokens is not None else self.max_tokens), policy.last_turns
+
+    def retained_tokens(self):
+        """
+        Token budget that covers every role's window (None: keep everything). Messages older
+        than that are not sent to any node.
+        """
+        if self.max_tokens is None:
+            return None
+        return max([self.max_tokens] + [p.max_tokens for p in self.policies.values() if p.max_tokens is not None])
+
+    def __repr__(self):
+        return f"ContextWindows(max_tokens={self.max_tokens!r}, policies={self.policies!r})"
 
 
 def cap_messages(messages, max_tokens: int):
     """
     Trim messages so the estimated token usage does not exceed max_tokens.
     Keeps the most recent messages and always includes the final message.
+    Scans backwards from the end, so the cost is proportional to the window, not the history.
     """
     if not messages:
         return []
-
-    tokens = [estimate_tokens(getattr(message, "content", "")) for message in messages]
-
     total = 0
-    kept = []
-    for message, token_count in reversed(list(zip(messages, tokens))):
-        if total + token_count > max_tokens and kept:
+    start = len(messages)
+    while start > 0:
+        count = estimate_tokens(getattr(messages[start - 1], "content", ""))
+        if total + count > max_tokens and start < len(messages):
             break
-        kept.append(message)
-        total += token_count
+        total += count
+        start -= 1
+    return messages[start:]
 
-    kept.reverse()
 
-    if messages and kept and kept[-1] is not messages[-1]:
-        last_message = messages[-1]
-        last_message_tokens = tokens[-1]
+def _message_timestamp(message) -> str:
+    """
+    Return the timestamp recorded on a message, stamping it with the current UTC time
+    the first time it is persisted so later saves keep the original value.
+    """
+    timestamp = message.additional_kwargs.get("timestamp")
+    if not timestamp:
+        timestamp = datetime.now(timezone.utc).isoformat()
+        message.additional_kwargs["timestamp"] = timestamp
+    return timestamp
 
-        if last_message_tokens >= max_tokens:
-            return [last_message]
 
-        total = last_message_tokens
-        rebuilt = [last_message]
-        for message, token_count in reversed(list(zip(messages[:-1], tokens[:-1]))):
-            if total + token_count > max_tokens:
-                break
-            rebuilt.insert(0, message)
-            total += token_count
-        return rebuilt
+def _message_to_record(message):
+    """
+    Convert a Human/AI message into its persisted dict form, or None for other message types.
+    """
+    if isinstance(message, HumanMessage):
+        role = "human"
+    elif isinstance(message, AIMessage):
+        role = "ai"
+    else:
+        return None
+    return {"role": role, "content": message.content, "timestamp": _message_timestamp(message)}
 
-    return kept
+
+def _record_to_message(item):
+    """
+    Convert a persisted dict back into a LangChain message, or None for unknown roles.
+    """
+    role = item.get("role")
+    content = item.get("content", "")
+    additional_kwargs = {"timestamp": item["timestamp"]} if item.get("timestamp") else {}
+    if role == "human":
+        return HumanMessage(content=content, additional_kwargs=additional_kwargs)
+    if role == "ai":
+        return AIMessage(content=content, additional_kwargs=additional_kwargs)
+    return None
 
 
-def load_history(history_path: Path):
+def _iter_lines_reversed(history_path: Path, block_size: int = 64 * 1024):
+    """
+    Yield the lines of a file from last to first, reading fixed-size blocks from the end.
+    """
+    with history_path.open("rb") as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        remainder = b""
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            file.seek(position)
+            lines = (file.read(read_size) + remainder).split(b"\n")
+            # The first piece may be the tail of a line that starts in an earlier block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if remainder.strip():
+            yield remainder
+
+
+def _parse_record_line(line: bytes):
+    try:
+        return _record_to_message(json.loads(line))
+    except Exception:
+        # A torn final line from an interrupted write is skipped rather than failing the load
+        return None
+
+
+def _load_history_log(history_path: Path, max_tokens=None):
+    """
+    Load messages from a JSONL history log. With max_tokens, only the tail that fits the
+    budget is read, so startup cost does not grow with the size of the log.
+    """
+    if max_tokens is None:
+        messages = []
+        with history_path.open("rb") as file:
+            for line in file:
+                if line.strip():
+                    message = _parse_record_line(line)
+                    if message is not None:
+                        messages.append(message)
+        return messages
+
+    tail = []
+    total = 0
+    for line in _iter_lines_reversed(history_path):
+        message = _parse_record_line(line)
+        if message is None:
+            continue
+        token_count = estimate_tokens(message.content)
+        if total + token_count > max_tokens and tail:
+            break
+        tail.append(message)
+        total += token_count
+    tail.reverse()
+    return tail
+
+
+def load_history(history_path: Path, max_tokens=None):
     """
     Load persisted chat history from disk and return LangChain message objects.
+    `.jsonl` paths are read as an append-only log; anything else as a legacy JSON array.
+    When max_tokens is given, only the most recent messages that fit the budget are returned.
     """
     if not history_path.exists():
         return []
 
+    if history_path.suffix == ".jsonl":
+        try:
+            return _load_history_log(history_path, max_tokens)
+        except Exception:
+            return []
+
     try:
         with history_path.open("r", encoding="utf-8") as file:
             data = json.load(file)
@@ -81,13 +391,12 @@ def load_history(history_path: Path):
 
     messages = []
     for item in data:
-        role = item.get("role")
-        content = item.get("content", "")
-        if role == "human":
-            messages.append(HumanMessage(content=content))
-        elif role == "ai":
-            messages.append(AIMessage(content=content))
+        message = _record_to_message(item)
+        if message is not None:
+            messages.append(message)
 
+    if max_tokens is not None:
+        return cap_messages(messages, max_tokens)
     return messages
 
 
@@ -97,19 +406,159 @@ def save_history(history_path: Path, messages):
     """
     payload = []
     for message in messages:
-        timestamp = datetime.now(timezone.utc).isoformat()
-        if isinstance(message, HumanMessage):
-            payload.append({"role": "human", "content": message.content, "timestamp": timestamp})
-        elif isinstance(message, AIMessage):
-            payload.append({"role": "ai", "content": message.content, "timestamp": timestamp})
+        record = _message_to_record(message)
+        if record is not None:
+            payload.append(record)
 
     with history_path.open("w", encoding="utf-8") as file:
         json.dump(payload, file, ensure_ascii=False, indent=2)
 
 
+def append_history(history_path: Path, messages):
+    """
+    Append new messages to a JSONL history log in one write followed by a single fsync.
+    Each message keeps the timestamp it was first persisted with.
+    """
+    lines = []
+    for message in messages:
+        record = _message_to_record(message)
+        if record is not None:
+            lines.append(json.dumps(record, ensure_ascii=False))
+    if not lines:
+        return
+
+    data = ("\n".join(lines) + "\n").encode("utf-8")
+    with history_path.open("a+b") as file:
+        # Terminate a record torn by a crash mid-write, so the new ones start on their own line
+        if file.tell():
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                data = b"\n" + data
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def migrate_history(legacy_path: Path, history_path: Path) -> bool:
+    """
+    One-time migration of a legacy JSON history file into the JSONL log.
+    The legacy file is kept with a `.migrated` suffix. Returns True if a migration ran.
+    """
+    if history_path.exists() or not legacy_path.exists():
+        return False
+
+    messages = load_history(legacy_path)
+    temp_path = history_path.with_name(history_path.name + ".tmp")
+    if temp_path.exists():
+        temp_path.unlink()
+    append_history(temp_path, messages)
+    if not temp_path.exists():
+        temp_path.touch()
+    os.replace(temp_path, history_path)
+    legacy_path.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+    return True
+
+
+def summary_path(history_path: Path) -> Path:
+    """
+    Sidecar file holding the rolling summary for a history file.
+    """
+    return history_path.with_suffix(".summary.json")
+
+
+class RollingSummary:
+    """
+    Keeps messages evicted from the context window as a running summary instead of dropping them.
+
+    window() puts the summary (as a system message) in front of the most recent messages that
+    fit the rest of the budget. Evicted messages are folded in with
+    summarizer(previous_summary, messages) -> str, but only once at least refresh_tokens of
+    them have accumulated, so the summarizer runs once every few turns rather than every turn.
+    Coverage is tracked by message timestamp, so it survives restarts and a history index that
+    only holds the tail of the log. With path, the summary is saved after every refresh.
+    """
+
+    def __init__(self, summarizer, path=None, refresh_tokens: int = SUMMARY_REFRESH_TOKENS):
+        self.summarizer = summarizer
+        self.path = Path(path) if path is not None else None
+        self.refresh_tokens = refresh_tokens
+        self.text = ""
+        # Timestamp of the newest message folded into the summary
+        self.covered_until = ""
+        self.refreshes = 0
+        self.reload()
+
+    def reload(self):
+        """
+        Re-read the persisted summary (clears it when the sidecar file is missing).
+        """
+        self.text, self.covered_until = "", ""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.text, self.covered_until = data.get("text", ""), data.get("covered_until", "")
+        except Exception:
+            pass
+
+    def reset(self):
+        self.text, self.covered_until = "", ""
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+
+    def save(self):
+        if self.path is None:
+            return
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        payload = {"text": self.text, "covered_until": self.covered_until}
+        temp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp_path, self.path)
+
+    def message(self):
+        return SystemMessage(content=SUMMARY_PREFIX + self.text) if self.text else None
+
+    def _covered(self, records) -> int:
+        """
+        Number of leading records already folded into the summary.
+        """
+        if not self.covered_until:
+            return 0
+        return bisect_right(records, self.covered_until, key=lambda record: record.timestamp or "\uffff")
+
+    def _window_start(self, token_index: TokenIndex, max_tokens: int) -> int:
+        message = self.message()
+        summary_tokens = estimate_tokens(message.content) if message is not None else 0
+        return token_index.window_start(max_tokens - summary_tokens)
+
+    def window(self, token_index: TokenIndex, max_tokens: int):
+        """
+        Summary message (if any) followed by the most recent messages that fit max_tokens.
+        """
+        records = token_index.records
+        if not records:
+            return []
+        start = self._window_start(token_index, max_tokens)
+        covered = min(self._covered(records), start)
+        if self.refresh_tokens > 0 and token_index.tokens_between(covered, start) >= self.refresh_tokens:
+            self.text = self.summarizer(self.text, token_index.messages_between(covered, start)).strip()
+            self.covered_until = records[start - 1].timestamp
+            self.refreshes += 1
+            self.save()
+            start = self._window_start(token_index, max_tokens)
+
+        message = self.message()
+        return ([message] if message is not None else []) + token_index.messages_between(start, len(records))
+
+
 def reset_history(history_path: Path):
     """
-    Delete persisted history file if it exists.
+    Delete persisted history file (and its rolling summary and vector index) if it exists.
     """
     if history_path.exists():
         history_path.unlink()
+    sidecar = summary_path(history_path)
+    if sidecar.exists():
+        sidecar.unlink()
+    # retrieval.VectorIndex files: <stem>.vectors.npy, .keys and .docs.jsonl (see retrieval.index_path)
+    for path in history_path.parent.glob(f"{glob.escape(history_path.stem)}.vectors.*"):
+        path.unlink()
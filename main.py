@@ -1,11 +1,62 @@
+import asyncio
 import logging
+import os
+import time
 from pathlib import Path
 
-from agents import SocraticAgents
-from agent_graph import create_agent_graph
+from checkpoint import (
+    CHECKPOINT_DB,
+    CHECKPOINT_DURABILITY,
+    delete_thread,
+    open_async_checkpointer,
+    prune_checkpoints,
+    thread_config,
+)
+from tracing import TRACE_FILE, Tracer
 from langchain_core.messages import AIMessage, HumanMessage
 
 LOG_FILE = "socratic.log"
+# Opt-in: run the arbiter and all three teachers concurrently (costs extra GPU work per turn)
+SPECULATIVE_EXECUTION = os.getenv("SOCRATIC_SPECULATIVE", "0") == "1"
+# Opt-in: JSON-schema decoding with a small num_predict for the arbiter and dialectic
+STRUCTURED_OUTPUT = os.getenv("SOCRATIC_STRUCTURED_OUTPUT", "0") == "1"
+# "history_first" sends the shared conversation before each role's prompt so nodes on one model reuse the prompt cache
+PROMPT_LAYOUT = os.getenv("SOCRATIC_PROMPT_LAYOUT", "system_first")
+# Preload the arbiter model in the background while the user types the first message
+WARM_UP = os.getenv("SOCRATIC_WARM_UP", "1") == "1"
+# Opt-in: keep graph state in a SQLite checkpoint (SOCRATIC_CHECKPOINT_DB) under this session's thread id,
+# send only the new message each turn and (with SOCRATIC_CHECKPOINT_DURABILITY=async) resume a turn
+# that was interrupted mid-loop
+CHECKPOINTING = os.getenv("SOCRATIC_CHECKPOINT", "0") == "1"
+SESSION_ID = os.getenv("SOCRATIC_SESSION_ID", "default")
+# How often the dialectic scores mastery: every N loop iterations, or opt-in "user" to score once
+# per learner message and hand the turn back after it
+SCORE_CADENCE = os.getenv("SOCRATIC_SCORE_CADENCE", "1")
+SCORE_CADENCE = SCORE_CADENCE if SCORE_CADENCE == "user" else int(SCORE_CADENCE)
+# Opt-in: loop back-edges reuse the arbiter's previous decision for up to this many iterations while
+# the mastery score holds still, rotating teachers on a stall (0 routes every iteration; see routing.ReusePolicy)
+ROUTE_REUSE = int(os.getenv("SOCRATIC_ROUTE_REUSE", "0"))
+# Opt-in: the arbiter and dialectic see only this many of the latest learner turns while the teachers
+# keep the whole window (0 gives every node the same window)
+CONTROL_WINDOW_TURNS = int(os.getenv("SOCRATIC_CONTROL_WINDOW_TURNS", "0"))
+# Opt-in: recall earlier exchanges similar to the new message into the window (needs an Ollama
+# embedding model, SOCRATIC_EMBED_MODEL; see retrieval.py)
+RETRIEVAL = os.getenv("SOCRATIC_RETRIEVAL", "0") == "1"
+# Opt-in: directory for per-iteration routing, mastery, latency and token records
+# (python -m analytics report), e.g. "analytics"; "" records nothing
+ANALYTICS_DIR = os.getenv("SOCRATIC_ANALYTICS_DIR", "")
+# Hard caps on the teaching loop within one user turn (0 disables the token and time caps)
+MAX_LOOP_ITERATIONS = int(os.getenv("MAX_LOOP_ITERATIONS", "5"))
+MAX_TURN_TOKENS = int(os.getenv("MAX_TURN_TOKENS", "0"))
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "120"))
+
+STOP_REASON_MESSAGES = {
+    "max_iterations": "iteration budget reached",
+    "max_tokens": "token budget reached",
+    "deadline": "time budget reached",
+    "plateau": "mastery score has stopped improving",
+    "awaiting_user": "waiting for your answer",
+}
 logger = logging.getLogger("socratic")
 logger.setLevel(logging.DEBUG)
 _fh = logging.FileHandler(LOG_FILE, encoding="utf-8")
@@ -14,11 +65,15 @@ logger.addHandler(_fh)
 from history import (
     HISTORY_ENABLED_DEFAULT,
     HISTORY_FILE_NAME,
+    HISTORY_LOG_FILE_NAME,
     CONTEXT_TOKEN_BUDGET,
-    cap_messages,
+    RollingSummary,
+    TokenIndex,
+    append_history,
     load_history,
-    save_history,
+    migrate_history,
     reset_history,
+    summary_path,
 )
 
 
@@ -32,7 +87,7 @@ def options_menu(history_enabled, history_path, history, context_token_budget):
         if choice == "1":
             history_enabled = not history_enabled
             if history_enabled:
-                history = load_history(history_path)
+                history = load_history(history_path, max_tokens=context_token_budget)
                 print(f"Persistent history enabled. Loaded {len(history)} messages.")
             else:
                 print("Persistent history disabled for this session.")
@@ -57,6 +112,9 @@ def options_menu(history_enabled, history_path, history, context_token_budget):
                     print("Please enter a positive integer.")
                 else:
                     context_token_budget = new_budget
+                    if history_enabled:
+                        # Only the tail that fit the old budget is in memory; reload for the new one
+                        history = load_history(history_path, max_tokens=context_token_budget)
                     print(f"Context token budget set to {context_token_budget}.")
             except Exception:
                 print("Invalid number; please enter an integer.")
@@ -68,23 +126,185 @@ def options_menu(history_enabled, history_path, history, context_token_budget):
 
     return history_enabled, history, context_token_budget
 
-def main():
+async def run_turn(loop, graph_input, agent_messages, config=None, recorder=None):
     """
-    Main entry point for the Socratic agent loop. Handles user input, runs the agent graph, and displays output.
+    Run one user turn through the graph with astream, printing teacher tokens as they are
+    generated. AI messages produced by the agents are appended to agent_messages.
+    With a checkpointed graph, config carries the thread id and graph_input=None resumes
+    an interrupted run. recorder (analytics.TurnRecorder) sees every node update.
+    Returns the last mastery score reported during the turn, or None.
+    """
+    mastery_score = None
+    # Node whose tokens are currently being printed, so its final update is not printed twice
+    streaming_node = None
+    checkpoint_kwargs = {"durability": CHECKPOINT_DURABILITY} if config is not None else {}
+
+    async for mode, payload in loop.astream(
+        graph_input, config, stream_mode=["custom", "updates"], **checkpoint_kwargs
+    ):
+        if mode == "custom":
+            node_name = payload["node"]
+            if node_name != streaming_node:
+                print(f"\n[{node_name.upper()}]: ", end="", flush=True)
+                streaming_node = node_name
+            print(payload["token"], end="", flush=True)
+            continue
+
+        for node_name, output in payload.items():
+            if not output:
+                continue
+            if recorder is not None:
+                recorder.observe(node_name, output)
+            # Print messages from the agents so the user can see the communication (the arbiter's
+            # update may also carry RemoveMessages that trim the checkpointed state)
+            node_messages = [m for m in output.get("messages") or [] if isinstance(m, AIMessage)]
+            if node_messages:
+                agent_messages.extend(node_messages)
+                if node_name == streaming_node:
+                    print()
+                else:
+                    print(f"\n[{node_name.upper()}]: {node_messages[-1].content}")
+            if node_name == streaming_node:
+                streaming_node = None
+            # Log raw arbiter/dialectic output to file instead of printing
+            if "arbiter_raw" in output:
+                logger.debug("[ARBITER_RAW]: %s", output['arbiter_raw'])
+            if "dialectic_raw" in output:
+                logger.debug("[DIALECTIC_RAW]: %s", output['dialectic_raw'])
+            if "speculation" in output:
+                logger.debug("[SPECULATION]: %s", output['speculation'])
+            if "mastery_score" in output:
+                score = output['mastery_score']
+                mastery_score = score
+                print(f"--- Current Mastery Score: {score} ---")
+                if score >= 0.9:
+                    print("*** Mastery threshold reached (>= 0.9). You may start a new topic. ***")
+            if output.get("stop_reason"):
+                reason = output["stop_reason"]
+                logger.debug("[STOP_REASON]: %s after %s iterations", reason, output.get("iteration"))
+                print(f"--- Your turn: {STOP_REASON_MESSAGES.get(reason, reason)}. ---")
+
+    return mastery_score
+
+
+def build_session(checkpointer=None):
+    """
+    Build the agents and compile the graph, then optionally preload the arbiter model.
+    The agent/graph imports (langchain_ollama, langgraph) happen here rather than at module
+    import, so amain can run this in a worker thread while the first prompt is already shown.
+    """
+    from agents import TEMPERATURES, SocraticAgents, control_windows
+    from agent_graph import create_agent_graph
+    from backends import BackendRegistry
+    from ollama_pool import OllamaPool
+    from routing import ROUTER_MODEL_PATH, ReusePolicy, RoutingOptions, load_router
+
+    # SOCRATIC_OLLAMA_HOSTS spreads the agents over several Ollama servers (see backends.py)
+    backends = BackendRegistry.from_env(roles=TEMPERATURES)
+    if backends is not None:
+        backends.start_health_checks()
+
+    agents = SocraticAgents(
+        context_switch=True,
+        structured_output=STRUCTURED_OUTPUT,
+        prompt_layout=PROMPT_LAYOUT,
+        score_cadence=SCORE_CADENCE,
+        # A trained routing classifier (python -m routing train socratic.log) is used when present
+        routing=RoutingOptions(
+            router=load_router(Path(__file__).parent / ROUTER_MODEL_PATH),
+            reuse=ReusePolicy(reuse_iterations=ROUTE_REUSE) if ROUTE_REUSE > 0 else None,
+            speculative=SPECULATIVE_EXECUTION,
+        ),
+        # With a checkpointer the graph state holds the whole conversation, so nodes trim it
+        windows=control_windows(CONTROL_WINDOW_TURNS, CONTEXT_TOKEN_BUDGET if checkpointer is not None else None),
+        # One keep-alive connection pool and per-model request limit for every agent (per endpoint with backends)
+        transport=backends if backends is not None else OllamaPool(),
+    )
+
+    # SOCRATIC_TRACE=<file>.jsonl (or .json for Chrome trace format) records per-node spans
+    tracer = Tracer(TRACE_FILE) if TRACE_FILE else None
+    loop = create_agent_graph(agents=agents, tracer=tracer, checkpointer=checkpointer)
+    if WARM_UP:
+        agents.warm_up()
+    return agents, loop, tracer
+
+
+async def start_session():
+    checkpointer = await open_async_checkpointer(CHECKPOINT_DB) if CHECKPOINTING else None
+    agents, loop, tracer = await asyncio.to_thread(build_session, checkpointer)
+    return agents, loop, tracer, checkpointer
+
+
+def open_semantic_memory(history_path, pool=None):
     """
-    agents = SocraticAgents(context_switch=True)
+    SemanticMemory over the vector index kept next to the history log. numpy and the embedding
+    client are only imported when retrieval is enabled.
+    """
+    from retrieval import SemanticMemory, VectorIndex, index_path, ollama_embedder
+
+    return SemanticMemory(ollama_embedder(pool=pool), VectorIndex(index_path(history_path)))
+
 
-    loop = create_agent_graph(agents=agents)
-    history_path = Path(__file__).with_name(HISTORY_FILE_NAME)
+def index_exchange(memory, messages):
+    try:
+        memory.add(messages)
+    except Exception as exc:
+        logger.warning("[RETRIEVAL]: could not index the exchange (%s)", exc)
+
+
+async def resume_interrupted_turn(loop, config, history_path, history_enabled):
+    """
+    Finish a turn that was interrupted mid-loop (e.g. by a crash) from its last checkpoint.
+    Returns the mastery score stored in the checkpoint.
+    """
+    snapshot = await loop.aget_state(config)
+    mastery_score = snapshot.values.get("mastery_score", 0.0) or 0.0
+    if not snapshot.next:
+        return mastery_score
+    print("Resuming the turn that was interrupted last time...")
+    agent_messages = []
+    turn_score = await run_turn(loop, None, agent_messages, config)
+    if history_enabled:
+        append_history(history_path, agent_messages)
+    return turn_score if turn_score is not None else mastery_score
+
+
+async def amain():
+    """
+    Main entry point for the Socratic agent loop. Handles user input, runs the agent graph, and displays output.
+    Runs on a single event loop so the async Ollama clients keep their connections between turns.
+    """
+    # Agents and graph are built in the background; the first turn waits for them if needed
+    session = asyncio.ensure_future(start_session())
+    agents = loop = tracer = checkpointer = None
+    config = thread_config(SESSION_ID) if CHECKPOINTING else None
+    resumed = False
+    history_path = Path(__file__).with_name(HISTORY_LOG_FILE_NAME)
+    migrate_history(Path(__file__).with_name(HISTORY_FILE_NAME), history_path)
     history_enabled = HISTORY_ENABLED_DEFAULT
-    history = load_history(history_path) if history_enabled else []
     context_token_budget = CONTEXT_TOKEN_BUDGET
+    # Only the tail of the log that fits the context budget is read at startup. The index keeps
+    # compact records with their token counts, so each turn only counts (and builds) new messages
+    token_index = TokenIndex(load_history(history_path, max_tokens=context_token_budget) if history_enabled else [])
+    # Messages that fall out of the budget are folded into a summary persisted next to the log
+    summary = RollingSummary(lambda previous, messages: agents.summarize(previous, messages), summary_path(history_path))
+    memory = None
+    # Embedding of the previous exchange, finished in the background while the user types
+    indexing = None
     mastery_score = 0.0
     mastery_threshold = 0.9
+    analytics = None
+    if ANALYTICS_DIR:
+        from analytics import AnalyticsStore, TurnRecorder
+
+        analytics = AnalyticsStore(Path(__file__).with_name(ANALYTICS_DIR))
+    # Each run is its own analytics session; turns are numbered from 0 within it
+    analytics_session = f"{SESSION_ID}-{time.strftime('%Y%m%dT%H%M%S')}"
+    turn_number = 0
 
     print("Change options with `options` or reset with 'reset'")
     while True:
-        user_input = input("User: ")
+        user_input = await asyncio.to_thread(input, "User: ")
 
         # Add exit to loop
         if user_input.lower() in ["quit", "exit"]:
@@ -93,9 +313,16 @@ def main():
         # runtime commands to control history behaviour
         cmd = user_input.strip().lower()
         if cmd in ("options", "menu", "options menu"):
+            if indexing is not None:
+                await indexing
+                indexing = None
             history_enabled, history, context_token_budget = options_menu(
-                history_enabled, history_path, history, context_token_budget
+                history_enabled, history_path, token_index.records, context_token_budget
             )
+            token_index = TokenIndex(history)
+            summary.reload()
+            # The menu may have reset the log and its vector index; reopen the index from disk
+            memory = None
             continue
         if cmd in ("history off",):
             history_enabled = False
@@ -103,22 +330,58 @@ def main():
             continue
         if cmd in ("history on",):
             history_enabled = True
-            history = load_history(history_path)
-            print(f"Persistent history enabled. Loaded {len(history)} messages.")
+            token_index = TokenIndex(load_history(history_path, max_tokens=context_token_budget))
+            summary.reload()
+            print(f"Persistent history enabled. Loaded {len(token_index)} messages.")
             continue
         if cmd in ("reset", "reset history", "history reset"):
-            history = []
+            token_index = TokenIndex()
             mastery_score = 0.0
+            # Let the background indexing finish so it cannot write vectors after the files are removed
+            if indexing is not None:
+                await indexing
+                indexing = None
             try:
                 reset_history(history_path)
             except Exception:
                 pass
+            summary.reset()
+            memory = None
+            if CHECKPOINTING:
+                delete_thread(CHECKPOINT_DB, SESSION_ID)
             print("History reset; conversation memory and mastery score cleared.")
             continue
 
+        agents, loop, tracer, checkpointer = await session
+        if CHECKPOINTING and not resumed:
+            resumed = True
+            mastery_score = await resume_interrupted_turn(loop, config, history_path, history_enabled)
         user_message = HumanMessage(content=user_input)
         # Trim the combined history + current user message to the token budget
-        turn_messages = cap_messages(history + [user_message], context_token_budget)
+        history_length = len(token_index)
+        token_index.append(user_message)
+        if CHECKPOINTING:
+            # The checkpoint already holds the conversation; nodes trim it to the budget
+            agents.windows.max_tokens = context_token_budget
+            turn_messages = [user_message]
+        elif history_enabled and RETRIEVAL:
+            if memory is None:
+                memory = await asyncio.to_thread(open_semantic_memory, history_path, agents.transport)
+            if indexing is not None:
+                await indexing
+                indexing = None
+            try:
+                turn_messages = await asyncio.to_thread(
+                    memory.window, token_index, context_token_budget, user_input, summary.window
+                )
+            except Exception as exc:
+                logger.warning("[RETRIEVAL]: recall failed (%s); using the recent window only", exc)
+                turn_messages = await asyncio.to_thread(summary.window, token_index, context_token_budget)
+        elif history_enabled:
+            # May call the summarizer model, so keep it off the event loop
+            turn_messages = await asyncio.to_thread(summary.window, token_index, context_token_budget)
+        else:
+            turn_messages = token_index.cap(context_token_budget)
         agent_messages = []
 
         # Stream the graph execution
@@ -127,34 +390,75 @@ def main():
             "mastery_score": mastery_score,
             "mastery_threshold": mastery_threshold,
             "mastery_reached": False,
+            "max_iterations": MAX_LOOP_ITERATIONS,
+            "max_tokens": MAX_TURN_TOKENS,
+            "deadline": time.time() + TURN_DEADLINE_SECONDS if TURN_DEADLINE_SECONDS > 0 else 0,
+            "iteration": 0,
+            "score_history": [],
         }
+        if CHECKPOINTING:
+            # Per-turn fields carried over in the checkpoint are reset; mastery_score carries on
+            del graph_input["mastery_score"]
+            graph_input.update(tokens_used=None, stop_reason="", speculative_agent="", speculative_message=None)
 
-        for event in loop.stream(graph_input):
-            for node_name, output in event.items():
-                # Print messages from the agents so the user can see the communication
-                if "messages" in output:
-                    node_messages = output["messages"]
-                    if node_messages:
-                        for node_message in node_messages:
-                            if isinstance(node_message, AIMessage):
-                                agent_messages.append(node_message)
-                        print(f"\n[{node_name.upper()}]: {node_messages[-1].content}")
-                # Log raw arbiter/dialectic output to file instead of printing
-                if "arbiter_raw" in output:
-                    logger.debug("[ARBITER_RAW]: %s", output['arbiter_raw'])
-                if "dialectic_raw" in output:
-                    logger.debug("[DIALECTIC_RAW]: %s", output['dialectic_raw'])
-                if "mastery_score" in output:
-                    score = output['mastery_score']
-                    mastery_score = score
-                    print(f"--- Current Mastery Score: {score} ---")
-                    if score >= 0.9:
-                        print("*** Mastery threshold reached (>= 0.9). You may start a new topic. ***")
+        agents.residency.start_turn()
+        turn_start = time.perf_counter()
+        recorder = None
+        if analytics is not None:
+            recorder = TurnRecorder(analytics_session, turn_number, mastery_threshold)
+        turn_score = await run_turn(loop, graph_input, agent_messages, config, recorder)
+        turn_number += 1
+        if recorder is not None:
+            analytics.append(recorder.rows)
+        logger.debug(
+            "[TURN_LATENCY]: %.0f ms (dialectic scored %d, skipped %d so far; routing %s)",
+            (time.perf_counter() - turn_start) * 1000,
+            agents.scoring_stats["scored"], agents.scoring_stats["skipped"], agents.routing_stats,
+        )
+        logger.debug("[PROMPT_TOKENS]: %s", {
+            role: round(stats["tokens"] / stats["calls"]) for role, stats in agents.prompt_stats.items()
+        })
+        if CHECKPOINTING:
+            await asyncio.to_thread(prune_checkpoints, CHECKPOINT_DB, SESSION_ID)
+        logger.debug("[MODEL_LOADS]: %d this turn, %d total", agents.residency.turn_loads, agents.residency.total_loads)
+        if agents.cache is not None:
+            logger.debug(
+                "[CACHE]: hit rate %.1f%%, %.0f ms of LLM time saved",
+                agents.cache.hit_rate * 100, agents.cache.stats["saved_ms"],
+            )
+        if hasattr(agents.transport, "snapshot"):
+            logger.debug("[OLLAMA_BACKENDS]: %s %s", agents.transport.stats, agents.transport.snapshot())
+        elif agents.transport is not None:
+            logger.debug("[OLLAMA_POOL]: %s", agents.transport.stats)
+        if turn_score is not None:
+            mastery_score = turn_score
 
         # Persist only when history is enabled
         if history_enabled:
-            history = history + [user_message] + agent_messages
-            save_history(history_path, history)
+            token_index.extend(agent_messages)
+            append_history(history_path, [user_message] + agent_messages)
+            if memory is not None:
+                indexing = asyncio.ensure_future(
+                    asyncio.to_thread(index_exchange, memory, [user_message] + agent_messages)
+                )
+        else:
+            token_index.truncate(history_length)
+
+    if CHECKPOINTING and checkpointer is None:
+        # Quit before the first turn: wait for the session so its database connection can be closed
+        agents, loop, tracer, checkpointer = await session
+    if indexing is not None:
+        await indexing
+    if tracer is not None:
+        tracer.close()
+    if checkpointer is not None:
+        await checkpointer.conn.close()
+
+def main():
+    """
+    Synchronous wrapper around amain for `python main.py`.
+    """
+    asyncio.run(amain())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,335 @@
+"""
+Shared, pooled HTTP transport for every Ollama call.
+
+Each ChatOllama client otherwise opens its own httpx connection pool to the same server and
+sends as many requests as its callers make. OllamaPool gives all of them (sync and async) one
+pair of keep-alive transports and puts a gate in front of the server:
+  - at most model_concurrency requests in flight per model (the "model" field of the request
+    body); further requests queue in FIFO order,
+  - at most max_queue waiting requests per model; beyond that OllamaBusyError is raised at once
+    instead of piling more work onto the GPU (backpressure),
+  - a request that cannot get a slot within queue_timeout raises OllamaBusyError,
+  - 429/503 replies (Ollama's "server busy") are retried with exponential backoff and full jitter.
+
+Inject it with SocraticAgents(transport=OllamaPool()), or pass pool.client_kwargs() to ChatOllama.
+"""
+
+import asyncio
+import collections
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+
+MODEL_CONCURRENCY = int(os.getenv("SOCRATIC_OLLAMA_MODEL_CONCURRENCY", "2"))
+MAX_QUEUE = int(os.getenv("SOCRATIC_OLLAMA_MAX_QUEUE", "16"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("SOCRATIC_OLLAMA_QUEUE_TIMEOUT", "60"))
+MAX_CONNECTIONS = int(os.getenv("SOCRATIC_OLLAMA_MAX_CONNECTIONS", "10"))
+RETRIES = int(os.getenv("SOCRATIC_OLLAMA_RETRIES", "3"))
+RETRY_BACKOFF_SECONDS = 0.25
+KEEPALIVE_EXPIRY_SECONDS = 300.0
+RETRY_STATUS_CODES = frozenset({429, 503})
+
+
+class OllamaBusyError(Exception):
+    """
+    Raised when a model's queue is full or a request waited longer than queue_timeout for a slot.
+    """
+
+
+def request_model(request: httpx.Request):
+    """
+    Model named in an Ollama API request body, or None (e.g. /api/tags).
+    """
+    if request.method != "POST":
+        return None
+    try:
+        return json.loads(request.content).get("model")
+    except (ValueError, AttributeError, httpx.RequestNotRead):
+        return None
+
+
+def _grant(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ModelGate:
+    """
+    FIFO concurrency limit for one model, shared by threads and event loops. A released slot is
+    handed straight to the oldest waiter, so a burst of new requests cannot overtake the queue.
+    """
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _enter_or_queue(self, waiter) -> bool:
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                raise OllamaBusyError(f"{len(self._waiters)} requests already queued for this model")
+            self._waiters.append(waiter)
+            return False
+
+    def _withdraw(self, waiter) -> bool:
+        """
+        Remove a waiter that gave up. False means a slot was already handed to it.
+        """
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return True
+            except ValueError:
+                return False
+
+    def acquire(self, timeout: float):
+        event = threading.Event()
+        if self._enter_or_queue(event):
+            return
+        if not event.wait(timeout) and self._withdraw(event):
+            raise OllamaBusyError(f"no slot within {timeout:.1f}s")
+
+    async def aacquire(self, timeout: float):
+        future = asyncio.get_running_loop().create_future()
+        if self._enter_or_queue(future):
+            return
+        try:
+            # shield: a timeout or cancellation must not cancel a slot that is being handed over
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if not self._withdraw(future):
+                self.release()
+            if isinstance(exc, asyncio.TimeoutError):
+                raise OllamaBusyError(f"no slot within {timeout:.1f}s") from None
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                try:
+                    waiter.get_loop().call_soon_threadsafe(_grant, waiter)
+                    return
+                except RuntimeError:
+                    # The waiter's event loop is closed; pass the slot on
+                    continue
+            self.active -= 1
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """
+    Response body that frees the model slot once the (streamed) reply has been read.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _once(func):
+    lock = threading.Lock()
+    done = []
+
+    def wrapper():
+        with lock:
+            if done:
+                return
+            done.append(True)
+        func()
+
+    return wrapper
+
+
+class OllamaPool:
+    """
+    Keep-alive connection pool plus per-model gates, shared by every client built from
+    client_kwargs(). transport/async_transport replace the underlying httpx transports (tests
+    pass an httpx.MockTransport); sleep is the backoff sleep for sync retries.
+    """
+
+    def __init__(self, model_concurrency: int = MODEL_CONCURRENCY, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT_SECONDS, max_connections: int = MAX_CONNECTIONS,
+                 retries: int = RETRIES, backoff: float = RETRY_BACKOFF_SECONDS, request_timeout: float = None,
+                 transport=None, async_transport=None, sleep=time.sleep):
+        if model_concurrency < 1:
+            raise ValueError("model_concurrency must be at least 1")
+        self.model_concurrency = model_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.request_timeout = request_timeout
+        self._sleep = sleep
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+        )
+        self._inner = transport or httpx.HTTPTransport(limits=limits)
+        self._async_inner = async_transport or transport or httpx.AsyncHTTPTransport(limits=limits)
+        self.transport = _PooledTransport(self)
+        self.async_transport = _AsyncPooledTransport(self)
+        self._gates = {}
+        self._gates_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "rejected": 0, "queue_wait_ms": 0.0}
+
+    def gate(self, model: str) -> ModelGate:
+        with self._gates_lock:
+            gate = self._gates.get(model)
+            if gate is None:
+                gate = self._gates[model] = ModelGate(self.model_concurrency, self.max_queue)
+            return gate
+
+    def client_kwargs(self, role=None) -> dict:
+        """
+        ChatOllama keyword arguments that route its sync and async clients through this pool
+        (for every role; role is accepted for parity with BackendRegistry.client_kwargs).
+        """
+        sync_kwargs = {"transport": self.transport}
+        async_kwargs = {"transport": self.async_transport}
+        if self.request_timeout is not None:
+            sync_kwargs["timeout"] = async_kwargs["timeout"] = self.request_timeout
+        return {"sync_client_kwargs": sync_kwargs, "async_client_kwargs": async_kwargs}
+
+    def _retry_delay(self, attempt: int) -> float:
+        # Full jitter: concurrent clients that were rejected together do not retry together
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _count(self, key: str, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def close(self):
+        self._inner.close()
+
+    async def aclose(self):
+        await self._async_inner.aclose()
+
+
+class _PooledTransport(httpx.BaseTransport):
+
+    def __init__(self, pool: OllamaPool):
+        self.pool = pool
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        pool = self.pool
+        model = request_model(request)
+        if model is None:
+            return pool._inner.handle_request(request)
+
+        gate = pool.gate(model)
+        queued = time.perf_counter()
+        try:
+            gate.acquire(pool.queue_timeout)
+        except OllamaBusyError:
+            pool._count("rejected")
+            raise
+        pool._count("queue_wait_ms", (time.perf_counter() - queued) * 1000)
+        pool._count("requests")
+        release = _once(gate.release)
+        try:
+            for attempt in range(pool.retries + 1):
+                response = pool._inner.handle_request(request)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == pool.retries:
+                    break
+                response.close()
+                pool._count("retries")
+                pool._sleep(pool._retry_delay(attempt))
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    def close(self):
+        # Called by each client's close(); the shared connections stay open until OllamaPool.close()
+        pass
+
+
+class _AsyncPooledTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, pool: OllamaPool):
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        pool = self.pool
+        model = request_model(request)
+        if model is None:
+            return await pool._async_inner.handle_async_request(request)
+
+        gate = pool.gate(model)
+        queued = time.perf_counter()
+        try:
+            await gate.aacquire(pool.queue_timeout)
+        except OllamaBusyError:
+            pool._count("rejected")
+            raise
+        pool._count("queue_wait_ms", (time.perf_counter() - queued) * 1000)
+        pool._count("requests")
+        release = _once(gate.release)
+        try:
+            for attempt in range(pool.retries + 1):
+                response = await pool._async_inner.handle_async_request(request)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == pool.retries:
+                    break
+                await response.aclose()
+                pool._count("retries")
+                await asyncio.sleep(pool._retry_delay(attempt))
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_AsyncReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        pass
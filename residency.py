@@ -0,0 +1,110 @@
+"""
+Model residency: keep track of which Ollama models are loaded in VRAM, decide keep_alive and
+fall back to a single shared model when the per-iteration working set does not fit.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+# Approximate VRAM footprint (GB) of each model at the default context size
+MODEL_FOOTPRINTS_GB = {
+    "phi4-mini:3.8b-q4_K_M": 3.2,
+    "mistral:7b-instruct-v0.3-q3_K_S": 3.6,
+    "llama3.1:8b-instruct-q2_K": 3.8,
+}
+DEFAULT_FOOTPRINT_GB = 5.0
+# 0 / unset means "assume everything fits"
+VRAM_BUDGET_GB = float(os.getenv("OLLAMA_VRAM_GB", "0") or 0) or None
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Ollama reports load_duration in nanoseconds; anything above this means the model was (re)loaded
+LOAD_DURATION_THRESHOLD_NS = 250_000_000
+
+CONTROL_ROLES = ("arbiter", "dialectic")
+
+
+class ModelResidency:
+    """
+    Tracks model loads and plans role -> model placement for a VRAM budget.
+
+    Loads are counted from Ollama's load_duration when a response reports it, otherwise from
+    an LRU simulation of the resident set under the budget. Counters are kept per turn
+    (reset by start_turn) and in total.
+    """
+
+    def __init__(self, vram_budget_gb=VRAM_BUDGET_GB, footprints=None, keep_alive: str = KEEP_ALIVE):
+        self.vram_budget_gb = vram_budget_gb
+        self.footprints = dict(MODEL_FOOTPRINTS_GB, **(footprints or {}))
+        self.keep_alive = keep_alive
+        self.fell_back = False
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+        self.turn_loads = 0
+        self.total_loads = 0
+        self.loads_by_model = {}
+
+    def footprint(self, model: str) -> float:
+        return self.footprints.get(model, DEFAULT_FOOTPRINT_GB)
+
+    def _fits(self, models) -> bool:
+        if self.vram_budget_gb is None:
+            return True
+        return sum(self.footprint(model) for model in set(models)) <= self.vram_budget_gb
+
+    def plan(self, role_models: dict, shared_model: str) -> dict:
+        """
+        Return the role -> model placement to use. Every iteration needs the control models
+        (arbiter, dialectic) plus one teacher model; if that working set cannot stay resident
+        for some teacher, every role falls back to shared_model.
+        """
+        control = [role_models[role] for role in CONTROL_ROLES if role in role_models]
+        teachers = [model for role, model in role_models.items() if role not in CONTROL_ROLES]
+        working_sets = [control + [teacher] for teacher in teachers] or [control]
+        if all(self._fits(working_set) for working_set in working_sets):
+            self.fell_back = False
+            return dict(role_models)
+        self.fell_back = True
+        return {role: shared_model for role in role_models}
+
+    def order_roles(self, roles, role_models: dict):
+        """
+        Order roles so calls to the same model run back to back, keeping the first role's
+        model (normally the arbiter's, already resident) at the front.
+        """
+        roles = list(roles)
+        first_seen = {}
+        for position, role in enumerate(roles):
+            first_seen.setdefault(role_models[role], position)
+        return sorted(roles, key=lambda role: first_seen[role_models[role]])
+
+    def start_turn(self):
+        with self._lock:
+            self.turn_loads = 0
+
+    def record_call(self, model: str, response=None) -> bool:
+        """
+        Record one LLM call to model. Returns True if it required loading the model.
+        """
+        metadata = getattr(response, "response_metadata", None) or {}
+        load_duration = metadata.get("load_duration")
+        with self._lock:
+            simulated_load = model not in self._resident
+            if not simulated_load:
+                self._resident.move_to_end(model)
+            else:
+                self._resident[model] = self.footprint(model)
+                if self.vram_budget_gb is not None:
+                    # Evict least recently used models until the new one fits
+                    while len(self._resident) > 1 and sum(self._resident.values()) > self.vram_budget_gb:
+                        self._resident.popitem(last=False)
+
+            loaded = load_duration > LOAD_DURATION_THRESHOLD_NS if load_duration is not None else simulated_load
+            if loaded:
+                self.turn_loads += 1
+                self.total_loads += 1
+                self.loads_by_model[model] = self.loads_by_model.get(model, 0) + 1
+            return loaded
+
+    def resident_models(self):
+        with self._lock:
+            return list(self._resident)
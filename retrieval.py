@@ -0,0 +1,379 @@
+"""
+Semantic recall of earlier exchanges.
+
+The context window is otherwise chosen by recency alone, so a topic the learner discussed weeks
+ago is gone by the time they return to it. Here every persisted exchange (a learner message and
+the agent replies that followed it) is embedded with an Ollama embedding model and stored in a
+VectorIndex. Each turn, the exchanges most similar to the new message are recalled into the
+window ahead of the most recent turns.
+
+VectorIndex keeps unit-length float32 vectors in a memory-mapped .npy matrix that grows by
+doubling, plus one sign bit per dimension packed into uint64 words. A search ranks every vector
+by Hamming distance between sign bits (a few XOR/popcount passes over a small in-memory array),
+then rescores only the best `candidates` rows exactly. At 100k vectors this stays in the low
+milliseconds on one core, where a full float32 scan is tens of milliseconds
+(python -m benchmarks.bench_retrieval).
+
+Usage:
+    python -m retrieval build message_history.jsonl   # index a history log (skips indexed exchanges)
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from langchain_core.messages import SystemMessage
+
+from history import _message_to_record, _record_to_message, estimate_tokens, load_history
+
+EMBED_MODEL = os.getenv("SOCRATIC_EMBED_MODEL", "nomic-embed-text")
+RETRIEVAL_TOP_K = int(os.getenv("SOCRATIC_RETRIEVAL_TOP_K", "3"))
+# Part of the context budget that recalled exchanges may use
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("SOCRATIC_RETRIEVAL_TOKENS", "1024"))
+# Exchanges less similar than this are not recalled
+RETRIEVAL_MIN_SCORE = float(os.getenv("SOCRATIC_RETRIEVAL_MIN_SCORE", "0.3"))
+# Rows rescored exactly after the sign-bit prefilter
+SEARCH_CANDIDATES = 256
+INITIAL_CAPACITY = 1024
+EMBED_BATCH_SIZE = 64
+# Characters of an exchange that are embedded (embedding models have short context windows)
+EMBED_MAX_CHARS = 2000
+RECALL_PREFIX = "Earlier exchanges related to the learner's latest message:"
+
+
+def index_path(history_path: Path) -> Path:
+    """
+    Base path of the vector index kept next to a history log.
+    """
+    return history_path.with_suffix(".vectors")
+
+
+def ollama_embedder(model: str = EMBED_MODEL, pool=None):
+    """
+    embed(texts) -> list of vectors, backed by OllamaEmbeddings (imported on first use).
+    """
+    from langchain_ollama import OllamaEmbeddings
+
+    embeddings = OllamaEmbeddings(model=model, **(pool.client_kwargs() if pool is not None else {}))
+    return embeddings.embed_documents
+
+
+def _sign_words(vectors) -> np.ndarray:
+    """
+    Sign bits of each row packed into uint64 words (rows are zero-padded to whole words).
+    """
+    vectors = np.atleast_2d(vectors)
+    bits = np.packbits(vectors > 0, axis=1)
+    padding = (-bits.shape[1]) % 8
+    if padding:
+        bits = np.pad(bits, ((0, 0), (0, padding)))
+    return bits.view(np.uint64)
+
+
+class VectorIndex:
+    """
+    Keyed, append/upsert-only vector store with top-k cosine search.
+
+    With path, vectors live in <path>.npy (memory-mapped) and documents in the append-only
+    <path>.docs.jsonl, whose offsets are logged per key in the append-only <path>.keys; every
+    upsert only appends, so it costs the same at 100 or 100k vectors. A key's row is the
+    position of its first appearance in the keys log. Without a path everything is kept in memory.
+    """
+
+    def __init__(self, path=None, candidates: int = SEARCH_CANDIDATES):
+        self.path = Path(path) if path is not None else None
+        self.candidates = candidates
+        self.dim = None
+        self.count = 0
+        self.keys = []
+        self._rows = {}
+        # Document location per row: offset into the docs file, or the document itself in memory
+        self._docs = []
+        self._vectors = None
+        # Sign words stored word-major (words x capacity) so each search pass reads contiguous memory
+        self._signs = None
+        if self.path is not None and self._keys_path.exists() and self._vectors_path.exists():
+            self._load()
+
+    @property
+    def _keys_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".keys")
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".npy")
+
+    @property
+    def _docs_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".docs.jsonl")
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def _load(self):
+        for line in self._keys_path.read_text(encoding="utf-8").splitlines():
+            key, _, offset = line.rpartition("\t")
+            if not key:
+                continue
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = len(self.keys)
+                self.keys.append(key)
+                self._docs.append(None)
+            # Later upserts of a key win
+            self._docs[row] = int(offset)
+        self.count = len(self.keys)
+        self._vectors = np.lib.format.open_memmap(self._vectors_path, mode="r+")
+        capacity, self.dim = self._vectors.shape
+        self._signs = np.zeros(((self.dim + 63) // 64, capacity), dtype=np.uint64)
+        # Sign bits are cheap to rebuild, so they are not stored; rebuild in blocks to bound memory
+        for start in range(0, self.count, 65536):
+            end = min(start + 65536, self.count)
+            self._signs[:, start:end] = _sign_words(self._vectors[start:end]).T
+
+    def _allocate(self, capacity: int):
+        words = (self.dim + 63) // 64
+        signs = np.zeros((words, capacity), dtype=np.uint64)
+        if self.path is None:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            if self._vectors is not None:
+                vectors[:self.count] = self._vectors[:self.count]
+        else:
+            # Write the grown matrix next to the old one, then swap it in
+            temp_path = self._vectors_path.with_name(self._vectors_path.name + ".tmp")
+            vectors = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+            if self._vectors is not None:
+                vectors[:self.count] = self._vectors[:self.count]
+            vectors.flush()
+            del vectors
+            self._vectors = None
+            os.replace(temp_path, self._vectors_path)
+            vectors = np.lib.format.open_memmap(self._vectors_path, mode="r+")
+        if self._signs is not None:
+            signs[:, :self.count] = self._signs[:, :self.count]
+        self._vectors, self._signs = vectors, signs
+
+    def upsert(self, keys, vectors, docs):
+        """
+        Insert or replace one vector and document per key. Vectors are normalized to unit length.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(keys) or len(docs) != len(keys):
+            raise ValueError("upsert needs one vector and one document per key")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self._rows]
+        needed = self.count + len(new_keys)
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed > capacity:
+            self._allocate(max(needed, 2 * capacity, INITIAL_CAPACITY))
+        for key in new_keys:
+            self._rows[key] = self.count
+            self.keys.append(key)
+            self._docs.append(None)
+            self.count += 1
+
+        rows = np.array([self._rows[key] for key in keys])
+        self._vectors[rows] = vectors
+        self._signs[:, rows] = _sign_words(vectors).T
+        if self.path is None:
+            for row, doc in zip(rows, docs):
+                self._docs[row] = doc
+        else:
+            # Vectors are written before the key is logged, so a logged key always has its vector
+            self._vectors.flush()
+            key_lines = []
+            with self._docs_path.open("ab") as file:
+                for key, row, doc in zip(keys, rows, docs):
+                    self._docs[row] = file.tell()
+                    file.write(json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n")
+                    key_lines.append(f"{key}\t{self._docs[row]}\n")
+            with self._keys_path.open("a", encoding="utf-8") as file:
+                file.writelines(key_lines)
+
+    def clear(self):
+        """
+        Drop every vector and document (and the files backing them).
+        """
+        self.dim, self.count, self.keys, self._rows, self._docs = None, 0, [], {}, []
+        self._vectors = self._signs = None
+        if self.path is not None:
+            for path in (self._vectors_path, self._docs_path, self._keys_path):
+                if path.exists():
+                    path.unlink()
+
+    def document(self, key):
+        doc = self._docs[self._rows[key]]
+        if self.path is None:
+            return doc
+        with self._docs_path.open("rb") as file:
+            file.seek(doc)
+            return json.loads(file.readline())
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        if self.count <= self.candidates:
+            return np.arange(self.count)
+        query_words = _sign_words(query)[0]
+        distance = np.zeros(self.count, dtype=np.uint16)
+        scratch = np.empty(self.count, dtype=np.uint64)
+        bit_counts = np.empty(self.count, dtype=np.uint8)
+        for word, signs in zip(query_words, self._signs):
+            np.bitwise_xor(signs[:self.count], word, out=scratch)
+            np.bitwise_count(scratch, out=bit_counts)
+            distance += bit_counts
+        return np.argpartition(distance, self.candidates)[:self.candidates]
+
+    def search(self, query, k: int):
+        """
+        Up to k (key, cosine similarity) pairs, most similar first.
+        """
+        if self.count == 0 or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        # Sorted rows read the memory-mapped matrix front to back
+        rows = np.sort(self._candidate_rows(query))
+        scores = self._vectors[rows] @ query
+        return [(self.keys[rows[i]], float(scores[i])) for i in np.argsort(-scores)[:k]]
+
+
+def exchanges(messages):
+    """
+    Split Human/AI messages into exchanges: a learner message and the replies that followed it.
+    """
+    exchange = []
+    for message in messages:
+        if message.type == "human" and exchange:
+            yield exchange
+            exchange = []
+        if message.type in ("human", "ai"):
+            exchange.append(message)
+    if exchange:
+        yield exchange
+
+
+def _exchange_text(exchange) -> str:
+    return "\n".join(message.content for message in exchange)[:EMBED_MAX_CHARS]
+
+
+class SemanticMemory:
+    """
+    Recalls earlier exchanges relevant to the learner's latest message.
+    embed(texts) returns one vector per text (see ollama_embedder). Exchanges are keyed by the
+    timestamp of their learner message, which is also how they are kept out of the recall when
+    they are still inside the recency window.
+    """
+
+    def __init__(self, embed, index: VectorIndex, top_k: int = RETRIEVAL_TOP_K,
+                 token_budget: int = RETRIEVAL_TOKEN_BUDGET, min_score: float = RETRIEVAL_MIN_SCORE):
+        self.embed = embed
+        self.index = index
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.min_score = min_score
+
+    def add(self, messages):
+        """
+        Embed and store the exchanges in messages (persisted messages, so they carry timestamps).
+        Returns the number of exchanges stored.
+        """
+        batch = [e for e in exchanges(messages) if e[0].type == "human" and e[0].additional_kwargs.get("timestamp")]
+        for start in range(0, len(batch), EMBED_BATCH_SIZE):
+            chunk = batch[start:start + EMBED_BATCH_SIZE]
+            vectors = self.embed([_exchange_text(exchange) for exchange in chunk])
+            keys = [exchange[0].additional_kwargs["timestamp"] for exchange in chunk]
+            docs = [[_message_to_record(message) for message in exchange] for exchange in chunk]
+            self.index.upsert(keys, vectors, docs)
+        return len(batch)
+
+    def backfill(self, history_path: Path) -> int:
+        """
+        Index every exchange of a history log that is not indexed yet.
+        """
+        pending = [
+            exchange for exchange in exchanges(load_history(history_path))
+            if exchange[0].additional_kwargs.get("timestamp") not in self.index
+        ]
+        return self.add([message for exchange in pending for message in exchange])
+
+    def recall(self, text: str, before: str = None):
+        """
+        Relevant earlier exchanges as persisted records (dicts), oldest first, within token_budget.
+        Only exchanges whose learner message is older than the timestamp before are considered.
+        """
+        if len(self.index) == 0 or self.top_k <= 0:
+            return []
+        query = self.embed([text])[0]
+        # Over-fetch: the newest exchanges are usually excluded because they are still in the window
+        hits = self.index.search(query, self.top_k * 4)
+        recalled = []
+        used = 0
+        for key, score in hits:
+            if score < self.min_score or (before is not None and key >= before):
+                continue
+            doc = self.index.document(key)
+            tokens = sum(estimate_tokens(record["content"]) for record in doc)
+            if used + tokens > self.token_budget:
+                continue
+            recalled.append((key, doc))
+            used += tokens
+            if len(recalled) == self.top_k:
+                break
+        recalled.sort(key=lambda item: item[0])
+        return [record for _, doc in recalled for record in doc]
+
+    def window(self, token_index, max_tokens: int, text: str, recent_window=None):
+        """
+        Recalled exchanges (after a system note) followed by the most recent messages.
+        recent_window(token_index, max_tokens) builds the recency part (TokenIndex.cap by default;
+        main passes RollingSummary.window). The recalled tokens come out of max_tokens.
+        """
+        recent_window = recent_window or (lambda index, budget: index.cap(budget))
+        records = token_index.records
+        if not records:
+            return []
+        # Exchanges still inside the window that recency alone would keep are not recalled
+        start = token_index.window_start(max_tokens - self.token_budget)
+        recalled = self.recall(text, before=records[start].timestamp)
+        if not recalled:
+            return recent_window(token_index, max_tokens)
+        messages = [_record_to_message(record) for record in recalled]
+        used = sum(estimate_tokens(message.content) for message in messages)
+        recent = recent_window(token_index, max_tokens - used)
+        # The recency window may have reached back over a recalled exchange; keep one copy
+        oldest_recent = next((m.additional_kwargs.get("timestamp") for m in recent if m.type != "system"), None)
+        if oldest_recent is not None:
+            messages = [m for m in messages if m.additional_kwargs.get("timestamp", "") < oldest_recent]
+        if not messages:
+            return recent
+        return [SystemMessage(content=RECALL_PREFIX)] + messages + recent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic recall index over a history log.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="index the exchanges of a history log")
+    build_parser.add_argument("history", help="history log (.jsonl)")
+    build_parser.add_argument("--model", default=EMBED_MODEL, help="Ollama embedding model")
+    args = parser.parse_args()
+
+    history_path = Path(args.history)
+    memory = SemanticMemory(ollama_embedder(args.model), VectorIndex(index_path(history_path)))
+    added = memory.backfill(history_path)
+    print(f"indexed {added} new exchanges; {len(memory.index)} in {index_path(history_path)}")
+
+
+if __name__ == "__main__":
+    main()
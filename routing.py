@@ -0,0 +1,299 @@
+"""
+Routing fast-path for the arbiter.
+
+A Router answers the arbiter's 3-way choice (elenchus / aporia / maieutics) without an LLM call
+when it is confident, and defers to the LLM arbiter otherwise. HashedNGramClassifier is a small
+multinomial logistic regression over hashed word and character n-grams, trained from the
+[ARBITER_DECISION] records the arbiter writes to socratic.log. ReusePolicy keeps the previous
+decision on loop back-edges while the mastery score holds still, and rotates teachers on a stall.
+RoutingOptions bundles both, plus speculative execution, for SocraticAgents.
+
+Usage:
+    python -m routing train socratic.log router_model.json
+    python -m routing replay socratic.log [--threshold 0.8]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import zlib
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+ROUTE_LABELS = ("elenchus", "aporia", "maieutics")
+ROUTER_MODEL_PATH = os.getenv("SOCRATIC_ROUTER_MODEL", "router_model.json")
+DECISION_TAG = "[ARBITER_DECISION]"
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def routing_text(messages) -> str:
+    """
+    Text the router classifies: the learner's latest message and the tutor's latest reply.
+    """
+    last_human = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+    last_ai = next((m.content for m in reversed(messages) if isinstance(m, AIMessage)), "")
+    return f"user: {last_human}\ntutor: {last_ai}"
+
+
+class Router:
+    """
+    Interface for arbiter fast-paths. route returns (agent, confidence); agent is None when
+    the router is not confident and the LLM arbiter should decide.
+    """
+
+    def route(self, messages):
+        raise NotImplementedError
+
+
+class HashedNGramClassifier(Router):
+    """
+    Multinomial logistic regression over hashed word 1-2 grams and character 3-grams.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, threshold: float = 0.8, labels=ROUTE_LABELS):
+        self.n_features = n_features
+        self.threshold = threshold
+        self.labels = tuple(labels)
+        self.weights = {}
+        self.bias = [0.0] * len(self.labels)
+
+    def features(self, text: str):
+        """
+        Hashed feature buckets for text, with counts scaled to unit length.
+        """
+        text = (text or "").lower()
+        words = _WORD_PATTERN.findall(text)
+        grams = [f"w:{w}" for w in words]
+        grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        squashed = " ".join(words)
+        grams += [f"c:{squashed[i:i + 3]}" for i in range(max(0, len(squashed) - 2))]
+
+        counts = {}
+        for gram in grams:
+            bucket = zlib.crc32(gram.encode("utf-8")) % self.n_features
+            counts[bucket] = counts.get(bucket, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        return {bucket: value / norm for bucket, value in counts.items()}
+
+    def _scores(self, features):
+        scores = list(self.bias)
+        for bucket, value in features.items():
+            row = self.weights.get(bucket)
+            if row is not None:
+                for k, weight in enumerate(row):
+                    scores[k] += weight * value
+        return scores
+
+    @staticmethod
+    def _softmax(scores):
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict_proba(self, text: str) -> dict:
+        probs = self._softmax(self._scores(self.features(text)))
+        return dict(zip(self.labels, probs))
+
+    def fit(self, texts, labels, epochs: int = 10, learning_rate: float = 0.5, l2: float = 1e-4, seed: int = 0):
+        """
+        Train with plain SGD on the cross-entropy loss. Labels outside self.labels are skipped.
+        """
+        samples = [(self.features(t), self.labels.index(y)) for t, y in zip(texts, labels) if y in self.labels]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(samples)
+            rate = learning_rate / (1 + epoch)
+            for features, target in samples:
+                probs = self._softmax(self._scores(features))
+                for k in range(len(self.labels)):
+                    gradient = probs[k] - (1.0 if k == target else 0.0)
+                    self.bias[k] -= rate * gradient
+                    for bucket, value in features.items():
+                        row = self.weights.setdefault(bucket, [0.0] * len(self.labels))
+                        row[k] -= rate * (gradient * value + l2 * row[k])
+        return self
+
+    def route(self, messages):
+        probs = self.predict_proba(routing_text(messages))
+        agent = max(probs, key=probs.get)
+        confidence = probs[agent]
+        if confidence >= self.threshold:
+            return agent, confidence
+        return None, confidence
+
+    def save(self, path):
+        payload = {
+            "n_features": self.n_features,
+            "threshold": self.threshold,
+            "labels": list(self.labels),
+            "bias": self.bias,
+            "weights": {str(bucket): row for bucket, row in self.weights.items()},
+        }
+        Path(path).write_text(json.dumps(payload), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path):
+        payload = json.loads(Path(path).read_text(encoding="utf-8"))
+        model = cls(n_features=payload["n_features"], threshold=payload["threshold"], labels=payload["labels"])
+        model.bias = payload["bias"]
+        model.weights = {int(bucket): row for bucket, row in payload["weights"].items()}
+        return model
+
+
+def load_router(path=ROUTER_MODEL_PATH):
+    """
+    Load a trained classifier if the model file exists, else None.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        return HashedNGramClassifier.load(path)
+    except Exception:
+        return None
+
+
+class ReusePolicy:
+    """
+    Decides, before the arbiter runs on a loop back-edge, whether its previous decision still
+    stands. Within one user turn the teacher's own reply is the only new message, so the last
+    next_agent is kept for up to reuse_iterations iterations unless the mastery score has moved
+    by more than score_delta since it was chosen. When the reuses run out and the score has not
+    gained stall_gain, the strategy has stalled and the policy rotates to the next teacher in
+    labels order (if rotate_on_stall); otherwise the arbiter decides again.
+    """
+
+    def __init__(self, reuse_iterations: int = 2, score_delta: float = 0.05, stall_gain: float = 0.01,
+                 rotate_on_stall: bool = True, labels=ROUTE_LABELS):
+        if reuse_iterations < 0:
+            raise ValueError(f"reuse_iterations must be >= 0, got {reuse_iterations!r}")
+        self.reuse_iterations = reuse_iterations
+        self.score_delta = score_delta
+        self.stall_gain = stall_gain
+        self.rotate_on_stall = rotate_on_stall
+        self.labels = tuple(labels)
+
+    def decide(self, state):
+        """
+        (agent, reason) for this arbiter step. agent is None when the arbiter should decide;
+        reason is "reuse" or "rotate" when it is not None, else why the policy deferred.
+        """
+        previous = state.get("next_agent")
+        if not int(state.get("iteration", 0) or 0) or previous not in self.labels:
+            return None, "new_turn"
+        change = float(state.get("mastery_score", 0.0) or 0.0) - float(state.get("routed_score", 0.0) or 0.0)
+        if abs(change) > self.score_delta:
+            return None, "score_changed"
+        if int(state.get("route_reuses", 0) or 0) < self.reuse_iterations:
+            return previous, "reuse"
+        if self.rotate_on_stall and change < self.stall_gain:
+            return self.labels[(self.labels.index(previous) + 1) % len(self.labels)], "rotate"
+        return None, "reuse_expired"
+
+
+class RoutingOptions:
+    """
+    How the arbiter node reaches next_agent. router answers confident decisions without the
+    arbiter LLM, reuse (a ReusePolicy) answers loop back-edges by keeping or rotating the previous
+    next_agent, and with speculative=True the arbiter runs concurrently with all three teachers
+    and the teacher it picks is reused instead of being called again.
+    """
+
+    def __init__(self, router: Router = None, reuse: ReusePolicy = None, speculative: bool = False):
+        self.router = router
+        self.reuse = reuse
+        self.speculative = speculative
+
+    def __repr__(self):
+        return f"RoutingOptions(router={self.router!r}, reuse={self.reuse!r}, speculative={self.speculative!r})"
+
+
+def read_decisions(log_path):
+    """
+    Parse [ARBITER_DECISION] records from a socratic.log file, oldest first.
+    """
+    decisions = []
+    with Path(log_path).open("r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            position = line.find(DECISION_TAG)
+            if position < 0:
+                continue
+            try:
+                decisions.append(json.loads(line[position + len(DECISION_TAG):].strip()))
+            except json.JSONDecodeError:
+                continue
+    return decisions
+
+
+def replay(decisions, threshold: float = 0.8, train_fraction: float = 0.8):
+    """
+    Train on the oldest train_fraction of the LLM arbiter's decisions and evaluate on the rest.
+    Accuracy is measured against the LLM arbiter's choice; latency saved is the LLM arbiter
+    time for the decisions the classifier would have answered on its own.
+    """
+    llm_decisions = [d for d in decisions if d.get("source") == "llm" and d.get("agent") in ROUTE_LABELS]
+    split = int(len(llm_decisions) * train_fraction)
+    train, test = llm_decisions[:split], llm_decisions[split:]
+    classifier = HashedNGramClassifier(threshold=threshold).fit([d["text"] for d in train], [d["agent"] for d in train])
+
+    correct = confident = confident_correct = 0
+    saved_ms = 0.0
+    for decision in test:
+        probs = classifier.predict_proba(decision["text"])
+        predicted = max(probs, key=probs.get)
+        correct += predicted == decision["agent"]
+        if probs[predicted] >= threshold:
+            confident += 1
+            confident_correct += predicted == decision["agent"]
+            saved_ms += float(decision.get("latency_ms") or 0.0)
+
+    total = len(test)
+    return {
+        "train": len(train),
+        "test": total,
+        "accuracy": correct / total if total else 0.0,
+        "coverage": confident / total if total else 0.0,
+        "confident_accuracy": confident_correct / confident if confident else 0.0,
+        "latency_saved_ms": saved_ms,
+        "latency_saved_per_decision_ms": saved_ms / total if total else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and evaluate the arbiter routing classifier.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="train on every LLM decision in a log")
+    train_parser.add_argument("log")
+    train_parser.add_argument("output", nargs="?", default=ROUTER_MODEL_PATH)
+    train_parser.add_argument("--threshold", type=float, default=0.8)
+    replay_parser = subparsers.add_parser("replay", help="report accuracy against the LLM arbiter")
+    replay_parser.add_argument("log")
+    replay_parser.add_argument("--threshold", type=float, default=0.8)
+    replay_parser.add_argument("--train-fraction", type=float, default=0.8)
+    args = parser.parse_args()
+
+    decisions = read_decisions(args.log)
+    if args.command == "train":
+        llm_decisions = [d for d in decisions if d.get("source") == "llm"]
+        classifier = HashedNGramClassifier(threshold=args.threshold)
+        classifier.fit([d["text"] for d in llm_decisions], [d["agent"] for d in llm_decisions])
+        classifier.save(args.output)
+        print(f"Trained on {len(llm_decisions)} decisions; model written to {args.output}")
+        return
+
+    report = replay(decisions, threshold=args.threshold, train_fraction=args.train_fraction)
+    print(f"train/test decisions:      {report['train']}/{report['test']}")
+    print(f"accuracy vs LLM arbiter:   {report['accuracy']:.1%}")
+    print(f"confident coverage:        {report['coverage']:.1%} (accuracy {report['confident_accuracy']:.1%})")
+    print(f"LLM arbiter time saved:    {report['latency_saved_ms'] / 1000:.1f} s "
+          f"({report['latency_saved_per_decision_ms']:.0f} ms per decision)")
+
+
+if __name__ == "__main__":
+    main()
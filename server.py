@@ -0,0 +1,347 @@
+"""
+Multi-session server mode: serve many learners from one process over newline-delimited
+JSON-RPC 2.0 on stdin/stdout.
+
+All sessions share one SocraticAgents instance and one compiled graph. Each session keeps its
+own history, token index and mastery score, and processes its requests (chats and resets) in
+order through a per-session queue; a global semaphore bounds how many graph runs hit Ollama at
+once. Beyond max_sessions, the least recently used idle sessions are dropped from memory and
+reloaded from their history log when the learner returns (their mastery score starts over).
+
+Methods:
+    chat   {"session_id": str, "text": str} -> {"replies": [...], "mastery_score": float, ...}
+    reset  {"session_id": str}
+    stats  {}
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from history import CONTEXT_TOKEN_BUDGET, TokenIndex, append_history, load_history, reset_history
+from ollama_pool import MODEL_CONCURRENCY, OllamaPool
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_QUEUE = 8
+DEFAULT_MAX_SESSIONS = 256
+
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class SessionBusyError(Exception):
+    """
+    Raised when a session already has max_queue requests waiting.
+    """
+
+
+class _Session:
+    """
+    Per-learner state: history, token index, mastery score and the pending-request queue.
+    """
+
+    def __init__(self, session_id: str, history_path, context_token_budget: int, max_queue: int):
+        self.session_id = session_id
+        self.history_path = history_path
+        history = load_history(history_path, max_tokens=context_token_budget) if history_path else []
+        self.token_index = TokenIndex(history)
+        self.mastery_score = 0.0
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.worker = None
+
+    def idle(self) -> bool:
+        return self.queue.empty() and (self.worker is None or self.worker.done())
+
+
+class SessionManager:
+    """
+    Runs learner turns for many sessions against one compiled graph.
+    """
+
+    def __init__(self, graph, sessions_dir=None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_queue: int = DEFAULT_MAX_QUEUE, context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 mastery_threshold: float = 0.9, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.graph = graph
+        self.sessions_dir = Path(sessions_dir) if sessions_dir else None
+        if self.sessions_dir:
+            self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        self.max_queue = max_queue
+        self.context_token_budget = context_token_budget
+        self.mastery_threshold = mastery_threshold
+        self.max_sessions = max_sessions
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Least recently used first
+        self._sessions = collections.OrderedDict()
+        self.stats = {"turns": 0, "errors": 0, "rejected": 0, "active": 0, "evicted": 0}
+
+    def _history_path(self, session_id: str):
+        if not isinstance(session_id, str) or not _SESSION_ID_PATTERN.match(session_id):
+            raise ValueError("session_id must be 1-64 characters of [A-Za-z0-9_.-]")
+        return self.sessions_dir / f"{session_id}.jsonl" if self.sessions_dir else None
+
+    def _get_session(self, session_id: str) -> _Session:
+        history_path = self._history_path(session_id)
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = _Session(session_id, history_path, self.context_token_budget, self.max_queue)
+            self._sessions[session_id] = session
+            self._evict_idle(keep=session_id)
+        else:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict_idle(self, keep: str):
+        # Sessions with queued or running requests stay, so the count can briefly exceed max_sessions.
+        # keep (the session being requested) is still idle until its request is queued.
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                return
+            if session_id != keep and self._sessions[session_id].idle():
+                del self._sessions[session_id]
+                self.stats["evicted"] += 1
+
+    def _submit(self, session: _Session, handler, arg) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        try:
+            session.queue.put_nowait((handler, arg, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise SessionBusyError(f"session {session.session_id} has {self.max_queue} requests pending")
+        if session.worker is None or session.worker.done():
+            session.worker = asyncio.create_task(self._drain(session))
+        return future
+
+    async def chat(self, session_id: str, text: str) -> dict:
+        """
+        Queue one learner message for a session and wait for the agents' replies.
+        Raises SessionBusyError when the session's queue is full.
+        """
+        return await self._submit(self._get_session(session_id), self._run_turn, text)
+
+    async def reset(self, session_id: str):
+        """
+        Clear a session's in-memory state and persisted history, after the turns already queued
+        for it. Unknown sessions are left alone (no session is created).
+        """
+        history_path = self._history_path(session_id)
+        session = self._sessions.get(session_id)
+        if session is not None:
+            await self._submit(session, self._reset_session, None)
+        elif history_path:
+            # Evicted from memory (or never seen); only a log may be left to clear
+            reset_history(history_path)
+
+    async def _reset_session(self, session: _Session, _):
+        session.token_index = TokenIndex()
+        session.mastery_score = 0.0
+        if session.history_path:
+            reset_history(session.history_path)
+
+    async def _drain(self, session: _Session):
+        # One worker per session keeps that session's requests in order; it exits when the queue is empty
+        while True:
+            try:
+                handler, arg, future = session.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result = await handler(session, arg)
+            except Exception as exc:
+                self.stats["errors"] += 1
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    async def _run_turn(self, session: _Session, text: str) -> dict:
+        user_message = HumanMessage(content=text)
+        history_length = len(session.token_index)
+        session.token_index.append(user_message)
+        graph_input = {
+            "messages": session.token_index.cap(self.context_token_budget),
+            "mastery_score": session.mastery_score,
+            "mastery_threshold": self.mastery_threshold,
+            "mastery_reached": False,
+        }
+
+        replies = []
+        agent_messages = []
+        mastery_reached = False
+        async with self._semaphore:
+            self.stats["active"] += 1
+            start = time.perf_counter()
+            try:
+                async for event in self.graph.astream(graph_input):
+                    for node_name, output in event.items():
+                        if not output:
+                            continue
+                        for message in output.get("messages") or []:
+                            if isinstance(message, AIMessage):
+                                agent_messages.append(message)
+                                replies.append({"agent": node_name, "content": message.content})
+                        if "mastery_score" in output:
+                            session.mastery_score = output["mastery_score"]
+                            mastery_reached = bool(output.get("mastery_reached"))
+            except Exception:
+                session.token_index.truncate(history_length)
+                raise
+            finally:
+                self.stats["active"] -= 1
+            latency_ms = (time.perf_counter() - start) * 1000
+
+        session.token_index.extend(agent_messages)
+        if session.history_path:
+            append_history(session.history_path, [user_message] + agent_messages)
+        self.stats["turns"] += 1
+        return {
+            "session_id": session.session_id,
+            "replies": replies,
+            "mastery_score": session.mastery_score,
+            "mastery_reached": mastery_reached,
+            "latency_ms": latency_ms,
+        }
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, sessions=len(self._sessions))
+
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SESSION_BUSY = -32000
+INTERNAL_ERROR = -32603
+
+
+async def handle_request(manager: SessionManager, request) -> dict:
+    """
+    Dispatch one decoded JSON-RPC request to the session manager and build the response.
+    """
+    if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+        return _error(None, INVALID_REQUEST, "invalid request")
+    request_id = request.get("id")
+    params = request.get("params") or {}
+    method = request["method"]
+    try:
+        if method == "chat":
+            if not isinstance(params.get("text"), str):
+                return _error(request_id, INVALID_PARAMS, "text must be a string")
+            result = await manager.chat(params.get("session_id"), params["text"])
+        elif method == "reset":
+            await manager.reset(params.get("session_id"))
+            result = {"session_id": params.get("session_id")}
+        elif method == "stats":
+            result = manager.get_stats()
+        else:
+            return _error(request_id, METHOD_NOT_FOUND, f"unknown method {method}")
+    except ValueError as exc:
+        return _error(request_id, INVALID_PARAMS, str(exc))
+    except SessionBusyError as exc:
+        return _error(request_id, SESSION_BUSY, str(exc))
+    except Exception as exc:
+        return _error(request_id, INTERNAL_ERROR, str(exc))
+    return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+
+def _error(request_id, code: int, message: str) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+async def serve_stdio(manager: SessionManager, reader=None, writer=None):
+    """
+    Read newline-delimited JSON-RPC requests and write responses as they complete.
+    Requests are handled concurrently, so responses may arrive out of order (match on id).
+    """
+    reader = reader or sys.stdin
+    writer = writer or sys.stdout
+    loop = asyncio.get_running_loop()
+    pending = set()
+
+    def write(response):
+        writer.write(json.dumps(response, ensure_ascii=False) + "\n")
+        writer.flush()
+
+    async def handle_line(line):
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            write(_error(None, PARSE_ERROR, "parse error"))
+            return
+        write(await handle_request(manager, request))
+
+    while True:
+        line = await loop.run_in_executor(None, reader.readline)
+        if not line:
+            break
+        if not line.strip():
+            continue
+        task = asyncio.create_task(handle_line(line))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Socratic sessions over stdio JSON-RPC.")
+    parser.add_argument("--sessions-dir", default="sessions", help="directory for per-session history logs")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY, help="max graph runs at once")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE, help="max pending requests per session")
+    parser.add_argument("--max-sessions", type=int, default=DEFAULT_MAX_SESSIONS,
+                        help="sessions kept in memory; idle ones beyond this are reloaded from disk on return")
+    parser.add_argument("--context-token-budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--model-concurrency", type=int, default=MODEL_CONCURRENCY,
+                        help="max Ollama requests in flight per model")
+    parser.add_argument("--score-cadence", default="1",
+                        help='dialectic scoring cadence: "user" or every N iterations (default 1)')
+    parser.add_argument("--route-reuse", type=int, default=0,
+                        help="iterations a routing decision is reused within a turn (0 routes every iteration)")
+    parser.add_argument("--control-window-turns", type=int, default=0,
+                        help="latest learner turns the arbiter and dialectic see (0: the teachers' window)")
+    args = parser.parse_args()
+
+    from agent_graph import create_agent_graph
+    from agents import SCORE_ON_USER_TURN, TEMPERATURES, SocraticAgents, control_windows
+    from backends import BackendRegistry
+    from routing import ReusePolicy, RoutingOptions
+
+    # Every session shares one connection pool, so concurrent learners queue per model instead of
+    # all hitting Ollama at once. With SOCRATIC_OLLAMA_HOSTS each endpoint gets its own pool.
+    backends = BackendRegistry.from_env(
+        roles=TEMPERATURES, pool_factory=lambda: OllamaPool(model_concurrency=args.model_concurrency)
+    )
+    if backends is not None:
+        backends.start_health_checks()
+    transport = backends if backends is not None else OllamaPool(model_concurrency=args.model_concurrency)
+    score_cadence = args.score_cadence if args.score_cadence == SCORE_ON_USER_TURN else int(args.score_cadence)
+    reuse = ReusePolicy(reuse_iterations=args.route_reuse) if args.route_reuse > 0 else None
+    graph = create_agent_graph(SocraticAgents(
+        context_switch=True, score_cadence=score_cadence, routing=RoutingOptions(reuse=reuse),
+        windows=control_windows(args.control_window_turns), transport=transport,
+    ))
+
+    async def run():
+        manager = SessionManager(
+            graph,
+            sessions_dir=args.sessions_dir,
+            max_concurrency=args.concurrency,
+            max_queue=args.max_queue,
+            max_sessions=args.max_sessions,
+            context_token_budget=args.context_token_budget,
+        )
+        await serve_stdio(manager)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
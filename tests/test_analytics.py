@@ -0,0 +1,108 @@
+"""
+Tests for the per-iteration analytics store and its queries.
+"""
+
+import math
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from langchain_core.messages import HumanMessage
+
+from agent_graph import create_agent_graph
+from agents import SocraticAgents
+from analytics import (
+    AnalyticsStore,
+    TurnRecorder,
+    convergence_by_agent,
+    iterations_to_mastery,
+    score_distribution,
+)
+from benchmarks.fake_llm import fake_llm_factory
+
+
+def _row(session, turn, iteration, agent, score, source="llm", latency_ms=100.0, tokens=50):
+    return {
+        "session": session, "turn": turn, "iteration": iteration, "agent": agent, "source": source,
+        "score": score, "threshold": 0.9, "latency_ms": latency_ms, "tokens": tokens, "timestamp": 0.0,
+    }
+
+
+class TestAnalyticsStore(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / "analytics"
+        # Two sessions, interleaved as concurrent batch runs write them
+        self.rows = [
+            _row("a", 0, 1, "elenchus", 0.2),
+            _row("b", 0, 1, "aporia", 0.5),
+            _row("a", 0, 2, "maieutics", 0.6, source="reuse"),
+            _row("b", 0, 2, "aporia", math.nan, source="reuse"),
+            _row("a", 0, 3, "maieutics", 0.95),
+            _row("b", 1, 1, "maieutics", 0.4),
+        ]
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_round_trip_and_trims_partial_rows(self):
+        store = AnalyticsStore(self.path)
+        store.append(self.rows)
+        reloaded = AnalyticsStore(self.path)
+        self.assertEqual(len(reloaded), 6)
+        self.assertEqual(reloaded.sessions, ["a", "b"])
+        columns = reloaded.columns()
+        self.assertEqual(columns["session"].tolist(), [0, 1, 0, 1, 0, 1])
+        self.assertEqual(columns["agent"].tolist(), [0, 1, 2, 1, 2, 2])
+        self.assertTrue(np.isnan(columns["score"][3]))
+
+        # An append interrupted after some columns were written
+        with (self.path / "score.bin").open("ab") as file:
+            file.write(np.float32(0.5).tobytes())
+        recovered = AnalyticsStore(self.path)
+        self.assertEqual(len(recovered), 6)
+        recovered.append(self.rows[:1])
+        self.assertEqual(AnalyticsStore(self.path).columns()["score"].tolist()[-1], np.float32(0.2))
+
+    def test_queries(self):
+        store = AnalyticsStore()
+        store.append(self.rows)
+        columns = store.columns()
+
+        convergence = convergence_by_agent(columns)
+        self.assertEqual(convergence["maieutics"]["iterations"], 3)
+        # a: 0.2 -> 0.6 -> 0.95 both by maieutics; b: 0.5 -> 0.4 by maieutics (the NaN row is skipped)
+        self.assertAlmostEqual(convergence["maieutics"]["mean_gain"], (0.4 + 0.35 - 0.1) / 3, places=5)
+        self.assertEqual(convergence["elenchus"]["scored_gains"], 0)
+        self.assertAlmostEqual(convergence["aporia"]["without_arbiter_llm"], 0.5)
+
+        mastery = iterations_to_mastery(columns)
+        self.assertEqual((mastery["turns"], mastery["mastered_turns"]), (3, 1))
+        self.assertEqual(mastery["mean_iterations"], 3.0)
+
+        histogram = score_distribution(columns, bins=2)
+        self.assertEqual(histogram["counts"], [2, 3])
+        self.assertEqual(score_distribution(columns, bins=2, by_agent=True)["maieutics"]["counts"], [1, 2])
+
+    def test_records_graph_iterations(self):
+        factory = fake_llm_factory(scripts={"arbiter": ["aporia"], "dialectic": ["0.3", "0.6", "0.95"]})
+        graph = create_agent_graph(SocraticAgents(llm_factory=factory))
+        recorder = TurnRecorder("s", 0)
+        for update in graph.stream({
+            "messages": [HumanMessage(content="what is entropy?")],
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        }):
+            for node_name, output in update.items():
+                recorder.observe(node_name, output)
+        self.assertEqual([row["iteration"] for row in recorder.rows], [1, 2, 3])
+        self.assertEqual([row["agent"] for row in recorder.rows], ["aporia"] * 3)
+        self.assertEqual([row["score"] for row in recorder.rows], [0.3, 0.6, 0.95])
+        self.assertTrue(all(row["tokens"] > 0 and row["source"] == "llm" for row in recorder.rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
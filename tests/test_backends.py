@@ -0,0 +1,220 @@
+"""
+Tests for the multi-endpoint backend registry, against stub Ollama servers on local ports.
+"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from backends import BackendRegistry
+from ollama_pool import OllamaPool
+
+
+class StubOllama:
+    """
+    Minimal Ollama HTTP server on a free local port: /api/tags, /api/ps and /api/chat, under
+    prefix (as behind a reverse proxy). chat_status replaces the chat reply with an error status.
+    """
+
+    def __init__(self, models=(), resident=(), delay=0.0, chat_status=200, prefix=""):
+        self.models = list(models)
+        self.resident = list(resident)
+        self.delay = delay
+        self.chat_status = chat_status
+        self.chats = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body: bytes, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                names = {f"{prefix}/api/tags": stub.models, f"{prefix}/api/ps": stub.resident}.get(self.path)
+                if names is None:
+                    self._reply(404, b"{}")
+                    return
+                self._reply(200, json.dumps({"models": [{"name": name, "model": name} for name in names]}).encode())
+
+            def do_POST(self):
+                if self.path != f"{prefix}/api/chat":
+                    self._reply(404, b"{}")
+                    return
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub._chat(self, body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}{prefix}"
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def _chat(self, handler, body):
+        with self._lock:
+            self.chats += 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            time.sleep(self.delay)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        if self.chat_status != 200:
+            handler._reply(self.chat_status, json.dumps({"error": "stub error"}).encode())
+            return
+        model = body["model"]
+        lines = [
+            {"model": model, "created_at": "2024-01-01T00:00:00Z",
+             "message": {"role": "assistant", "content": self.url}, "done": False},
+            {"model": model, "created_at": "2024-01-01T00:00:00Z",
+             "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop",
+             "prompt_eval_count": 5, "eval_count": 1},
+        ]
+        handler._reply(200, b"".join(json.dumps(line).encode() + b"\n" for line in lines), "application/x-ndjson")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def closed_port_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def _chat(client, model="m:latest"):
+    # The URL's host is rewritten to the chosen endpoint
+    return client.post("http://127.0.0.1:11434/api/chat", json={"model": model, "messages": []})
+
+
+class TestBackendRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.stubs = []
+
+    def tearDown(self):
+        for stub in self.stubs:
+            stub.stop()
+
+    def _stub(self, **kwargs):
+        stub = StubOllama(**kwargs)
+        self.stubs.append(stub)
+        return stub
+
+    def _registry(self, hosts, **kwargs):
+        registry = BackendRegistry(hosts, pool_factory=lambda: OllamaPool(retries=0, model_concurrency=8), **kwargs)
+        self.addCleanup(registry.close)
+        return registry
+
+    def test_spreads_concurrent_requests_by_outstanding_count(self):
+        a, b = self._stub(delay=0.1), self._stub(delay=0.1)
+        registry = self._registry([a.url, b.url])
+        client = httpx.Client(transport=registry.transport())
+        threads = [threading.Thread(target=_chat, args=(client,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((a.chats, b.chats), (3, 3))
+        self.assertEqual([e.outstanding for e in registry.endpoints], [0, 0])
+
+    def test_pins_models_to_endpoints_where_resident(self):
+        a = self._stub(models=["m:latest", "other:latest"])
+        b = self._stub(models=["m:latest"], resident=["m"])
+        registry = self._registry([a.url, b.url])
+        self.assertEqual(registry.check_health(), {a.url: True, b.url: True})
+        client = httpx.Client(transport=registry.transport())
+        for _ in range(4):
+            self.assertEqual(_chat(client).status_code, 200)
+        self.assertEqual((a.chats, b.chats), (0, 4))
+        # A model resident nowhere goes to an endpoint that has it, then stays there
+        for _ in range(3):
+            _chat(client, "other")
+        self.assertEqual(a.chats, 3)
+
+    def test_fails_over_from_dead_endpoint(self):
+        now = [0.0]
+        down, up = closed_port_url(), self._stub()
+        registry = self._registry([down, up.url], cooldown=30, clock=lambda: now[0])
+        client = httpx.Client(transport=registry.transport())
+        self.assertEqual(_chat(client).status_code, 200)
+        self.assertEqual(registry.stats["failovers"], 1)
+        self.assertFalse(registry.endpoints[0].healthy)
+
+        _chat(client)
+        self.assertEqual((registry.stats["failovers"], up.chats), (1, 2))
+        now[0] = 31.0
+        self.assertEqual(registry.select(model="new").url, httpx.URL(down))
+
+    def test_fails_over_on_missing_model_and_error_status(self):
+        missing, broken, good = self._stub(chat_status=404), self._stub(chat_status=500), self._stub()
+        registry = self._registry([missing.url, broken.url, good.url])
+        reply = _chat(httpx.Client(transport=registry.transport()))
+        self.assertEqual(reply.status_code, 200)
+        self.assertIn(good.url, reply.text)
+        self.assertEqual((missing.chats, broken.chats, good.chats), (1, 1, 1))
+        self.assertEqual(registry.stats["failovers"], 2)
+
+    def test_last_endpoint_error_is_returned(self):
+        broken = self._stub(chat_status=500)
+        registry = self._registry([broken.url])
+        self.assertEqual(_chat(httpx.Client(transport=registry.transport())).status_code, 500)
+        self.assertEqual(registry.endpoints[0].outstanding, 0)
+
+    def test_host_url_path_prefix_is_kept(self):
+        proxied = self._stub(models=["m:latest"], prefix="/ollama")
+        registry = self._registry([proxied.url + "/"])
+        self.assertEqual(registry.check_health(), {proxied.url + "/": True})
+        self.assertEqual(registry.endpoints[0].available, {"m:latest"})
+        self.assertEqual(_chat(httpx.Client(transport=registry.transport())).status_code, 200)
+        self.assertEqual(proxied.chats, 1)
+
+    def test_health_check_marks_dead_endpoints(self):
+        stub = self._stub()
+        dead = closed_port_url()
+        registry = self._registry([stub.url, dead])
+        self.assertEqual(registry.check_health(), {stub.url: True, dead: False})
+
+    def test_async_requests_balance_and_fail_over(self):
+        a, b = self._stub(delay=0.05), self._stub(delay=0.05)
+        registry = self._registry([closed_port_url(), a.url, b.url])
+
+        async def run():
+            async with httpx.AsyncClient(transport=registry.async_transport()) as client:
+                replies = await asyncio.gather(*(
+                    client.post("http://127.0.0.1:11434/api/chat", json={"model": "m", "messages": []})
+                    for _ in range(4)
+                ))
+            return [reply.status_code for reply in replies]
+
+        self.assertEqual(asyncio.run(run()), [200] * 4)
+        self.assertEqual(a.chats + b.chats, 4)
+        self.assertGreater(min(a.chats, b.chats), 0)
+
+    def test_roles_use_their_own_endpoints(self):
+        from agents import SocraticAgents
+
+        arbiter_host, teacher_host = self._stub(), self._stub()
+        registry = self._registry([teacher_host.url], role_hosts={"arbiter": [arbiter_host.url]})
+        agents = SocraticAgents(transport=registry)
+        self.assertEqual(agents._get_llm("arbiter").invoke("hi").content, arbiter_host.url)
+        self.assertEqual(agents._get_llm("elenchus").invoke("hi").content, teacher_host.url)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests for batch evaluation of recorded sessions.
+"""
+
+import asyncio
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent_graph import create_agent_graph
+from agents import SocraticAgents
+from batch_eval import completed_ids, load_session, run_batch, session_paths
+from benchmarks.bench_transcripts import TRANSCRIPTS_DIR
+from benchmarks.fake_llm import fake_llm_factory
+from history import append_history
+
+
+def _build_graph(session):
+    return create_agent_graph(SocraticAgents(llm_factory=fake_llm_factory(scripts=session["scripts"])))
+
+
+class TestBatchEval(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.sessions = self.tmp / "sessions"
+        shutil.copytree(TRANSCRIPTS_DIR, self.sessions)
+        self.output = self.tmp / "results.jsonl"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _run(self, build_graph=_build_graph, concurrency=2):
+        return asyncio.run(run_batch(session_paths(self.sessions), self.output, build_graph, concurrency))
+
+    def test_records_every_session(self):
+        totals = self._run()
+        self.assertEqual(totals["sessions"], 3)
+        records = {r["id"]: r for r in map(json.loads, self.output.read_text(encoding="utf-8").splitlines())}
+        self.assertEqual(set(records), {"gravity", "primes", "plateau"})
+        gravity = records["gravity"]
+        self.assertEqual(len(gravity["turns"]), 8)
+        self.assertEqual(len(gravity["mastery_trajectory"]), 8)
+        for turn in gravity["turns"]:
+            self.assertEqual(len(turn["routes"]), turn["iterations"])
+            self.assertGreater(turn["latency_ms"], 0)
+
+    def test_resume_skips_completed_and_retries_failed(self):
+        calls = []
+
+        def flaky(session):
+            calls.append(session["id"])
+            if session["id"] == "primes" and calls.count("primes") == 1:
+                raise RuntimeError("ollama went away")
+            return _build_graph(session)
+
+        first = self._run(flaky)
+        self.assertEqual((first["sessions"], first["errors"]), (2, 1))
+        # Simulate a run killed while writing a record
+        with self.output.open("a", encoding="utf-8") as output:
+            output.write('{"id": "trunc')
+
+        second = self._run(flaky)
+        self.assertEqual((second["sessions"], second["skipped"]), (1, 2))
+        self.assertEqual(completed_ids(self.output), {"gravity", "primes", "plateau"})
+
+    def test_history_logs_replay_learner_messages(self):
+        log = self.sessions / "learner42.jsonl"
+        append_history(log, [HumanMessage(content="what is a prime?"), AIMessage(content="what do you think?"),
+                             HumanMessage(content="a number with two divisors")])
+        session = load_session(log)
+        self.assertEqual(session["id"], "learner42")
+        self.assertEqual(session["turns"], ["what is a prime?", "a number with two divisors"])
+
+
+if __name__ == "__main__":
+    unittest.main()
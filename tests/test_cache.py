@@ -0,0 +1,107 @@
+"""
+Tests for the agent response cache.
+"""
+
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from agents import SocraticAgents
+from benchmarks.fake_llm import fake_llm_factory
+from cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [SystemMessage(content="prompt"), HumanMessage(content="what is a prime?")]
+
+    def test_key_depends_on_all_inputs(self):
+        base = ResponseCache.make_key("m", 0.0, self.messages)
+        self.assertEqual(base, ResponseCache.make_key("m", 0.0, list(self.messages)))
+        self.assertNotEqual(base, ResponseCache.make_key("other", 0.0, self.messages))
+        self.assertNotEqual(base, ResponseCache.make_key("m", 0.1, self.messages))
+        self.assertNotEqual(base, ResponseCache.make_key("m", 0.0, self.messages, {"num_predict": 8}))
+        self.assertNotEqual(base, ResponseCache.make_key("m", 0.0, self.messages[:1]))
+
+    def test_key_ignores_whitespace(self):
+        spaced = [type(m)(content=f"  {m.content.replace(' ', '  ')}\n") for m in self.messages]
+        self.assertEqual(ResponseCache.make_key("m", 0.0, self.messages), ResponseCache.make_key("m", 0.0, spaced))
+        reworded = [type(m)(content=m.content + " again") for m in self.messages]
+        self.assertNotEqual(ResponseCache.make_key("m", 0.0, self.messages), ResponseCache.make_key("m", 0.0, reworded))
+
+    def test_hit_and_miss_stats(self):
+        cache = ResponseCache()
+        self.assertIsNone(cache.get("k"))
+        cache.put("k", AIMessage(content="aporia"), latency_ms=120.0)
+        hit = cache.get("k")
+        self.assertEqual(hit.content, "aporia")
+        self.assertTrue(hit.response_metadata["cache_hit"])
+        self.assertEqual(cache.stats["hits"], 1)
+        self.assertEqual(cache.stats["misses"], 1)
+        self.assertAlmostEqual(cache.stats["saved_ms"], 120.0)
+        self.assertAlmostEqual(cache.hit_rate, 0.5)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        for key in ("a", "b"):
+            cache.put(key, AIMessage(content=key), 1.0)
+        cache.get("a")
+        cache.put("c", AIMessage(content="c"), 1.0)
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(ttl_seconds=0.01)
+        cache.put("k", AIMessage(content="x"), 1.0)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("k"))
+
+    def test_sqlite_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "cache.sqlite"
+            first = ResponseCache(db_path=db_path)
+            first.put("k", AIMessage(content="0.7"), 300.0)
+            first.close()
+            second = ResponseCache(db_path=db_path)
+            self.assertEqual(second.get("k").content, "0.7")
+            self.assertEqual(second.stats["disk_hits"], 1)
+            second.close()
+
+
+class TestAgentCaching(unittest.TestCase):
+
+    def _agents(self, **kwargs):
+        return SocraticAgents(llm_factory=fake_llm_factory(scripts={"arbiter": ["aporia"]}), **kwargs)
+
+    def test_control_nodes_cached_by_default(self):
+        agents = self._agents()
+        state = {"messages": [HumanMessage(content="what is a prime?")]}
+        agents.arbiter_node(state)
+        update = agents.arbiter_node(state)
+        self.assertEqual(update["next_agent"], "aporia")
+        self.assertEqual(update["tokens_used"], 0)
+        self.assertEqual(agents.arbiter_llm.calls, 1)
+        self.assertEqual(agents.cache.stats["hits"], 1)
+
+    def test_teachers_not_cached_by_default(self):
+        agents = self._agents()
+        state = {"messages": [HumanMessage(content="what is a prime?")]}
+        agents.aporia_node(state)
+        agents.aporia_node(state)
+        self.assertEqual(agents.aporia_llm.calls, 2)
+
+    def test_cache_can_be_disabled(self):
+        agents = self._agents(cache=False)
+        state = {"messages": [HumanMessage(content="what is a prime?")]}
+        agents.arbiter_node(state)
+        agents.arbiter_node(state)
+        self.assertIsNone(agents.cache)
+        self.assertEqual(agents.arbiter_llm.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
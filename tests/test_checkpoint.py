@@ -0,0 +1,137 @@
+"""
+Tests for SQLite-checkpointed graph runs.
+"""
+
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from langchain_core.messages import HumanMessage
+
+from agent_graph import create_agent_graph
+from agents import SocraticAgents
+from benchmarks.fake_llm import fake_llm_factory
+from history import ContextWindows
+from checkpoint import open_async_checkpointer, open_checkpointer, prune_checkpoints, thread_config
+
+
+def _turn_input(text: str) -> dict:
+    return {
+        "messages": [HumanMessage(content=text)],
+        "mastery_threshold": 0.9,
+        "mastery_reached": False,
+        "iteration": 0,
+        "score_history": [],
+        "tokens_used": None,
+        "stop_reason": "",
+    }
+
+
+class TestCheckpointedGraph(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_path = Path(self._tmp.name) / "checkpoints.sqlite"
+        self.config = thread_config("learner-1")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _graph(self, scripts, **agent_kwargs):
+        checkpointer = open_checkpointer(self.db_path)
+        self.addCleanup(checkpointer.conn.close)
+        agents = SocraticAgents(llm_factory=fake_llm_factory(scripts=scripts), cache=False, **agent_kwargs)
+        return agents, create_agent_graph(agents, checkpointer=checkpointer)
+
+    def test_state_carries_over_between_turns(self):
+        _, graph = self._graph({"arbiter": ["aporia"], "dialectic": ["0.95"]})
+        first = graph.invoke(_turn_input("what is a prime?"), self.config)
+        second = graph.invoke(_turn_input("is 1 prime?"), self.config)
+        self.assertEqual(len(second["messages"]), len(first["messages"]) + 2)
+        self.assertEqual(second["messages"][0].content, "what is a prime?")
+        self.assertAlmostEqual(second["mastery_score"], 0.95)
+        # tokens_used restarts each turn instead of accumulating across the thread
+        self.assertGreater(second["tokens_used"], 0)
+        self.assertLess(second["tokens_used"], first["tokens_used"] * 2)
+
+    def test_resume_after_crash(self):
+        crashes = []
+
+        def dialectic(messages):
+            if not crashes:
+                crashes.append(True)
+                raise ConnectionError("ollama went away")
+            return "0.95"
+
+        agents, graph = self._graph({"arbiter": ["maieutics"], "dialectic": dialectic})
+        with self.assertRaises(ConnectionError):
+            graph.invoke(_turn_input("why is the sky blue?"), self.config)
+        self.assertEqual(graph.get_state(self.config).next, ("dialectic",))
+
+        result = graph.invoke(None, self.config)
+        self.assertTrue(result["mastery_reached"])
+        # The arbiter and teacher steps completed before the crash are not run again
+        self.assertEqual(agents.arbiter_llm.calls, 1)
+        self.assertEqual(agents.maieutics_llm.calls, 1)
+
+    def test_nodes_window_state_messages(self):
+        prompts = []
+
+        def arbiter(messages):
+            prompts.append(messages)
+            return "elenchus"
+
+        _, graph = self._graph({"arbiter": arbiter, "dialectic": ["0.95"]}, windows=ContextWindows(100))
+        for turn in range(6):
+            graph.invoke(_turn_input(f"turn {turn} " + "word " * 30), self.config)
+        # System prompt plus a window that fits the budget, always ending with the new message
+        self.assertTrue(prompts[-1][-1].content.startswith("turn 5"))
+        # Messages older than the window are dropped from the checkpointed state too: it holds the
+        # arbiter's window and the teacher's reply
+        messages = graph.get_state(self.config).values["messages"]
+        self.assertLess(len(messages), 12)
+        self.assertEqual(messages[:-1], prompts[-1][1:])
+
+    def test_user_cadence_survives_trimming(self):
+        agents, graph = self._graph({"arbiter": ["elenchus"], "dialectic": ["0.5"]},
+                                    windows=ContextWindows(40), score_cadence="user")
+        for turn in range(4):
+            result = graph.invoke(_turn_input(f"turn {turn} " + "word " * 30), self.config)
+            self.assertEqual(result["stop_reason"], "awaiting_user")
+        # Each learner message is scored once, though older ones have left the state
+        self.assertEqual(agents.scoring_stats, {"scored": 4, "skipped": 0})
+        self.assertEqual(len(graph.get_state(self.config).values["messages"]), 2)
+
+    def test_prune_keeps_newest_checkpoints(self):
+        _, graph = self._graph({"arbiter": ["aporia"], "dialectic": ["0.95"]})
+        for turn in range(3):
+            graph.invoke(_turn_input(f"question {turn}"), self.config)
+        before = graph.get_state(self.config).values
+        self.assertGreater(prune_checkpoints(self.db_path, "learner-1", keep=2), 0)
+        conn = sqlite3.connect(self.db_path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0], 2)
+        self.assertEqual(graph.get_state(self.config).values["messages"], before["messages"])
+
+    def test_async_checkpointer(self):
+        agents = SocraticAgents(llm_factory=fake_llm_factory(scripts={"arbiter": ["aporia"], "dialectic": ["0.95"]}))
+
+        async def run():
+            checkpointer = await open_async_checkpointer(self.db_path)
+            try:
+                graph = create_agent_graph(agents, checkpointer=checkpointer)
+                for text in ("a", "b"):
+                    async for _ in graph.astream(_turn_input(text), self.config, durability="exit"):
+                        pass
+                return (await graph.aget_state(self.config)).values
+            finally:
+                await checkpointer.conn.close()
+
+        values = asyncio.run(run())
+        self.assertEqual([m.content for m in values["messages"] if m.type == "human"], ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
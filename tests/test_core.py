@@ -10,12 +10,23 @@ from unittest.mock import MagicMock
 
 from langchain_core.messages import AIMessage, HumanMessage
 
-from agent_graph import _route_after_dialectic
-from agents import SocraticAgents
+from agent_graph import _route_after_dialectic, create_agent_graph
+from agents import SocraticAgents, control_windows
+from benchmarks.fake_llm import fake_llm_factory
+from residency import ModelResidency
+from routing import ReusePolicy, RoutingOptions
 from history import (
+    RollingSummary,
+    TokenIndex,
+    append_history,
+    cap_messages,
+    estimate_tokens,
     load_history,
+    migrate_history,
     reset_history,
     save_history,
+    summary_path,
+    WindowPolicy,
 )
 
 class TestParseScore(unittest.TestCase):
@@ -23,8 +34,8 @@ class TestParseScore(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
-        # Instantiation needs ChatOllama; bypass by building the object without __init__
-        cls.agents = object.__new__(SocraticAgents)
+        # Chat clients are built lazily, so no Ollama server is needed to construct the agents
+        cls.agents = SocraticAgents()
 
     def test_clean_decimal(self):
         self.assertAlmostEqual(self.agents._parse_score("0.85"), 0.85)
@@ -52,7 +63,7 @@ class TestParseNextAgent(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
-        cls.agents = object.__new__(SocraticAgents)
+        cls.agents = SocraticAgents()
 
     def test_exact_elenchus(self):
         self.assertEqual(self.agents._parse_next_agent("elenchus"), "elenchus")
@@ -82,6 +93,38 @@ class TestParseNextAgent(unittest.TestCase):
     def test_none_falls_back(self):
         self.assertEqual(self.agents._parse_next_agent(None), "maieutics")
 
+class TestLazyClients(unittest.TestCase):
+    """Chat clients are built on first use; warm_up preloads the arbiter model."""
+
+    def test_clients_built_on_first_call(self):
+        agents = SocraticAgents(llm_factory=fake_llm_factory(scripts={"arbiter": ["aporia"]}))
+        self.assertEqual(agents._llms, {})
+        agents.arbiter_node({"messages": [HumanMessage(content="hi")]})
+        self.assertEqual(set(agents._llms), {"arbiter"})
+        self.assertIs(agents.arbiter_llm, agents._llms["arbiter"])
+        with self.assertRaises(AttributeError):
+            agents.unknown_llm
+
+    def test_default_backend_is_not_constructed(self):
+        agents = SocraticAgents()
+        self.assertEqual(agents._llms, {})
+        self.assertIsNotNone(agents.preload)
+
+    def test_warm_up_preloads_arbiter_model(self):
+        preloaded = []
+        agents = SocraticAgents(llm_factory=fake_llm_factory(), preload=lambda model, keep_alive: preloaded.append(model))
+        agents.warm_up()
+        self.assertEqual(preloaded, [agents.models["arbiter"]])
+        self.assertEqual(set(agents._llms), {"arbiter"})
+
+    def test_warm_up_failure_is_ignored(self):
+        def fail(model, keep_alive):
+            raise ConnectionError("ollama is not running")
+
+        agents = SocraticAgents(llm_factory=fake_llm_factory(), preload=fail)
+        with self.assertLogs("socratic.agents", level="WARNING"):
+            agents.warm_up()
+
 class TestRouteAfterDialectic(unittest.TestCase):
     """Tests for _route_after_dialectic conditional edge."""
 
@@ -97,5 +140,583 @@ class TestRouteAfterDialectic(unittest.TestCase):
     def test_missing_key_continues(self):
         self.assertEqual(_route_after_dialectic({}), "arbiter")
 
+    def test_stop_reason_ends(self):
+        from langgraph.graph import END
+        self.assertEqual(_route_after_dialectic({"stop_reason": "max_iterations"}), END)
+
+    def test_expired_deadline_ends(self):
+        import time
+        from langgraph.graph import END
+        self.assertEqual(_route_after_dialectic({"deadline": time.time() - 1}), END)
+        self.assertEqual(_route_after_dialectic({"deadline": time.time() + 60}), "arbiter")
+
+class TestLoopBudgets(unittest.TestCase):
+    """Per-invocation loop budgets: iterations, tokens, deadline and plateau."""
+
+    def test_budget_stop_reason(self):
+        import time
+        from agent_state import budget_stop_reason
+        self.assertEqual(budget_stop_reason({"max_iterations": 3}, 3, 0, [0.1, 0.5, 0.8]), "max_iterations")
+        self.assertEqual(budget_stop_reason({"max_tokens": 100}, 1, 150, [0.1]), "max_tokens")
+        self.assertEqual(budget_stop_reason({"deadline": time.time() - 1}, 1, 0, [0.1]), "deadline")
+        self.assertEqual(budget_stop_reason({"max_iterations": 10}, 3, 0, [0.5, 0.5, 0.51]), "plateau")
+        self.assertEqual(budget_stop_reason({"max_iterations": 10}, 3, 0, [0.2, 0.4, 0.6]), "")
+
+    def _run(self, dialectic_scores, **budgets):
+        factory = fake_llm_factory(scripts={"dialectic": dialectic_scores})
+        graph = create_agent_graph(SocraticAgents(llm_factory=factory))
+        graph_input = {
+            "messages": [HumanMessage(content="what is entropy?")],
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        }
+        graph_input.update(budgets)
+        return graph.invoke(graph_input)
+
+    def test_iteration_cap_returns_to_user(self):
+        result = self._run(["0.1", "0.3", "0.5", "0.7"], max_iterations=2)
+        self.assertEqual(result["iteration"], 2)
+        self.assertEqual(result["stop_reason"], "max_iterations")
+        self.assertEqual(len([m for m in result["messages"] if isinstance(m, AIMessage)]), 2)
+
+    def test_default_cap_applies(self):
+        result = self._run(["0.1", "0.3", "0.5", "0.7", "0.8", "0.85"])
+        self.assertEqual(result["iteration"], 5)
+        self.assertEqual(result["stop_reason"], "max_iterations")
+
+    def test_plateau_exit(self):
+        result = self._run(["0.4"], max_iterations=10)
+        self.assertEqual(result["stop_reason"], "plateau")
+        self.assertEqual(result["iteration"], 3)
+
+    def test_token_budget(self):
+        result = self._run(["0.1", "0.3", "0.5", "0.7"], max_iterations=10, max_tokens=1)
+        self.assertEqual(result["stop_reason"], "max_tokens")
+        self.assertEqual(result["iteration"], 1)
+        self.assertGreater(result["tokens_used"], 0)
+
+    def test_mastery_clears_stop_reason(self):
+        result = self._run(["0.95"], max_iterations=1)
+        self.assertTrue(result["mastery_reached"])
+        self.assertEqual(result["stop_reason"], "")
+
+class TestSpeculativeArbiter(unittest.TestCase):
+    """Speculative mode runs the teachers alongside the arbiter and reuses the chosen reply."""
+
+    def _run(self, speculative, latency=0.0):
+        factory = fake_llm_factory(scripts={"arbiter": ["aporia"], "dialectic": ["0.95"]}, latency=latency)
+        agents = SocraticAgents(llm_factory=factory, routing=RoutingOptions(speculative=speculative))
+        graph = create_agent_graph(agents)
+        result = graph.invoke({
+            "messages": [HumanMessage(content="why do things fall?")],
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        })
+        if agents._speculation_pool is not None:
+            agents._speculation_pool.shutdown(wait=True)
+        return agents, result
+
+    def test_same_transcript_as_sequential(self):
+        _, sequential = self._run(False)
+        agents, speculative = self._run(True)
+        self.assertEqual(
+            [m.content for m in speculative["messages"]],
+            [m.content for m in sequential["messages"]],
+        )
+        self.assertEqual(speculative["next_agent"], "aporia")
+
+    def test_chosen_teacher_called_once(self):
+        agents, result = self._run(True)
+        self.assertEqual(agents.aporia_llm.calls, 1)
+        self.assertEqual(agents.speculation_stats["discarded_calls"], 2)
+        self.assertGreater(agents.speculation_stats["wasted_tokens"], 0)
+        self.assertEqual(result["speculation"]["discarded"], ["elenchus", "maieutics"])
+
+    def test_discarded_calls_count_against_token_budget(self):
+        _, sequential = self._run(False)
+        # With some latency every teacher has started by the time the arbiter answers
+        _, speculative = self._run(True, latency=0.01)
+        # so each discarded one is charged at least its prompt
+        prompt = sum(estimate_tokens(m.content) for m in sequential["messages"][:1])
+        self.assertGreaterEqual(speculative["tokens_used"], sequential["tokens_used"] + 2 * prompt)
+
+class TestAsyncStreaming(unittest.TestCase):
+    """The async graph path streams teacher tokens on the custom stream mode."""
+
+    def test_tokens_match_final_message(self):
+        import asyncio
+
+        agents = SocraticAgents(llm_factory=fake_llm_factory(scripts={"arbiter": ["elenchus"], "dialectic": ["0.95"]}))
+        graph = create_agent_graph(agents)
+        graph_input = {
+            "messages": [HumanMessage(content="is the earth flat?")],
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        }
+
+        async def collect():
+            tokens, updates = [], []
+            async for mode, payload in graph.astream(graph_input, stream_mode=["custom", "updates"]):
+                (tokens if mode == "custom" else updates).append(payload)
+            return tokens, updates
+
+        tokens, updates = asyncio.run(collect())
+        self.assertTrue(tokens)
+        self.assertEqual({t["node"] for t in tokens}, {"elenchus"})
+        teacher_update = next(u["elenchus"] for u in updates if "elenchus" in u)
+        self.assertEqual("".join(t["token"] for t in tokens), teacher_update["messages"][-1].content)
+        self.assertTrue(any("arbiter" in u and u["arbiter"]["arbiter_raw"] == "elenchus" for u in updates))
+
+class TestModelResidency(unittest.TestCase):
+    """Tests for the model residency planner and load counters."""
+
+    MODELS = {
+        "arbiter": "small", "dialectic": "small",
+        "elenchus": "mid", "aporia": "big", "maieutics": "big",
+    }
+    FOOTPRINTS = {"small": 3.0, "mid": 4.0, "big": 5.0}
+
+    def test_plan_keeps_models_that_fit(self):
+        residency = ModelResidency(vram_budget_gb=8.0, footprints=self.FOOTPRINTS)
+        self.assertEqual(residency.plan(self.MODELS, shared_model="big"), self.MODELS)
+        self.assertFalse(residency.fell_back)
+
+    def test_plan_falls_back_to_shared_model(self):
+        residency = ModelResidency(vram_budget_gb=6.0, footprints=self.FOOTPRINTS)
+        plan = residency.plan(self.MODELS, shared_model="big")
+        self.assertEqual(set(plan.values()), {"big"})
+        self.assertTrue(residency.fell_back)
+
+    def test_lru_simulation_counts_reloads(self):
+        residency = ModelResidency(vram_budget_gb=6.0, footprints=self.FOOTPRINTS)
+        loads = [residency.record_call(model) for model in ("small", "big", "small", "small")]
+        self.assertEqual(loads, [True, True, True, False])
+        self.assertEqual(residency.turn_loads, 3)
+        residency.start_turn()
+        self.assertEqual(residency.turn_loads, 0)
+        self.assertEqual(residency.total_loads, 3)
+
+    def test_load_duration_overrides_simulation(self):
+        residency = ModelResidency(footprints=self.FOOTPRINTS)
+        warm = AIMessage(content="x", response_metadata={"load_duration": 1_000_000})
+        cold = AIMessage(content="x", response_metadata={"load_duration": 3_000_000_000})
+        self.assertFalse(residency.record_call("small", warm))
+        self.assertTrue(residency.record_call("small", cold))
+
+    def test_order_roles_groups_models(self):
+        residency = ModelResidency()
+        order = residency.order_roles(["arbiter", "elenchus", "aporia", "dialectic"], self.MODELS)
+        self.assertEqual(order, ["arbiter", "dialectic", "elenchus", "aporia"])
+
+class TestStructuredOutput(unittest.TestCase):
+    """Structured-output mode for the arbiter and dialectic, and counted parse failures."""
+
+    def _agents(self, structured, arbiter="aporia", dialectic="0.5"):
+        factory = fake_llm_factory(scripts={"arbiter": [arbiter], "dialectic": [dialectic]})
+        return SocraticAgents(llm_factory=factory, structured_output=structured)
+
+    def test_schema_and_num_predict_passed(self):
+        agents = self._agents(True)
+        self.assertIn("format", agents.arbiter_llm.llm_kwargs)
+        self.assertEqual(agents.dialectic_llm.llm_kwargs["num_predict"], 16)
+        self.assertNotIn("format", agents.elenchus_llm.llm_kwargs)
+        self.assertIn('{"score"', agents.prompts["dialectic"])
+
+    def test_json_replies_parsed(self):
+        agents = self._agents(True, arbiter='{"next_agent": "elenchus"}', dialectic='{"score": 0.92}')
+        state = {"messages": [HumanMessage(content="hi")], "mastery_threshold": 0.9}
+        self.assertEqual(agents.arbiter_node(state)["next_agent"], "elenchus")
+        update = agents.dialectic_node(state)
+        self.assertAlmostEqual(update["mastery_score"], 0.92)
+        self.assertTrue(update["mastery_reached"])
+        self.assertEqual(agents.parse_failures, {"arbiter": 0, "dialectic": 0})
+
+    def test_bad_json_counted_and_previous_score_kept(self):
+        agents = self._agents(True, arbiter="aporia?", dialectic="not json")
+        state = {"messages": [HumanMessage(content="hi")], "mastery_score": 0.6, "mastery_threshold": 0.9}
+        self.assertEqual(agents.arbiter_node(state)["next_agent"], "aporia")
+        self.assertAlmostEqual(agents.dialectic_node(state)["mastery_score"], 0.6)
+        self.assertEqual(agents.parse_failures, {"arbiter": 1, "dialectic": 1})
+
+    def test_free_text_failures_counted(self):
+        agents = self._agents(False, arbiter="no idea", dialectic="great job")
+        state = {"messages": [HumanMessage(content="hi")], "mastery_score": 0.3}
+        self.assertEqual(agents.arbiter_node(state)["next_agent"], "maieutics")
+        self.assertAlmostEqual(agents.dialectic_node(state)["mastery_score"], 0.3)
+        self.assertEqual(agents.parse_failures, {"arbiter": 1, "dialectic": 1})
+
+class TestPromptLayout(unittest.TestCase):
+    """The history_first layout shares the conversation prefix across nodes on one model."""
+
+    def _run(self, layout):
+        from benchmarks.fake_llm import FakeOllamaServer
+
+        server = FakeOllamaServer()
+        factory = fake_llm_factory(scripts={"dialectic": ["0.4", "0.6", "0.95"]}, server=server)
+        agents = SocraticAgents(context_switch=False, llm_factory=factory, prompt_layout=layout, cache=False)
+        create_agent_graph(agents).invoke({
+            "messages": [HumanMessage(content="why does ice float? " * 20)],
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        })
+        return agents, server
+
+    def test_role_prompt_goes_last(self):
+        agents, _ = self._run("history_first")
+        state = {"messages": [HumanMessage(content="hi")]}
+        arbiter, dialectic = agents._build_messages("arbiter", state), agents._build_messages("dialectic", state)
+        self.assertEqual(arbiter[:-1], dialectic[:-1])
+        self.assertEqual(arbiter[-1].content, agents.prompts["arbiter"])
+
+    def test_prefix_reuse(self):
+        _, system_first = self._run("system_first")
+        _, history_first = self._run("history_first")
+        self.assertEqual(system_first.prompt_tokens_reused, 0)
+        self.assertGreater(history_first.prompt_tokens_reused, 0)
+        self.assertLess(history_first.prompt_tokens_evaluated, system_first.prompt_tokens_evaluated)
+
+    def test_unknown_layout(self):
+        with self.assertRaises(ValueError):
+            SocraticAgents(llm_factory=fake_llm_factory(), prompt_layout="sideways")
+
+class TestTokenIndex(unittest.TestCase):
+    """Tests for the incremental TokenIndex used by cap_messages."""
+
+    def setUp(self):
+        self.messages = [
+            HumanMessage(content="word " * (10 * (i + 1))) if i % 2 == 0 else AIMessage(content="reply " * 15)
+            for i in range(8)
+        ]
+        self.counts = [estimate_tokens(m.content) for m in self.messages]
+
+    def _expected(self, max_tokens):
+        total = 0
+        kept = []
+        for message, count in reversed(list(zip(self.messages, self.counts))):
+            if total + count > max_tokens and kept:
+                break
+            kept.insert(0, message)
+            total += count
+        return kept
+
+    def test_cap_matches_reverse_scan(self):
+        for budget in (0, 1, 20, 50, 100, 200, 10_000):
+            self.assertEqual(TokenIndex(self.messages).cap(budget), self._expected(budget))
+
+    def test_always_keeps_last_message(self):
+        self.assertEqual(cap_messages(self.messages, 0), [self.messages[-1]])
+
+    def test_append_updates_total(self):
+        index = TokenIndex(self.messages[:3])
+        index.append(self.messages[3])
+        self.assertEqual(index.total_tokens, sum(self.counts[:4]))
+        self.assertEqual(len(index), 4)
+
+    def test_truncate(self):
+        index = TokenIndex(self.messages)
+        index.truncate(2)
+        self.assertEqual(index.messages, self.messages[:2])
+        self.assertEqual(index.total_tokens, sum(self.counts[:2]))
+
+    def test_empty(self):
+        self.assertEqual(TokenIndex().cap(100), [])
+        self.assertEqual(cap_messages([], 100), [])
+
+    def test_stores_compact_records(self):
+        from history import MessageRecord
+
+        reply = AIMessage(content="why?", response_metadata={"eval_count": 3}, id="run-1")
+        index = TokenIndex([HumanMessage(content="what is heat?"), reply])
+        self.assertTrue(all(type(record) is MessageRecord for record in index.records))
+        self.assertFalse(hasattr(index.records[0], "__dict__"))
+        # The original is stamped, so the persisted log and the index agree on the timestamp
+        self.assertEqual(index.records[1].timestamp, reply.additional_kwargs["timestamp"])
+        window = index.cap(100)
+        self.assertEqual([type(m) for m in window], [HumanMessage, AIMessage])
+        self.assertEqual(window[1].content, "why?")
+        self.assertEqual(window[1].response_metadata, {})
+        self.assertEqual(TokenIndex(index.records).total_tokens, index.total_tokens)
+
+class TestWindowPolicies(unittest.TestCase):
+    """Per-node conversation windows, cut from a TokenIndex over the conversation."""
+
+    def setUp(self):
+        self.messages = []
+        for turn in range(4):
+            self.messages += [HumanMessage(content=f"question {turn} " * 20), AIMessage(content=f"reply {turn} " * 30)]
+
+    def test_turns_follow_truncate(self):
+        index = TokenIndex(self.messages)
+        self.assertEqual(index.window_start(last_turns=1), 6)
+        index.truncate(5)
+        self.assertEqual(index.window_start(last_turns=1), 4)
+        index.append(HumanMessage(content="new question"))
+        self.assertEqual(index.window_start(last_turns=1), 5)
+
+    def test_window_start(self):
+        index = TokenIndex(self.messages)
+        self.assertEqual(index.window_start(), 0)
+        self.assertEqual(index.window_start(last_turns=2), 4)
+        self.assertEqual(index.window_start(last_turns=10), 0)
+        for budget in (0, 50, 100, 300, 10_000):
+            self.assertEqual(self.messages[index.window_start(max_tokens=budget)],
+                             cap_messages(self.messages, budget)[0])
+        self.assertEqual(index.window_start(max_tokens=10_000, last_turns=1), 6)
+        with self.assertRaises(ValueError):
+            WindowPolicy(last_turns=0)
+
+    def test_control_nodes_see_recent_turns(self):
+        factory = fake_llm_factory(scripts={"arbiter": ["aporia"], "dialectic": ["0.5", "0.95"]})
+        agents = SocraticAgents(llm_factory=factory, windows=control_windows(1, max_tokens=300))
+        result = create_agent_graph(agents).invoke({
+            "messages": list(self.messages[:-1]),
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        })
+
+        stats = agents.prompt_stats
+        self.assertEqual((stats["arbiter"]["calls"], stats["dialectic"]["calls"]), (2, 2))
+        self.assertLess(stats["dialectic"]["tokens"] / stats["dialectic"]["calls"],
+                        stats["aporia"]["tokens"] / stats["aporia"]["calls"])
+
+        state = {"messages": result["messages"]}
+        arbiter, teacher = agents._window("arbiter", state), agents._window("aporia", state)
+        self.assertIs(arbiter[0], self.messages[-2])
+        self.assertEqual(teacher, cap_messages(result["messages"], 300))
+        self.assertGreater(len(teacher), len(arbiter))
+
+class TestRollingSummary(unittest.TestCase):
+    """Evicted messages are folded into a persisted running summary."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_path = Path(self.tmp.name) / "message_history.jsonl"
+        self.calls = []
+        # 20 messages of 50 tokens each
+        self.messages = [
+            (HumanMessage if i % 2 == 0 else AIMessage)(content=f"m{i:02d} " + "x" * 196) for i in range(20)
+        ]
+        append_history(self.log_path, self.messages)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _summarizer(self, previous, messages):
+        self.calls.append([m.content[:3] for m in messages])
+        return (previous + " " + ",".join(m.content[:3] for m in messages)).strip()
+
+    def _summary(self, refresh_tokens=200):
+        return RollingSummary(self._summarizer, summary_path(self.log_path), refresh_tokens=refresh_tokens)
+
+    def test_no_summary_until_refresh_threshold(self):
+        window = self._summary(refresh_tokens=10_000).window(TokenIndex(self.messages), 500)
+        self.assertEqual(window, TokenIndex(self.messages).cap(500))
+        self.assertEqual(self.calls, [])
+
+    def test_evicted_messages_are_folded_once(self):
+        summary = self._summary()
+        index = TokenIndex(self.messages)
+        window = summary.window(index, 500)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0][0], "m00")
+        self.assertIn("m00", window[0].content)
+        self.assertEqual(window[-1], self.messages[-1])
+        self.assertLessEqual(sum(estimate_tokens(m.content) for m in window), 500)
+
+        summary.window(index, 500)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_coverage_survives_reload(self):
+        self._summary().window(TokenIndex(self.messages), 500)
+        folded = self.calls[0]
+        # A restart loads only the tail of the log; nothing already summarized is folded again
+        reloaded = self._summary()
+        self.assertTrue(reloaded.text)
+        tail = TokenIndex(load_history(self.log_path, max_tokens=800))
+        tail.extend(HumanMessage(content="n " + "y" * 198) for _ in range(6))
+        reloaded.window(tail, 500)
+        self.assertEqual(len(self.calls), 2)
+        self.assertFalse(set(folded) & set(self.calls[-1]))
+
+    def test_reset_removes_summary(self):
+        self._summary().window(TokenIndex(self.messages), 500)
+        self.assertTrue(summary_path(self.log_path).exists())
+        reset_history(self.log_path)
+        self.assertFalse(summary_path(self.log_path).exists())
+        self.assertEqual(self._summary().text, "")
+
+    def test_agents_summarize(self):
+        agents = SocraticAgents(llm_factory=fake_llm_factory(scripts={"summarizer": ["short summary"]}))
+        self.assertEqual(agents.summarize("", self.messages[:2]), "short summary")
+        self.assertEqual(agents.summarizer_llm.calls, 1)
+        self.assertEqual(agents.summarizer_llm.llm_kwargs["num_predict"], 256)
+
+class TestHistoryLog(unittest.TestCase):
+    """Tests for the append-only JSONL history store."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.log_path = self.dir / "message_history.jsonl"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_append_round_trip_keeps_timestamps(self):
+        first = HumanMessage(content="what is gravity?", additional_kwargs={"timestamp": "2024-01-01T00:00:00+00:00"})
+        append_history(self.log_path, [first, AIMessage(content="What do you think?")])
+        append_history(self.log_path, [HumanMessage(content="a force")])
+        loaded = load_history(self.log_path)
+        self.assertEqual([m.content for m in loaded], ["what is gravity?", "What do you think?", "a force"])
+        self.assertEqual(loaded[0].additional_kwargs["timestamp"], "2024-01-01T00:00:00+00:00")
+        self.assertTrue(loaded[1].additional_kwargs["timestamp"])
+
+    def test_append_only_writes_new_lines(self):
+        append_history(self.log_path, [HumanMessage(content="one")])
+        append_history(self.log_path, [AIMessage(content="two")])
+        lines = self.log_path.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])["role"], "ai")
+
+    def test_tail_read_respects_budget(self):
+        messages = [HumanMessage(content=f"message number {i} " * 20) for i in range(50)]
+        append_history(self.log_path, messages)
+        budget = estimate_tokens(messages[-1].content) * 3
+        tail = load_history(self.log_path, max_tokens=budget)
+        self.assertEqual([m.content for m in tail], [m.content for m in cap_messages(messages, budget)])
+
+    def test_reverse_reader_small_blocks(self):
+        from history import _iter_lines_reversed
+        append_history(self.log_path, [HumanMessage(content=f"line {i}") for i in range(20)])
+        lines = [json.loads(line)["content"] for line in _iter_lines_reversed(self.log_path, block_size=7)]
+        self.assertEqual(lines, [f"line {i}" for i in reversed(range(20))])
+
+    def test_torn_line_is_skipped(self):
+        append_history(self.log_path, [HumanMessage(content="ok")])
+        with self.log_path.open("a", encoding="utf-8") as file:
+            file.write('{"role": "ai", "cont')
+        self.assertEqual([m.content for m in load_history(self.log_path)], ["ok"])
+        self.assertEqual([m.content for m in load_history(self.log_path, max_tokens=100)], ["ok"])
+
+    def test_append_after_torn_line(self):
+        append_history(self.log_path, [HumanMessage(content="a"), AIMessage(content="b")])
+        with self.log_path.open("a", encoding="utf-8") as file:
+            file.write('{"role": "ai", "cont')
+        append_history(self.log_path, [HumanMessage(content="c"), AIMessage(content="d")])
+        self.assertEqual([m.content for m in load_history(self.log_path)], ["a", "b", "c", "d"])
+        self.assertEqual([m.content for m in load_history(self.log_path, max_tokens=100)], ["a", "b", "c", "d"])
+
+    def test_migrate_legacy_json(self):
+        legacy_path = self.dir / "message_history.json"
+        save_history(legacy_path, [HumanMessage(content="hi"), AIMessage(content="hello")])
+        timestamps = [item["timestamp"] for item in json.loads(legacy_path.read_text(encoding="utf-8"))]
+        self.assertTrue(migrate_history(legacy_path, self.log_path))
+        self.assertFalse(legacy_path.exists())
+        loaded = load_history(self.log_path)
+        self.assertEqual([m.content for m in loaded], ["hi", "hello"])
+        self.assertEqual([m.additional_kwargs["timestamp"] for m in loaded], timestamps)
+        self.assertFalse(migrate_history(legacy_path, self.log_path))
+
+    def test_reset_removes_log(self):
+        append_history(self.log_path, [HumanMessage(content="x")])
+        reset_history(self.log_path)
+        self.assertEqual(load_history(self.log_path), [])
+
+class TestTranscripts(unittest.TestCase):
+    """The scripted benchmark transcripts run end to end through the graph."""
+
+    def test_transcripts_complete_with_expected_iterations(self):
+        import asyncio
+
+        from benchmarks.bench_transcripts import load_transcripts, run_transcript
+
+        results = {t["id"]: asyncio.run(run_transcript(t)) for t in load_transcripts()}
+        self.assertEqual(set(results), {"gravity", "primes", "plateau"})
+        self.assertEqual([turn["iterations"] for turn in results["gravity"]["turns"]], [3] * 8)
+        self.assertEqual({turn["stop_reason"] for turn in results["plateau"]["turns"]}, {"plateau"})
+        for result in results.values():
+            nodes = {span["node"] for span in result["spans"]}
+            self.assertTrue({"arbiter", "dialectic"} <= nodes)
+            self.assertEqual(result["history_messages"], sum(1 + t["iterations"] for t in result["turns"]))
+
+class TestScoreCadence(unittest.TestCase):
+    """The dialectic scores once per learner message or every N iterations."""
+
+    def _run(self, score_cadence, scores, **budgets):
+        factory = fake_llm_factory(scripts={"dialectic": scores})
+        agents = SocraticAgents(llm_factory=factory, score_cadence=score_cadence)
+        graph_input = {
+            "messages": [HumanMessage(content="what is entropy?")],
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        }
+        graph_input.update(budgets)
+        return agents, create_agent_graph(agents).invoke(graph_input)
+
+    def test_user_cadence_scores_once_and_waits_for_user(self):
+        agents, result = self._run("user", ["0.4", "0.95"])
+        self.assertEqual(result["stop_reason"], "awaiting_user")
+        self.assertEqual(result["iteration"], 1)
+        self.assertEqual(result["mastery_score"], 0.4)
+        self.assertEqual(result["score_history"], [0.4])
+        self.assertEqual(len([m for m in result["messages"] if isinstance(m, AIMessage)]), 1)
+        self.assertEqual(agents.scoring_stats, {"scored": 1, "skipped": 0})
+
+    def test_user_cadence_scores_new_learner_message(self):
+        agents = SocraticAgents(llm_factory=fake_llm_factory(), score_cadence="user")
+        state = {"messages": [HumanMessage(content="q", id="h1"), AIMessage(content="a")], "scored_human_id": "h1"}
+        self.assertFalse(agents._should_score(state))
+        state["messages"].append(HumanMessage(content="answer", id="h2"))
+        self.assertTrue(agents._should_score(state))
+
+    def test_every_n_iterations(self):
+        agents, result = self._run(2, ["0.2", "0.5", "0.8"], max_iterations=5)
+        self.assertEqual(result["stop_reason"], "max_iterations")
+        self.assertEqual(result["score_history"], [0.2, 0.5, 0.8])
+        self.assertEqual(agents.scoring_stats, {"scored": 3, "skipped": 2})
+
+    def test_invalid_cadence_rejected(self):
+        with self.assertRaises(ValueError):
+            SocraticAgents(llm_factory=fake_llm_factory(), score_cadence=0)
+
+class TestReusePolicy(unittest.TestCase):
+    """Loop back-edges reuse or rotate the previous routing decision instead of calling the arbiter."""
+
+    def test_decide(self):
+        policy = ReusePolicy(reuse_iterations=2, score_delta=0.05, stall_gain=0.01)
+        state = {"iteration": 1, "next_agent": "aporia", "mastery_score": 0.42, "routed_score": 0.4, "route_reuses": 0}
+        self.assertEqual(policy.decide(state), ("aporia", "reuse"))
+        self.assertEqual(policy.decide(dict(state, iteration=0)), (None, "new_turn"))
+        self.assertEqual(policy.decide(dict(state, mastery_score=0.6)), (None, "score_changed"))
+        self.assertEqual(policy.decide(dict(state, route_reuses=2, mastery_score=0.4)), ("maieutics", "rotate"))
+        self.assertEqual(policy.decide(dict(state, route_reuses=2, next_agent="maieutics", mastery_score=0.4)),
+                         ("elenchus", "rotate"))
+        self.assertEqual(policy.decide(dict(state, route_reuses=2, mastery_score=0.44)), (None, "reuse_expired"))
+
+    def test_graph_skips_arbiter_calls(self):
+        factory = fake_llm_factory(scripts={"arbiter": ["aporia"], "dialectic": ["0.3"]})
+        agents = SocraticAgents(llm_factory=factory, routing=RoutingOptions(reuse=ReusePolicy(reuse_iterations=2)))
+        result = create_agent_graph(agents).invoke({
+            "messages": [HumanMessage(content="what is entropy?")],
+            "mastery_score": 0.3,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+            "max_iterations": 5,
+            "plateau_window": 10,
+        })
+        self.assertEqual(result["stop_reason"], "max_iterations")
+        self.assertEqual(
+            [(d["agent"], d["source"]) for d in result["routing_decisions"]],
+            [("aporia", "llm"), ("aporia", "reuse"), ("aporia", "reuse"), ("maieutics", "rotate"), ("maieutics", "reuse")],
+        )
+        self.assertEqual(result["arbiter_skips"], 4)
+        self.assertEqual(agents.routing_stats, {"llm": 1, "router": 0, "reuse": 3, "rotate": 1})
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,168 @@
+"""
+Tests for the shared Ollama transport: per-model limits, backpressure and busy retries.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+
+import httpx
+
+from ollama_pool import ModelGate, OllamaBusyError, OllamaPool
+
+
+def _chat_reply(model: str, content: str = "hello") -> bytes:
+    lines = [
+        {"model": model, "created_at": "2024-01-01T00:00:00Z",
+         "message": {"role": "assistant", "content": content}, "done": False},
+        {"model": model, "created_at": "2024-01-01T00:00:00Z",
+         "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop",
+         "prompt_eval_count": 5, "eval_count": 1},
+    ]
+    return b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+
+
+class FakeOllama:
+    """
+    httpx handler standing in for an Ollama server; tracks in-flight requests per model.
+    busy_replies 503s are returned before the first success.
+    """
+
+    def __init__(self, delay=0.0, busy_replies=0):
+        self.delay = delay
+        self.busy_replies = busy_replies
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _enter(self, model):
+        with self._lock:
+            self.calls += 1
+            self.in_flight[model] = self.in_flight.get(model, 0) + 1
+            self.max_in_flight[model] = max(self.max_in_flight.get(model, 0), self.in_flight[model])
+            busy = self.busy_replies > 0
+            if busy:
+                self.busy_replies -= 1
+            return busy
+
+    def _exit(self, model):
+        with self._lock:
+            self.in_flight[model] -= 1
+
+    def __call__(self, request):
+        model = json.loads(request.content)["model"]
+        busy = self._enter(model)
+        try:
+            time.sleep(self.delay)
+        finally:
+            self._exit(model)
+        if busy:
+            return httpx.Response(503, json={"error": "server busy"})
+        return httpx.Response(200, content=_chat_reply(model))
+
+    async def handle_async(self, request):
+        model = json.loads(request.content)["model"]
+        busy = self._enter(model)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self._exit(model)
+        if busy:
+            return httpx.Response(503, json={"error": "server busy"})
+        return httpx.Response(200, content=_chat_reply(model))
+
+
+def _post(client, model):
+    return client.post("http://ollama/api/chat", json={"model": model, "messages": []})
+
+
+class TestOllamaPool(unittest.TestCase):
+
+    def test_limits_in_flight_requests_per_model(self):
+        server = FakeOllama(delay=0.02)
+        pool = OllamaPool(model_concurrency=2, transport=httpx.MockTransport(server))
+        client = httpx.Client(transport=pool.transport)
+        threads = [threading.Thread(target=_post, args=(client, model)) for model in ["a"] * 6 + ["b"] * 3]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(server.max_in_flight, {"a": 2, "b": 2})
+        self.assertEqual(pool.stats["requests"], 9)
+        self.assertEqual(pool.gate("a").active, 0)
+
+    def test_async_requests_share_the_limit(self):
+        server = FakeOllama(delay=0.02)
+        pool = OllamaPool(model_concurrency=1, transport=httpx.MockTransport(server.handle_async))
+
+        async def run():
+            async with httpx.AsyncClient(transport=pool.async_transport) as client:
+                replies = await asyncio.gather(*(
+                    client.post("http://ollama/api/chat", json={"model": "a", "messages": []}) for _ in range(4)
+                ))
+            return [reply.status_code for reply in replies]
+
+        self.assertEqual(asyncio.run(run()), [200] * 4)
+        self.assertEqual(server.max_in_flight, {"a": 1})
+
+    def test_busy_replies_are_retried_with_backoff(self):
+        server = FakeOllama(busy_replies=2)
+        delays = []
+        pool = OllamaPool(retries=3, transport=httpx.MockTransport(server), sleep=delays.append)
+        reply = _post(httpx.Client(transport=pool.transport), "a")
+        self.assertEqual(reply.status_code, 200)
+        self.assertEqual(server.calls, 3)
+        self.assertEqual(pool.stats["retries"], 2)
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(all(0 <= delay <= pool.backoff * 2 ** i for i, delay in enumerate(delays)))
+
+    def test_retries_give_up_with_last_reply(self):
+        server = FakeOllama(busy_replies=10)
+        pool = OllamaPool(retries=1, transport=httpx.MockTransport(server), sleep=lambda _: None)
+        self.assertEqual(_post(httpx.Client(transport=pool.transport), "a").status_code, 503)
+        self.assertEqual(server.calls, 2)
+        self.assertEqual(pool.gate("a").active, 0)
+
+    def test_full_queue_and_queue_timeout_raise_busy(self):
+        gate = ModelGate(limit=1, max_queue=1)
+        gate.acquire(timeout=1)
+        with self.assertRaises(OllamaBusyError):
+            gate.acquire(timeout=0.01)
+        self.assertEqual(gate.waiting, 0)
+
+        waiter = threading.Thread(target=gate.acquire, args=(1,))
+        waiter.start()
+        while gate.waiting == 0:
+            time.sleep(0.001)
+        with self.assertRaises(OllamaBusyError):
+            gate.acquire(timeout=1)
+        gate.release()
+        waiter.join()
+        self.assertEqual(gate.active, 1)
+
+    def test_chat_ollama_uses_the_pool(self):
+        from langchain_ollama import ChatOllama
+
+        server = FakeOllama()
+        pool = OllamaPool(transport=httpx.MockTransport(server))
+        llm = ChatOllama(model="phi4-mini", **pool.client_kwargs())
+        self.assertEqual(llm.invoke("hi").content, "hello")
+        self.assertEqual(pool.stats["requests"], 1)
+        self.assertEqual(pool.gate("phi4-mini").active, 0)
+
+    def test_agents_share_one_transport(self):
+        from agents import SocraticAgents
+
+        pool = OllamaPool()
+        agents = SocraticAgents(transport=pool)
+        for role in ("arbiter", "elenchus", "dialectic"):
+            llm = agents._get_llm(role)
+            self.assertIs(llm._client._client._transport, pool.transport)
+            self.assertIs(llm._async_client._client._transport, pool.async_transport)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Tests for the vector index and semantic recall of earlier exchanges.
+"""
+
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from history import TokenIndex, reset_history
+from retrieval import RECALL_PREFIX, SemanticMemory, VectorIndex, index_path
+
+
+def bag_of_words(texts, dim=64):
+    """
+    Deterministic stand-in for an embedding model: hashed word counts.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, zlib.crc32(word.strip("?.,").encode()) % dim] += 1.0
+    return vectors
+
+
+class TestVectorIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        rng = np.random.default_rng(0)
+        self.vectors = rng.standard_normal((2000, 32)).astype(np.float32)
+        self.keys = [f"k{i:05d}" for i in range(len(self.vectors))]
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _exact(self, query, k):
+        unit = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        return [self.keys[i] for i in np.argsort(-(unit @ query))[:k]]
+
+    def test_prefiltered_search_finds_near_duplicates(self):
+        index = VectorIndex(candidates=64)
+        index.upsert(self.keys, self.vectors, [None] * len(self.keys))
+        rng = np.random.default_rng(1)
+        for row in (0, 777, 1999):
+            query = self.vectors[row] + 0.05 * rng.standard_normal(32).astype(np.float32)
+            hits = index.search(query, 3)
+            self.assertEqual(hits[0][0], self.keys[row])
+            self.assertAlmostEqual(hits[0][1], 1.0, delta=0.05)
+
+    def test_small_index_search_is_exact(self):
+        index = VectorIndex()
+        index.upsert(self.keys[:100], self.vectors[:100], [None] * 100)
+        self.vectors = self.vectors[:100]
+        query = np.ones(32, dtype=np.float32) / np.sqrt(32)
+        self.assertEqual([key for key, _ in index.search(query, 5)], self._exact(query, 5))
+
+    def test_upsert_replaces_and_persists(self):
+        path = self.tmp / "history.vectors"
+        index = VectorIndex(path)
+        index.upsert(self.keys, self.vectors, [{"row": i} for i in range(len(self.keys))])
+        index.upsert(["k00003"], self.vectors[10:11], [{"row": "replaced"}])
+        self.assertEqual(len(index), 2000)
+
+        reloaded = VectorIndex(path)
+        self.assertEqual(len(reloaded), 2000)
+        self.assertEqual(reloaded.document("k00003"), {"row": "replaced"})
+        self.assertEqual(reloaded.document("k01500"), {"row": 1500})
+        self.assertEqual({key for key, _ in reloaded.search(self.vectors[10], 2)}, {"k00003", "k00010"})
+        reloaded.upsert(["new"], self.vectors[:1], [{"row": "new"}])
+        self.assertEqual(VectorIndex(path).document("new"), {"row": "new"})
+
+        reloaded.clear()
+        self.assertEqual(len(VectorIndex(path)), 0)
+
+    def test_reset_history_removes_index(self):
+        log_path = self.tmp / "history.jsonl"
+        VectorIndex(index_path(log_path)).upsert(self.keys[:10], self.vectors[:10], [None] * 10)
+        self.assertTrue(list(self.tmp.glob("history.vectors.*")))
+        reset_history(log_path)
+        self.assertEqual(list(self.tmp.glob("history.vectors.*")), [])
+        self.assertEqual(len(VectorIndex(index_path(log_path))), 0)
+
+    def test_rejects_mismatched_dimensions(self):
+        index = VectorIndex()
+        index.upsert(["a"], self.vectors[:1], [None])
+        with self.assertRaises(ValueError):
+            index.upsert(["b"], np.ones((1, 8)), [None])
+
+
+class TestSemanticMemory(unittest.TestCase):
+
+    def setUp(self):
+        topics = ["photosynthesis chlorophyll sunlight leaves", "prime numbers divisors factors"]
+        topics += [f"filler topic number {i} about nothing in particular" for i in range(30)]
+        self.messages = []
+        for topic in topics:
+            self.messages.append(HumanMessage(content=f"tell me about {topic}"))
+            self.messages.append(AIMessage(content=f"what do you already know about {topic}?"))
+        self.index = TokenIndex(self.messages)
+        self.memory = SemanticMemory(bag_of_words, VectorIndex(), top_k=1, token_budget=200, min_score=0.2)
+        self.memory.add(self.messages)
+
+    def test_recalls_old_relevant_exchange(self):
+        window = self.memory.window(self.index, 300, "how do leaves use sunlight?")
+        self.assertIsInstance(window[0], SystemMessage)
+        self.assertEqual(window[0].content, RECALL_PREFIX)
+        self.assertIn("photosynthesis", window[1].content)
+        self.assertEqual(window[-1], self.index.cap(300)[-1])
+        self.assertLessEqual(len(window) - 1, len(self.index.cap(300)) + 2)
+
+    def test_recent_exchanges_are_not_recalled_twice(self):
+        window = self.memory.window(self.index, 300, "tell me about filler topic number 29")
+        contents = [m.content for m in window]
+        self.assertEqual(len(contents), len(set(contents)))
+
+    def test_unrelated_message_uses_recent_window(self):
+        self.assertEqual(self.memory.window(self.index, 300, "zzz qqq"), self.index.cap(300))
+
+
+if __name__ == "__main__":
+    unittest.main()
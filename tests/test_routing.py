@@ -0,0 +1,113 @@
+"""
+Tests for the arbiter routing fast-path (no LLM needed).
+"""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agents import SocraticAgents
+from benchmarks.fake_llm import fake_llm_factory
+from routing import HashedNGramClassifier, Router, RoutingOptions, read_decisions, replay, routing_text
+
+EXAMPLES = {
+    "elenchus": ["I am certain the sun orbits the earth", "obviously heavier objects fall faster, always"],
+    "aporia": ["I am stuck and have no idea where to start", "I am lost, nothing makes sense to me"],
+    "maieutics": ["is it a bit like water flowing downhill?", "I think it is almost like a spring pushing back"],
+}
+
+
+def _training_set(repeat: int = 5):
+    texts, labels = [], []
+    for label, samples in EXAMPLES.items():
+        for _ in range(repeat):
+            for sample in samples:
+                texts.append(f"user: {sample}\ntutor: ")
+                labels.append(label)
+    return texts, labels
+
+
+class TestHashedNGramClassifier(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.classifier = HashedNGramClassifier(n_features=2 ** 12, threshold=0.6).fit(*_training_set())
+
+    def test_predicts_training_labels(self):
+        for label, samples in EXAMPLES.items():
+            for sample in samples:
+                probs = self.classifier.predict_proba(f"user: {sample}\ntutor: ")
+                self.assertEqual(max(probs, key=probs.get), label)
+
+    def test_route_confident_and_deferred(self):
+        agent, confidence = self.classifier.route([HumanMessage(content="I am stuck and have no idea")])
+        self.assertEqual(agent, "aporia")
+        self.assertGreaterEqual(confidence, 0.6)
+        strict = HashedNGramClassifier(threshold=1.01)
+        self.assertIsNone(strict.route([HumanMessage(content="anything")])[0])
+
+    def test_save_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "router.json"
+            self.classifier.save(path)
+            loaded = HashedNGramClassifier.load(path)
+        text = "user: I am certain of it\ntutor: "
+        self.assertEqual(loaded.predict_proba(text), self.classifier.predict_proba(text))
+
+    def test_routing_text_uses_latest_turns(self):
+        messages = [HumanMessage(content="old"), AIMessage(content="reply"), HumanMessage(content="new")]
+        self.assertEqual(routing_text(messages), "user: new\ntutor: reply")
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_replay_from_log(self):
+        texts, labels = _training_set(repeat=8)
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = Path(tmp) / "socratic.log"
+            with log_path.open("w", encoding="utf-8") as file:
+                file.write("2024-01-01 00:00:00,000 [DEBUG] [ARBITER_RAW]: aporia\n")
+                for i, (text, label) in enumerate(zip(texts, labels)):
+                    record = {"text": text, "agent": label, "source": "llm", "latency_ms": 400.0}
+                    file.write(f"2024-01-01 00:00:{i % 60:02d},000 [DEBUG] [ARBITER_DECISION] {json.dumps(record)}\n")
+            decisions = read_decisions(log_path)
+
+        self.assertEqual(len(decisions), len(texts))
+        # Interleave so the chronological split sees every label on both sides
+        decisions = [d for group in zip(*[decisions[i::3] for i in range(3)]) for d in group]
+        report = replay(decisions, threshold=0.5)
+        self.assertGreater(report["test"], 0)
+        self.assertGreaterEqual(report["accuracy"], 0.9)
+        self.assertAlmostEqual(report["latency_saved_ms"], 400.0 * report["coverage"] * report["test"])
+
+
+class TestArbiterFastPath(unittest.TestCase):
+
+    class FixedRouter(Router):
+        def __init__(self, agent):
+            self.agent = agent
+
+        def route(self, messages):
+            return self.agent, 1.0 if self.agent else 0.0
+
+    def _agents(self, agent):
+        return SocraticAgents(llm_factory=fake_llm_factory(scripts={"arbiter": ["elenchus"]}), routing=RoutingOptions(router=self.FixedRouter(agent)))
+
+    def test_confident_router_skips_llm(self):
+        agents = self._agents("aporia")
+        update = agents.arbiter_node({"messages": [HumanMessage(content="hi")]})
+        self.assertEqual(update["next_agent"], "aporia")
+        self.assertEqual(agents.arbiter_llm.calls, 0)
+
+    def test_unsure_router_defers_to_llm(self):
+        agents = self._agents(None)
+        update = agents.arbiter_node({"messages": [HumanMessage(content="hi")]})
+        self.assertEqual(update["next_agent"], "elenchus")
+        self.assertEqual(agents.arbiter_llm.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+Tests for the multi-session server, run against the fake LLM backend.
+"""
+
+import asyncio
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from agent_graph import create_agent_graph
+from agents import SocraticAgents
+from benchmarks.fake_llm import fake_llm_factory
+from history import load_history
+from server import SessionBusyError, SessionManager, handle_request, serve_stdio
+
+
+def _graph(latency: float = 0.0):
+    factory = fake_llm_factory(scripts={"arbiter": ["aporia"], "dialectic": ["0.95"]}, latency=latency)
+    return create_agent_graph(SocraticAgents(llm_factory=factory))
+
+
+class TestSessionManager(unittest.TestCase):
+
+    def test_sessions_are_isolated(self):
+        async def scenario():
+            manager = SessionManager(_graph())
+            await manager.chat("alice", "what is a prime?")
+            await manager.chat("alice", "a number with two divisors")
+            await manager.chat("bob", "why is the sky blue?")
+            return manager
+
+        manager = asyncio.run(scenario())
+        alice = manager._sessions["alice"].token_index.messages
+        bob = manager._sessions["bob"].token_index.messages
+        self.assertEqual(len(alice), 4)
+        self.assertEqual(len(bob), 2)
+        self.assertEqual(bob[0].content, "why is the sky blue?")
+        self.assertEqual(manager.get_stats()["turns"], 3)
+
+    def test_reply_shape(self):
+        result = asyncio.run(SessionManager(_graph()).chat("s1", "hello"))
+        self.assertEqual(result["replies"][0]["agent"], "aporia")
+        self.assertAlmostEqual(result["mastery_score"], 0.95)
+        self.assertTrue(result["mastery_reached"])
+
+    def test_history_persisted_per_session(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(SessionManager(_graph(), sessions_dir=tmp).chat("s1", "hello"))
+            self.assertEqual(len(load_history(Path(tmp) / "s1.jsonl")), 2)
+            # A new manager picks the session back up from disk
+            manager = SessionManager(_graph(), sessions_dir=tmp)
+            self.assertEqual(len(manager._get_session("s1").token_index), 2)
+
+    def test_queue_full_rejects(self):
+        async def scenario():
+            manager = SessionManager(_graph(latency=0.05), max_queue=1)
+            first = asyncio.create_task(manager.chat("s1", "one"))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(manager.chat("s1", "two"))
+            await asyncio.sleep(0)
+            with self.assertRaises(SessionBusyError):
+                await manager.chat("s1", "three")
+            await asyncio.gather(first, second)
+
+        asyncio.run(scenario())
+
+    def test_idle_sessions_evicted_and_reloaded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            async def scenario():
+                manager = SessionManager(_graph(), sessions_dir=tmp, max_sessions=2)
+                for session_id in ("a", "b", "a", "c"):
+                    await manager.chat(session_id, "hello")
+                evicted = list(manager._sessions)
+                await manager.chat("b", "back again")
+                return manager, evicted
+
+            manager, evicted = asyncio.run(scenario())
+            self.assertEqual(evicted, ["a", "c"])
+            self.assertEqual(manager.get_stats()["evicted"], 2)
+            # b was reloaded from its log
+            self.assertEqual(len(manager._sessions["b"].token_index), 4)
+
+    def test_new_session_not_evicted_when_others_busy(self):
+        async def scenario():
+            manager = SessionManager(_graph(latency=0.02), max_sessions=1)
+            busy = asyncio.create_task(manager.chat("a", "hello"))
+            await asyncio.sleep(0)
+            await asyncio.gather(manager.chat("b", "one"), manager.chat("b", "two"))
+            await busy
+            return manager
+
+        manager = asyncio.run(scenario())
+        self.assertEqual(manager.get_stats()["evicted"], 0)
+        # Both turns ran on one session, in order
+        messages = manager._sessions["b"].token_index.messages
+        self.assertEqual([m.content for m in messages[::2]], ["one", "two"])
+
+    def test_reset_runs_between_turns(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            async def scenario():
+                manager = SessionManager(_graph(latency=0.02), sessions_dir=tmp)
+                await manager.reset("nobody")
+                self.assertEqual(manager.get_stats()["sessions"], 0)
+                turn = asyncio.create_task(manager.chat("s1", "one"))
+                await asyncio.sleep(0)
+                await manager.reset("s1")
+                # The reset waited for the queued turn instead of racing it
+                self.assertTrue(turn.done())
+                await manager.chat("s1", "two")
+                return manager
+
+            manager = asyncio.run(scenario())
+            self.assertEqual([m.content for m in manager._sessions["s1"].token_index.messages][0], "two")
+            self.assertEqual([m.content for m in load_history(Path(tmp) / "s1.jsonl")][0], "two")
+
+    def test_invalid_session_id(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(SessionManager(_graph()).chat("../etc", "hi"))
+
+
+class TestJsonRpc(unittest.TestCase):
+
+    def test_stdio_round_trip(self):
+        requests = "\n".join([
+            json.dumps({"jsonrpc": "2.0", "id": 1, "method": "chat", "params": {"session_id": "a", "text": "hi"}}),
+            "not json",
+            json.dumps({"jsonrpc": "2.0", "id": 2, "method": "nope"}),
+        ]) + "\n"
+        output = io.StringIO()
+
+        async def scenario():
+            await serve_stdio(SessionManager(_graph()), reader=io.StringIO(requests), writer=output)
+
+        asyncio.run(scenario())
+        responses = {r.get("id"): r for r in map(json.loads, output.getvalue().splitlines())}
+        self.assertEqual(responses[1]["result"]["replies"][0]["agent"], "aporia")
+        self.assertEqual(responses[2]["error"]["code"], -32601)
+        self.assertEqual(responses[None]["error"]["code"], -32700)
+
+    def test_missing_text(self):
+        async def scenario():
+            return await handle_request(SessionManager(_graph()), {"id": 3, "method": "chat", "params": {"session_id": "a"}})
+
+        self.assertEqual(asyncio.run(scenario())["error"]["code"], -32602)
+
+
+if __name__ == "__main__":
+    unittest.main()
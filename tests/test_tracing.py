@@ -0,0 +1,113 @@
+"""
+Tests for per-node tracing and the trace summary.
+"""
+
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from langchain_core.messages import HumanMessage
+
+from agent_graph import create_agent_graph
+from agents import SocraticAgents
+from benchmarks.fake_llm import fake_llm_factory
+from routing import RoutingOptions
+from tracing import Tracer, read_spans, summarize
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.graph_input = {
+            "messages": [HumanMessage(content="why is the sky blue?")],
+            "mastery_score": 0.0,
+            "mastery_threshold": 0.9,
+            "mastery_reached": False,
+        }
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _graph(self, path, speculative=False):
+        factory = fake_llm_factory(scripts={"arbiter": ["aporia"], "dialectic": ["0.95"]})
+        agents = SocraticAgents(llm_factory=factory, routing=RoutingOptions(speculative=speculative))
+        tracer = Tracer(path)
+        return agents, tracer, create_agent_graph(agents, tracer=tracer)
+
+    def test_sync_spans_record_llm_calls(self):
+        agents, tracer, graph = self._graph(self.tmp / "trace.jsonl")
+        graph.invoke(self.graph_input)
+        tracer.close()
+
+        spans = read_spans(self.tmp / "trace.jsonl")
+        self.assertEqual([s["node"] for s in spans], ["arbiter", "aporia", "dialectic"])
+        for span in spans:
+            self.assertEqual(len(span["llm_calls"]), 1)
+            self.assertGreater(span["wall_ms"], 0)
+            self.assertGreater(span["prompt_tokens"], 0)
+            self.assertFalse(span["cache_hit"])
+        self.assertEqual(spans[1]["model"], agents.models["aporia"])
+
+    def test_async_chrome_trace_and_cache_hits(self):
+        agents, tracer, graph = self._graph(self.tmp / "trace.json")
+
+        async def run_twice():
+            for _ in range(2):
+                async for _ in graph.astream(self.graph_input, stream_mode=["custom", "updates"]):
+                    pass
+
+        asyncio.run(run_twice())
+        tracer.close()
+
+        spans = read_spans(self.tmp / "trace.json")
+        self.assertEqual(len(spans), 6)
+        arbiter_spans = [s for s in spans if s["node"] == "arbiter"]
+        self.assertEqual([s["cache_hit"] for s in arbiter_spans], [False, True])
+        teacher = next(s for s in spans if s["node"] == "aporia")
+        self.assertLessEqual(teacher["ttft_ms"], teacher["llm_calls"][0]["llm_ms"])
+
+    def test_speculative_calls_attributed_to_arbiter(self):
+        agents, tracer, graph = self._graph(self.tmp / "trace.jsonl", speculative=True)
+        graph.invoke(self.graph_input)
+        agents._speculation_pool.shutdown(wait=True)
+        tracer.close()
+
+        arbiter = read_spans(self.tmp / "trace.jsonl")[0]
+        self.assertEqual(arbiter["node"], "arbiter")
+        self.assertIn("arbiter", {call["role"] for call in arbiter["llm_calls"]})
+        self.assertIn("aporia", {call["role"] for call in arbiter["llm_calls"]})
+
+    def test_late_speculative_calls_dropped(self):
+        # The discarded teachers are still running when the arbiter span closes
+        factory = fake_llm_factory(scripts={"arbiter": ["aporia"], "dialectic": ["0.95"]},
+                                   latency={"elenchus": 0.1, "maieutics": 0.1})
+        agents = SocraticAgents(llm_factory=factory, routing=RoutingOptions(speculative=True))
+        tracer = Tracer()
+        create_agent_graph(agents, tracer=tracer).invoke(self.graph_input)
+        arbiter = tracer.spans[0]
+        recorded = list(arbiter["llm_calls"])
+        agents._speculation_pool.shutdown(wait=True)
+
+        self.assertEqual(arbiter["llm_calls"], recorded)
+        self.assertEqual({call["role"] for call in recorded}, {"arbiter", "aporia"})
+        self.assertEqual(agents.speculation_stats["discarded_calls"], 2)
+        self.assertGreater(agents.speculation_stats["wasted_tokens"], 0)
+
+    def test_summarize_percentiles(self):
+        spans = [
+            {"node": "arbiter", "wall_ms": float(ms), "ttft_ms": 1.0, "prompt_tokens": 10, "completion_tokens": 2,
+             "llm_calls": [{"model": "m", "llm_ms": float(ms), "cache_hit": ms == 1}]}
+            for ms in range(1, 101)
+        ]
+        summary = summarize(spans)
+        self.assertAlmostEqual(summary["nodes"]["arbiter"]["p50_ms"], 50.5)
+        self.assertAlmostEqual(summary["nodes"]["arbiter"]["p95_ms"], 95.05)
+        self.assertEqual(summary["models"]["m"]["count"], 100)
+        self.assertAlmostEqual(summary["models"]["m"]["cache_hit_rate"], 0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+"""
+Per-node latency and token tracing.
+
+create_agent_graph(agents, tracer=Tracer(path)) wraps every node so each run writes one span with
+the node's wall time plus every LLM call made inside it (model, time-to-first-token, prompt and
+completion tokens, cache hit). Spans are written as JSONL or as Chrome trace events
+(chrome://tracing, Perfetto).
+
+Usage:
+    python -m tracing summarize socratic_trace.jsonl
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+TRACE_FILE = os.getenv("SOCRATIC_TRACE", "")
+
+_current_span = contextvars.ContextVar("socratic_span", default=None)
+# Guards a span's call list against calls that finish while the span is being closed
+_calls_lock = threading.Lock()
+
+
+def record_llm_call(role: str, model: str, llm_ms: float, ttft_ms: float, prompt_tokens: int,
+                    completion_tokens: int, cache_hit: bool, prompt_eval_ms: float = None):
+    """
+    Attach one LLM call to the node span running in this context (no-op when not tracing).
+    Calls that finish after their span has closed (discarded speculative calls left running in
+    the background) are dropped; speculation_stats accounts for them.
+    """
+    span = _current_span.get()
+    if span is None:
+        return
+    call = {
+        "role": role,
+        "model": model,
+        "llm_ms": round(llm_ms, 3),
+        "ttft_ms": round(ttft_ms, 3),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cache_hit": cache_hit,
+        "prompt_eval_ms": round(prompt_eval_ms, 3) if prompt_eval_ms is not None else None,
+    }
+    with _calls_lock:
+        if "wall_ms" not in span:
+            span["llm_calls"].append(call)
+
+
+class Tracer:
+    """
+    Thread-safe span writer. fmt is "jsonl" (one span per line) or "chrome" (trace event array).
+    With path=None spans are kept in memory on self.spans instead.
+    """
+
+    def __init__(self, path=None, fmt: str = None):
+        self.path = Path(path) if path is not None else None
+        self.fmt = fmt or ("chrome" if self.path is not None and self.path.suffix == ".json" else "jsonl")
+        if self.fmt not in ("jsonl", "chrome"):
+            raise ValueError(f"unknown trace format {self.fmt!r}")
+        self.spans = []
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            new_file = not self.path.exists() or self.path.stat().st_size == 0
+            self._file = self.path.open("a", encoding="utf-8")
+            if self.fmt == "chrome" and new_file:
+                # The Chrome trace format allows the closing bracket to be omitted
+                self._file.write("[\n")
+
+    def write(self, span: dict):
+        if self.path is None:
+            with self._lock:
+                self.spans.append(span)
+            return
+        if self.fmt == "chrome":
+            line = json.dumps({
+                "name": span["node"],
+                "cat": "node",
+                "ph": "X",
+                "ts": span["start"] * 1e6,
+                "dur": span["wall_ms"] * 1e3,
+                "pid": os.getpid(),
+                "tid": span["thread"],
+                "args": {k: v for k, v in span.items() if k not in ("node", "start", "wall_ms", "thread")},
+            }) + ",\n"
+        else:
+            line = json.dumps(span) + "\n"
+        with self._lock:
+            self._open()
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _start(self, node: str):
+        span = {"node": node, "start": time.time(), "thread": threading.get_ident(), "llm_calls": []}
+        return span, _current_span.set(span), time.perf_counter()
+
+    def _finish(self, span, token, started: float, error=None):
+        _current_span.reset(token)
+        with _calls_lock:
+            span["wall_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        calls = span["llm_calls"]
+        span["model"] = calls[0]["model"] if calls else None
+        span["ttft_ms"] = calls[0]["ttft_ms"] if calls else None
+        span["prompt_tokens"] = sum(call["prompt_tokens"] for call in calls)
+        span["completion_tokens"] = sum(call["completion_tokens"] for call in calls)
+        span["cache_hit"] = bool(calls) and all(call["cache_hit"] for call in calls)
+        if error is not None:
+            span["error"] = repr(error)
+        self.write(span)
+
+    def wrap(self, node: str, func, afunc):
+        """
+        Wrap a node's sync and async callables so every run is recorded as a span.
+        """
+        def traced(state):
+            span, token, started = self._start(node)
+            try:
+                result = func(state)
+            except Exception as exc:
+                self._finish(span, token, started, exc)
+                raise
+            self._finish(span, token, started)
+            return result
+
+        async def atraced(state):
+            span, token, started = self._start(node)
+            try:
+                result = await afunc(state)
+            except Exception as exc:
+                self._finish(span, token, started, exc)
+                raise
+            self._finish(span, token, started)
+            return result
+
+        return traced, atraced
+
+
+def read_spans(path):
+    """
+    Load spans from a JSONL trace or a Chrome trace file.
+    """
+    text = Path(path).read_text(encoding="utf-8")
+    if text.lstrip().startswith("["):
+        body = text.strip().rstrip(",")
+        if not body.endswith("]"):
+            body = body.rstrip().rstrip(",") + "]"
+        spans = []
+        for event in json.loads(body):
+            if event.get("ph") != "X":
+                continue
+            span = dict(event.get("args") or {})
+            span.update(node=event["name"], wall_ms=event["dur"] / 1e3, start=event["ts"] / 1e6)
+            spans.append(span)
+        return spans
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(spans) -> dict:
+    """
+    p50/p95 latency per node (node wall time) and per model (LLM call time), with call counts,
+    mean token counts and cache-hit rates.
+    """
+    by_node = {}
+    for span in spans:
+        by_node.setdefault(span["node"], []).append(span)
+    by_model = {}
+    for span in spans:
+        for call in span.get("llm_calls") or []:
+            by_model.setdefault(call["model"], []).append(call)
+
+    nodes = {}
+    for node, node_spans in sorted(by_node.items()):
+        wall = [s["wall_ms"] for s in node_spans]
+        ttft = [s["ttft_ms"] for s in node_spans if s.get("ttft_ms") is not None]
+        nodes[node] = {
+            "count": len(node_spans),
+            "p50_ms": _percentile(wall, 0.5),
+            "p95_ms": _percentile(wall, 0.95),
+            "ttft_p50_ms": _percentile(ttft, 0.5),
+            "prompt_tokens_mean": sum(s.get("prompt_tokens") or 0 for s in node_spans) / len(node_spans),
+            "completion_tokens_mean": sum(s.get("completion_tokens") or 0 for s in node_spans) / len(node_spans),
+        }
+
+    models = {}
+    for model, calls in sorted(by_model.items(), key=lambda item: str(item[0])):
+        latency = [c["llm_ms"] for c in calls]
+        models[model] = {
+            "count": len(calls),
+            "p50_ms": _percentile(latency, 0.5),
+            "p95_ms": _percentile(latency, 0.95),
+            "cache_hit_rate": sum(1 for c in calls if c["cache_hit"]) / len(calls),
+        }
+    return {"nodes": nodes, "models": models}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a Socratic trace file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summarize_parser = subparsers.add_parser("summarize", help="p50/p95 latency by node and by model")
+    summarize_parser.add_argument("trace")
+    args = parser.parse_args()
+
+    summary = summarize(read_spans(args.trace))
+    print(f"{'node':<12} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'ttft p50':>9} {'prompt tok':>11} {'compl tok':>10}")
+    for node, row in summary["nodes"].items():
+        print(f"{node:<12} {row['count']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['ttft_p50_ms']:>9.1f} "
+              f"{row['prompt_tokens_mean']:>11.0f} {row['completion_tokens_mean']:>10.0f}")
+    print()
+    print(f"{'model':<34} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'cache hits':>11}")
+    for model, row in summary["models"].items():
+        print(f"{str(model):<34} {row['count']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['cache_hit_rate']:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()